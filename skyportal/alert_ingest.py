@@ -0,0 +1,361 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+import gzip
+import io
+import sys
+import warnings
+
+import fastavro
+import numpy as np
+import pandas as pd
+from astropy.io import fits
+from astropy.io.fits.verify import VerifyWarning
+from astropy.time import Time
+from astropy.visualization import ZScaleInterval
+from PIL import Image
+from sqlalchemy.dialects import postgresql as psql
+
+from baselayer.app.custom_exceptions import AccessError
+from baselayer.log import make_log
+
+from .handlers.api.photometry import (
+    bulk_insert_new_photometry_data,
+    lock_photometry_of_objs,
+    standardize_photometry_data,
+)
+from .handlers.api.thumbnail import thumbnail_store
+from .models import (
+    AccessContext,
+    Candidate,
+    DBSession,
+    Group,
+    Obj,
+    Thumbnail,
+    insert_linked_thumbnails,
+)
+
+log = make_log('alert_ingest')
+
+# ZTF filter IDs (`fid`) and the corresponding bandpasses
+ZTF_FILTERS = {1: 'ztfg', 2: 'ztfr', 3: 'ztfi'}
+
+# Alert cutouts and the types of the Thumbnails made from them
+CUTOUT_TYPES = {
+    'cutoutScience': 'new',
+    'cutoutTemplate': 'ref',
+    'cutoutDifference': 'sub',
+}
+
+# Zeropoint of the fluxes computed from alert magnitudes (microjanskies, AB)
+ALERT_ZP = 23.9
+
+# Significance of the limiting magnitudes (`diffmaglim`) of ZTF alerts
+ALERT_LIMITING_MAG_NSIGMA = 5.0
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def read_alerts(sources):
+    """Yield the alert packets of Avro files.
+
+    Parameters
+    ----------
+    sources : list of str
+        Avro files, directories of `.avro` files, or `-` for a stream of
+        Avro records on standard input.
+    """
+    for source in sources:
+        if source == '-':
+            yield from fastavro.reader(sys.stdin.buffer)
+            continue
+        path = Path(source)
+        paths = sorted(path.glob('*.avro')) if path.is_dir() else [path]
+        for path in paths:
+            with open(path, 'rb') as f:
+                yield from fastavro.reader(f)
+
+
+def batched(iterable, size):
+    """Yield lists of up to `size` consecutive items of `iterable`."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if len(batch) == 0:
+            return
+        yield batch
+
+
+def alert_photometry(alert):
+    """Return the photometry of the candidate of an alert and of its previous
+    candidates, as rows in the format of `PhotFluxFlexible`.
+
+    Magnitudes are converted to fluxes so that negative differences
+    (`isdiffpos` false) are preserved. Non-detections have a null flux and
+    the error of their limiting magnitude.
+    """
+    rows = []
+    for candidate in [alert['candidate'], *(alert.get('prv_candidates') or [])]:
+        filter = ZTF_FILTERS.get(candidate['fid'])
+        if filter is None:
+            continue
+        if candidate.get('magpsf') is not None:
+            flux = 10 ** (-0.4 * (candidate['magpsf'] - ALERT_ZP))
+            fluxerr = candidate['sigmapsf'] / (2.5 / np.log(10)) * flux
+            if candidate.get('isdiffpos') in ['f', '0', 0, False]:
+                flux = -flux
+        elif candidate.get('diffmaglim') is not None:
+            flux = None
+            fluxerr = (
+                10 ** (-0.4 * (candidate['diffmaglim'] - ALERT_ZP))
+                / ALERT_LIMITING_MAG_NSIGMA
+            )
+        else:
+            continue
+        rows.append(
+            {
+                'obj_id': alert['objectId'],
+                'mjd': candidate['jd'] - 2400000.5,
+                'flux': flux,
+                'fluxerr': fluxerr,
+                'filter': filter,
+                'ra': candidate.get('ra'),
+                'dec': candidate.get('dec'),
+            }
+        )
+    return rows
+
+
+def render_cutout(stamp_data):
+    """Convert the image of an alert cutout, a (gzipped) FITS or a JPEG
+    file, to a PNG thumbnail.
+
+    FITS images are scaled with the zscale algorithm, and flipped so that
+    north is up.
+    """
+    if stamp_data[:2] == GZIP_MAGIC:
+        stamp_data = gzip.decompress(stamp_data)
+    if stamp_data.startswith(b'SIMPLE'):
+        with warnings.catch_warnings():
+            # ZTF cutouts have a nonstandard SIMPLE card
+            warnings.simplefilter('ignore', VerifyWarning)
+            with fits.open(io.BytesIO(stamp_data)) as hdul:
+                data = np.array(hdul[0].data, dtype=float)
+        finite = np.isfinite(data)
+        data[~finite] = np.median(data[finite]) if finite.any() else 0.0
+        vmin, vmax = ZScaleInterval().get_limits(data)
+        scaled = np.clip((data - vmin) / max(vmax - vmin, 1e-12), 0, 1)
+        image = Image.fromarray(np.flipud(np.uint8(255 * scaled)), mode='L')
+    else:
+        image = Image.open(io.BytesIO(stamp_data))
+    buf = io.BytesIO()
+    image.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+class AlertIngester:
+    def __init__(self, filter, instrument, user, group_ids=(), max_workers=4):
+        """
+        Ingest batches of alert packets: each batch creates the new Objs, the
+        Candidates of the Filter, the photometry of the alerts, including the
+        history of previous candidates, and the cutout thumbnails, with a few
+        set-based statements.
+
+        Parameters
+        ----------
+        filter : `skyportal.models.Filter`
+            The Filter the alerts passed.
+        instrument : `skyportal.models.Instrument`
+            The Instrument of the photometry.
+        user : `baselayer.app.models.User`
+            The User uploading the alerts.
+        group_ids : list of int, optional
+            Groups to share the photometry with, besides the group of the
+            Filter and the single user group of `user`. They must be
+            accessible to `user`.
+        max_workers : int, optional
+            Number of threads rendering cutouts.
+        """
+        access = AccessContext.of(user)
+        if 'Upload data' not in access.permissions:
+            raise AccessError('Insufficient permissions.')
+        if not access.is_system_admin and filter.id not in access.filter_ids:
+            raise AccessError(f'Filter {filter.id} is not accessible.')
+        group_ids = {int(group_id) for group_id in group_ids}
+        if access.is_system_admin:
+            valid_group_ids = {
+                group_id
+                for group_id, in DBSession()
+                .query(Group.id)
+                .filter(Group.id.in_(group_ids))
+            }
+        else:
+            valid_group_ids = set(access.group_ids)
+        invalid_group_ids = group_ids - valid_group_ids
+        if len(invalid_group_ids) > 0:
+            invalid = ', '.join(map(str, sorted(invalid_group_ids)))
+            raise AccessError(f'Groups {invalid} are not accessible.')
+
+        self.filter_id = filter.id
+        self.instrument_id = instrument.id
+        self.user_id = user.id
+        self.group_ids = list({filter.group_id, user.single_user_group.id, *group_ids})
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='cutout-render'
+        )
+
+    def ingest(self, alerts):
+        """Write a batch of alerts. The caller commits the transaction.
+
+        Parameters
+        ----------
+        alerts : list of dict
+            The alert packets, e.g., from `read_alerts`.
+
+        Returns
+        -------
+        dict
+            Number of alerts, of new Objs, Candidates and thumbnails, and of
+            (new or already stored) photometry points.
+        """
+        counts = {
+            'alerts': len(alerts),
+            'objs': 0,
+            'candidates': 0,
+            'photometry': 0,
+            'thumbnails': 0,
+        }
+        skipped = [alert['candid'] for alert in alerts if not alert.get('objectId')]
+        if len(skipped) > 0:
+            log(f'skipping {len(skipped)} alerts without objectId: {skipped}')
+        alerts = sorted(
+            (alert for alert in alerts if alert.get('objectId')),
+            key=lambda alert: (alert['objectId'], alert['candidate']['jd']),
+        )
+        if len(alerts) == 0:
+            return counts
+
+        # the first and last alert of each Obj in the batch
+        first_alerts = {}
+        latest_alerts = {}
+        for alert in alerts:
+            first_alerts.setdefault(alert['objectId'], alert)
+            latest_alerts[alert['objectId']] = alert
+
+        new_obj_ids = self.insert_objs(first_alerts)
+        counts['objs'] = len(new_obj_ids)
+        counts['candidates'] = self.insert_candidates(alerts)
+        counts['photometry'] = self.insert_photometry(alerts)
+        counts['thumbnails'] = self.insert_thumbnails(latest_alerts, new_obj_ids)
+        return counts
+
+    def insert_objs(self, first_alerts):
+        """Create the Objs that do not exist yet, and return their IDs."""
+        objs = Obj.__table__
+        rows = [
+            {
+                'id': obj_id,
+                'ra': alert['candidate']['ra'],
+                'dec': alert['candidate']['dec'],
+                'ra_dis': alert['candidate']['ra'],
+                'dec_dis': alert['candidate']['dec'],
+            }
+            for obj_id, alert in first_alerts.items()
+        ]
+        result = DBSession().execute(
+            psql.insert(objs).values(rows).on_conflict_do_nothing().returning(objs.c.id)
+        )
+        return {obj_id for obj_id, in result}
+
+    def insert_candidates(self, alerts):
+        """Create the Candidates of the alerts, and return how many are new."""
+        candidates = Candidate.__table__
+        passed_at = Time([alert['candidate']['jd'] for alert in alerts], format='jd')
+        rows = [
+            {
+                'obj_id': alert['objectId'],
+                'filter_id': self.filter_id,
+                'passed_at': time.datetime,
+                'passing_alert_id': alert['candid'],
+                'uploader_id': self.user_id,
+            }
+            for alert, time in zip(alerts, passed_at)
+        ]
+        result = DBSession().execute(
+            psql.insert(candidates)
+            .values(rows)
+            .on_conflict_do_nothing()
+            .returning(candidates.c.id)
+        )
+        return len(result.fetchall())
+
+    def insert_photometry(self, alerts):
+        """Add the photometry of the alerts that is not stored yet, and share
+        the stored photometry with the groups. Return the number of points."""
+        rows = pd.DataFrame(
+            [row for alert in alerts for row in alert_photometry(alert)]
+        )
+        if len(rows) == 0:
+            return 0
+        # alerts of the same Obj repeat its history
+        rows = rows.drop_duplicates(subset=['obj_id', 'mjd', 'flux', 'fluxerr'])
+
+        data = rows.astype(object).where(pd.notnull(rows), None).to_dict('list')
+        data.update(
+            instrument_id=self.instrument_id,
+            zp=ALERT_ZP,
+            magsys='ab',
+        )
+        df, instrument_cache = standardize_photometry_data(data)
+
+        lock_photometry_of_objs(df['obj_id'].unique().tolist())
+        ids, _ = bulk_insert_new_photometry_data(
+            df, instrument_cache, self.group_ids, self.user_id, validate=False
+        )
+        return len(ids)
+
+    def insert_thumbnails(self, latest_alerts, new_obj_ids):
+        """Replace the cutout thumbnails of each Obj by those of its latest
+        alert, and link the SDSS and DESI DR8 thumbnails of the new Objs.
+        Return the number of new thumbnails."""
+        cutouts = [
+            (obj_id, ttype, alert[key]['stampData'])
+            for obj_id, alert in latest_alerts.items()
+            for key, ttype in CUTOUT_TYPES.items()
+            if alert.get(key) is not None
+        ]
+        images = self._executor.map(
+            render_cutout, [stamp_data for _, _, stamp_data in cutouts]
+        )
+
+        rows = []
+        for (obj_id, ttype, _), image in zip(cutouts, images):
+            digest = thumbnail_store.put(image)
+            rows.append(
+                {
+                    'obj_id': obj_id,
+                    'type': ttype,
+                    'file_uri': str(thumbnail_store.path(digest)),
+                    'public_url': thumbnail_store.url(digest),
+                }
+            )
+
+        thumbnails = Thumbnail.__table__
+        DBSession().execute(
+            thumbnails.delete()
+            .where(
+                thumbnails.c.obj_id.in_(sorted({obj_id for obj_id, _, _ in cutouts}))
+            )
+            .where(thumbnails.c.type.in_(list(CUTOUT_TYPES.values())))
+        )
+        if len(rows) > 0:
+            DBSession().execute(thumbnails.insert(), rows)
+        insert_linked_thumbnails(
+            [
+                (obj_id, alert['candidate']['ra'], alert['candidate']['dec'])
+                for obj_id, alert in latest_alerts.items()
+                if obj_id in new_obj_ids
+            ]
+        )
+        thumbnail_store.flush()
+        return len(rows) + 2 * len(new_obj_ids)
@@ -11,6 +11,7 @@ from skyportal.handlers.api import (
     AllocationHandler,
     AssignmentHandler,
     CandidateHandler,
+    CandidateBulkHandler,
     ClassificationHandler,
     CommentHandler,
     CommentAttachmentHandler,
@@ -30,6 +31,7 @@ from skyportal.handlers.api import (
     UserObjListHandler,
     NewsFeedHandler,
     ObservingRunHandler,
+    ObservingRunFindingChartsHandler,
     PhotometryHandler,
     BulkDeletePhotometryHandler,
     ObjPhotometryHandler,
@@ -57,6 +59,8 @@ from skyportal.handlers.api import (
     TaxonomyHandler,
     TelescopeHandler,
     ThumbnailHandler,
+    ThumbnailBulkHandler,
+    ThumbnailImageHandler,
     UserHandler,
     WeatherHandler,
     PS1ThumbnailHandler,
@@ -91,6 +95,7 @@ skyportal_handlers = [
     (r'/api/acls', ACLHandler),
     (r'/api/allocation(/.*)?', AllocationHandler),
     (r'/api/assignment(/.*)?', AssignmentHandler),
+    (r'/api/candidates/bulk', CandidateBulkHandler),
     (r'/api/candidates(/.*)?', CandidateHandler),
     (r'/api/classification(/[0-9]+)?', ClassificationHandler),
     (r'/api/comment(/[0-9]+)?', CommentHandler),
@@ -116,6 +121,10 @@ skyportal_handlers = [
     (r'/api/instrument(/[0-9]+)?', InstrumentHandler),
     (r'/api/invitations(/.*)?', InvitationHandler),
     (r'/api/newsfeed', NewsFeedHandler),
+    (
+        r'/api/observing_run/([0-9]+)/finding_charts',
+        ObservingRunFindingChartsHandler,
+    ),
     (r'/api/observing_run(/[0-9]+)?', ObservingRunHandler),
     (r'/api/photometry(/[0-9]+)?', PhotometryHandler),
     (r'/api/sharing', SharingHandler),
@@ -142,6 +151,11 @@ skyportal_handlers = [
     (r'/api/sysinfo', SysInfoHandler),
     (r'/api/taxonomy(/.*)?', TaxonomyHandler),
     (r'/api/telescope(/[0-9]+)?', TelescopeHandler),
+    (
+        r'/api/thumbnail/image/([0-9a-f]{64})\.([a-z]+)',
+        ThumbnailImageHandler,
+    ),
+    (r'/api/thumbnail/bulk', ThumbnailBulkHandler),
     (r'/api/thumbnail(/[0-9]+)?', ThumbnailHandler),
     (r'/api/user(/[0-9]+)/acls(/.*)?', UserACLHandler),
     (r'/api/user(/[0-9]+)/roles(/.*)?', UserRoleHandler),
@@ -256,6 +270,10 @@ def make_app(cfg, baselayer_handlers, baselayer_settings, process=None, env=None
     model_util.setup_permissions()
     app.cfg = cfg
 
+    # The database may have been reset since the cached permissions of its
+    # users were stored
+    models.get_access_cache().clear()
+
     admin_token = model_util.provision_token()
     with open('.tokens.yaml', 'w') as f:
         f.write(f'INITIAL_ADMIN: {admin_token.id}\n')
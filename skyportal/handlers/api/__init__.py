@@ -1,6 +1,6 @@
 from .acls import ACLHandler, UserACLHandler
 from .allocation import AllocationHandler
-from .candidate import CandidateHandler
+from .candidate import CandidateHandler, CandidateBulkHandler
 from .classification import ClassificationHandler, ObjClassificationHandler
 from .comment import CommentHandler, CommentAttachmentHandler
 from .annotation import AnnotationHandler, ObjAnnotationHandler
@@ -22,7 +22,7 @@ from .instrument import InstrumentHandler
 from .invalid import InvalidEndpointHandler
 from .invitations import InvitationHandler
 from .news_feed import NewsFeedHandler
-from .observingrun import ObservingRunHandler
+from .observingrun import ObservingRunHandler, ObservingRunFindingChartsHandler
 from .photometry import (
     PhotometryHandler,
     ObjPhotometryHandler,
@@ -51,6 +51,10 @@ from .stream import StreamHandler, StreamUserHandler
 from .sysinfo import SysInfoHandler
 from .taxonomy import TaxonomyHandler
 from .telescope import TelescopeHandler
-from .thumbnail import ThumbnailHandler
+from .thumbnail import (
+    ThumbnailHandler,
+    ThumbnailBulkHandler,
+    ThumbnailImageHandler,
+)
 from .user import UserHandler
 from .weather import WeatherHandler
@@ -6,7 +6,9 @@ import ast
 
 import arrow
 
-from sqlalchemy.orm import joinedload
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as psql
+from sqlalchemy.orm import joinedload, selectinload
 from sqlalchemy.sql.expression import case, func
 from sqlalchemy.types import Float, Boolean
 from marshmallow.exceptions import ValidationError
@@ -24,6 +26,10 @@ from ...models import (
     Annotation,
     Group,
     Classification,
+    Comment,
+    get_readable_by_obj_ids,
+    get_detection_stats_by_obj_ids,
+    insert_linked_thumbnails,
 )
 
 
@@ -301,7 +307,7 @@ class CandidateHandler(BaseHandler):
                 application/json:
                   schema: Error
         """
-        user_accessible_group_ids = [g.id for g in self.current_user.accessible_groups]
+        user_accessible_group_ids = self.access.group_ids
         include_photometry = self.get_query_argument("includePhotometry", False)
         include_spectra = self.get_query_argument("includeSpectra", False)
 
@@ -321,7 +327,7 @@ class CandidateHandler(BaseHandler):
                 )
             c = Candidate.get_obj_if_readable_by(
                 obj_id,
-                self.current_user,
+                self.access,
                 options=query_options,
             )
             if c is None:
@@ -332,9 +338,7 @@ class CandidateHandler(BaseHandler):
                 .join(Filter)
                 .filter(
                     Candidate.obj_id == obj_id,
-                    Filter.group_id.in_(
-                        [g.id for g in self.current_user.accessible_groups]
-                    ),
+                    self.access.in_groups(Filter.group_id),
                 )
                 .all()
             )
@@ -405,13 +409,8 @@ class CandidateHandler(BaseHandler):
         annotation_filter_list = self.get_query_argument("annotationFilterList", None)
         classifications = self.get_query_argument("classifications", None)
         redshift_range_str = self.get_query_argument("redshiftRange", None)
-        user_accessible_group_ids = [g.id for g in self.current_user.accessible_groups]
-        user_accessible_filter_ids = [
-            filtr.id
-            for g in self.current_user.accessible_groups
-            for filtr in g.filters
-            if g.filters is not None
-        ]
+        user_accessible_group_ids = self.access.group_ids
+        user_accessible_filter_ids = self.access.filter_ids
         if group_ids is not None:
             if isinstance(group_ids, str) and "," in group_ids:
                 group_ids = [int(g_id) for g_id in group_ids.split(",")]
@@ -697,67 +696,12 @@ class CandidateHandler(BaseHandler):
             if "Page number out of range" in str(e):
                 return self.error("Page number out of range.")
             raise
-        matching_source_ids = (
-            DBSession()
-            .query(Source.obj_id)
-            .filter(Source.group_id.in_(user_accessible_group_ids))
-            .filter(Source.obj_id.in_([obj.id for obj in query_results["candidates"]]))
-            .all()
+        candidate_list = get_candidates_info(
+            query_results["candidates"],
+            self.access,
+            user_accessible_group_ids,
+            user_accessible_filter_ids,
         )
-        candidate_list = []
-        for obj in query_results["candidates"]:
-            with DBSession().no_autoflush:
-                obj.is_source = (obj.id,) in matching_source_ids
-                if obj.is_source:
-                    obj.saved_groups = (
-                        DBSession()
-                        .query(Group)
-                        .join(Source)
-                        .filter(Source.obj_id == obj.id)
-                        .filter(Source.active.is_(True))
-                        .filter(Group.id.in_(user_accessible_group_ids))
-                        .all()
-                    )
-                    obj.classifications = obj.get_classifications_readable_by(
-                        self.current_user
-                    )
-                obj.passing_group_ids = [
-                    f.group_id
-                    for f in (
-                        DBSession()
-                        .query(Filter)
-                        .filter(Filter.id.in_(user_accessible_filter_ids))
-                        .filter(
-                            Filter.id.in_(
-                                DBSession()
-                                .query(Candidate.filter_id)
-                                .filter(Candidate.obj_id == obj.id)
-                            )
-                        )
-                        .all()
-                    )
-                ]
-                candidate_list.append(obj.to_dict())
-                candidate_list[-1]["comments"] = sorted(
-                    [
-                        cmt.to_dict()
-                        for cmt in obj.get_comments_readable_by(self.current_user)
-                    ],
-                    key=lambda x: x["created_at"],
-                    reverse=True,
-                )
-                candidate_list[-1]["annotations"] = sorted(
-                    obj.get_annotations_readable_by(self.current_user),
-                    key=lambda x: x.origin,
-                )
-                candidate_list[-1]["last_detected_at"] = obj.last_detected_at
-                candidate_list[-1]["gal_lat"] = obj.gal_lat_deg
-                candidate_list[-1]["gal_lon"] = obj.gal_lon_deg
-                candidate_list[-1]["luminosity_distance"] = obj.luminosity_distance
-                candidate_list[-1]["dm"] = obj.dm
-                candidate_list[-1][
-                    "angular_diameter_distance"
-                ] = obj.angular_diameter_distance
 
         query_results["candidates"] = candidate_list
         self.verify_permissions()
@@ -834,12 +778,7 @@ class CandidateHandler(BaseHandler):
             filter_ids = data.pop("filter_ids")
         except KeyError:
             return self.error("Missing required filter_ids parameter.")
-        user_accessible_filter_ids = [
-            filtr.id
-            for g in self.current_user.accessible_groups
-            for filtr in g.filters
-            if g.filters is not None
-        ]
+        user_accessible_filter_ids = self.access.filter_ids
         if not all([fid in user_accessible_filter_ids for fid in filter_ids]):
             return self.error(
                 "Insufficient permissions - you must only specify "
@@ -907,6 +846,234 @@ class CandidateHandler(BaseHandler):
         return self.success()
 
 
+class CandidateBulkHandler(BaseHandler):
+    @permissions(["Upload data"])
+    def post(self):
+        """
+        ---
+        description: |
+          Create many candidates at once. Each Obj is created, or updated with
+          the given fields if it exists, and passes each of its filters at
+          `passed_at`. Candidates that already exist for the same Obj, filter
+          and `passed_at` are updated with the new `passing_alert_id`.
+        tags:
+          - candidates
+        requestBody:
+          content:
+            application/json:
+              schema:
+                type: object
+                properties:
+                  candidates:
+                    type: array
+                    items:
+                      allOf:
+                        - $ref: '#/components/schemas/Obj'
+                        - type: object
+                          properties:
+                            filter_ids:
+                              type: array
+                              items:
+                                type: integer
+                              description: List of associated filter IDs
+                            passing_alert_id:
+                              type: integer
+                              description: ID of associated filter that created candidate
+                              nullable: true
+                            passed_at:
+                              type: string
+                              description: Arrow-parseable datetime string indicating when passed filter.
+                          required:
+                            - filter_ids
+                            - passed_at
+                required:
+                  - candidates
+        responses:
+          200:
+            content:
+              application/json:
+                schema:
+                  allOf:
+                    - $ref: '#/components/schemas/Success'
+                    - type: object
+                      properties:
+                        data:
+                          type: object
+                          properties:
+                            ids:
+                              type: array
+                              items:
+                                type: integer
+                              description: |
+                                IDs of the candidates, in the order of the Objs
+                                and of their filter IDs
+          400:
+            content:
+              application/json:
+                schema: Error
+        """
+        data = self.get_json()
+        items = data.get("candidates")
+        if not isinstance(items, list):
+            return self.error("Missing required parameter: `candidates`.")
+
+        schema = Obj.__schema__()
+        objs = {}
+        candidates = []
+        for i, item in enumerate(items):
+            if not isinstance(item, dict) or item.get("id") is None:
+                return self.error(
+                    f"Missing required parameter for candidate {i}: `id`."
+                )
+            item = dict(item)
+            passing_alert_id = item.pop("passing_alert_id", None)
+            passed_at = item.pop("passed_at", None)
+            if passed_at is None:
+                return self.error(
+                    f"Missing required parameter for candidate {i}: `passed_at`."
+                )
+            try:
+                passed_at = arrow.get(passed_at).to("utc").naive
+            except (TypeError, ValueError):
+                return self.error(f"Invalid `passed_at` for candidate {i}: {passed_at}")
+            filter_ids = item.pop("filter_ids", None)
+            if not isinstance(filter_ids, list) or len(filter_ids) == 0:
+                return self.error(
+                    f"Missing required filter_ids parameter for candidate {i}."
+                )
+            try:
+                filter_ids = [int(filter_id) for filter_id in filter_ids]
+            except (TypeError, ValueError):
+                return self.error(f"Invalid filter_ids for candidate {i}: {filter_ids}")
+
+            errors = schema.validate(item)
+            if errors:
+                return self.error(
+                    f"Invalid/missing parameters for candidate {i}: {errors}"
+                )
+            objs.setdefault(item["id"], {}).update(item)
+            candidates.extend(
+                (item["id"], filter_id, passed_at, passing_alert_id)
+                for filter_id in filter_ids
+            )
+
+        # authorize all filters at once
+        filter_ids = {filter_id for _, filter_id, _, _ in candidates}
+        accessible_filter_ids = {
+            filter_id
+            for filter_id, in DBSession()
+            .query(Filter.id)
+            .filter(Filter.id.in_(filter_ids))
+            .filter(self.access.in_groups(Filter.group_id))
+        }
+        if accessible_filter_ids != filter_ids:
+            return self.error(
+                "Insufficient permissions - you must only specify "
+                "filters that you have access to."
+            )
+
+        existing_obj_ids = {
+            obj_id
+            for obj_id, in DBSession().query(Obj.id).filter(Obj.id.in_(list(objs)))
+        }
+        for obj_id, values in objs.items():
+            if obj_id not in existing_obj_ids and (
+                values.get("ra") is None or values.get("dec") is None
+            ):
+                return self.error(
+                    f"RA and Dec must not be null for a new Obj: {obj_id}"
+                )
+
+        now = datetime.datetime.utcnow()
+
+        # upsert the Objs, with one statement per set of given fields
+        obj_table = Obj.__table__
+        rows_by_columns = {}
+        for values in objs.values():
+            row = {key: value for key, value in values.items() if key in obj_table.c}
+            rows_by_columns.setdefault(tuple(sorted(row)), []).append(row)
+        new_obj_ids = set()
+        for columns, rows in rows_by_columns.items():
+            insert = psql.insert(obj_table).values(rows)
+            updated = {
+                column: insert.excluded[column] for column in columns if column != "id"
+            }
+            if updated:
+                insert = insert.on_conflict_do_update(
+                    index_elements=[obj_table.c.id], set_={**updated, "modified": now}
+                )
+            else:
+                insert = insert.on_conflict_do_nothing()
+            # xmax is zero for inserted rows
+            result = DBSession().execute(
+                insert.returning(obj_table.c.id, sa.literal_column("xmax = 0"))
+            )
+            new_obj_ids.update(obj_id for obj_id, inserted in result if inserted)
+
+        redshift_obj_ids = [
+            obj_id for obj_id, values in objs.items() if "redshift" in values
+        ]
+        if len(redshift_obj_ids) > 0:
+            for obj in Obj.query.filter(Obj.id.in_(redshift_obj_ids)):
+                update_redshift_history_if_relevant(
+                    objs[obj.id], obj, self.associated_user_object
+                )
+
+        # upsert the Candidates on candidates_main_index
+        candidate_table = Candidate.__table__
+        candidate_rows = {
+            (obj_id, filter_id, passed_at): {
+                "obj_id": obj_id,
+                "filter_id": filter_id,
+                "passed_at": passed_at,
+                "passing_alert_id": passing_alert_id,
+                "uploader_id": self.associated_user_object.id,
+            }
+            for obj_id, filter_id, passed_at, passing_alert_id in candidates
+        }
+        insert = psql.insert(candidate_table).values(list(candidate_rows.values()))
+        insert = insert.on_conflict_do_update(
+            index_elements=[
+                candidate_table.c.obj_id,
+                candidate_table.c.filter_id,
+                candidate_table.c.passed_at,
+            ],
+            set_={
+                "passing_alert_id": insert.excluded.passing_alert_id,
+                "modified": now,
+            },
+        )
+        result = DBSession().execute(
+            insert.returning(
+                candidate_table.c.id,
+                candidate_table.c.obj_id,
+                candidate_table.c.filter_id,
+                candidate_table.c.passed_at,
+            )
+        )
+        ids_by_key = {
+            (obj_id, filter_id, passed_at): id
+            for id, obj_id, filter_id, passed_at in result
+        }
+
+        insert_linked_thumbnails(
+            [
+                (obj_id, objs[obj_id]["ra"], objs[obj_id]["dec"])
+                for obj_id in sorted(new_obj_ids)
+            ]
+        )
+        self.finalize_transaction()
+
+        return self.success(
+            data={
+                "ids": [
+                    ids_by_key[(obj_id, filter_id, passed_at)]
+                    for obj_id, filter_id, passed_at, _ in candidates
+                ]
+            }
+        )
+
+
 def grab_query_results(
     q,
     total_matches,
@@ -994,15 +1161,123 @@ def grab_query_results(
     else:
         page_ids = ordered_ids.all()
 
-    items = []
-    query_options = [joinedload(Obj.thumbnails)]
+    # Load all of the page's Objs (and their collections) with one query
+    # per relationship, then restore the ordering of `page_ids`
+    page_ids = [row[0] for row in page_ids]
+    query_options = [selectinload(Obj.thumbnails)]
     if include_photometry:
         query_options.append(
-            joinedload(Obj.photometry).joinedload(Photometry.instrument)
+            selectinload(Obj.photometry).joinedload(Photometry.instrument)
         )
     if include_spectra:
-        query_options.append(joinedload(Obj.spectra).joinedload(Spectrum.instrument))
-    for item_id in page_ids:
-        items.append(Obj.query.options(query_options).get(item_id))
-    info[items_name] = items
+        query_options.append(selectinload(Obj.spectra).joinedload(Spectrum.instrument))
+    objs_by_id = {
+        obj.id: obj
+        for obj in Obj.query.filter(Obj.id.in_(page_ids)).options(*query_options)
+    }
+    info[items_name] = [objs_by_id[item_id] for item_id in page_ids]
     return info
+
+
+def get_candidates_info(
+    objs, user_or_token, user_accessible_group_ids, user_accessible_filter_ids
+):
+    """Serialize a page of candidate Objs for the `CandidateHandler` list
+    response, using a fixed number of `IN (...)` queries for the whole page.
+
+    Parameters
+    ----------
+    objs : list of `skyportal.models.Obj`
+       The candidate Objs to serialize.
+    user_or_token : `baselayer.app.models.User`, `baselayer.app.models.Token` or `AccessContext`
+       The requesting `User` or `Token` object, or its access context.
+    user_accessible_group_ids : list of int
+       IDs of the groups accessible to the requester.
+    user_accessible_filter_ids : list of int
+       IDs of the filters accessible to the requester.
+
+    Returns
+    -------
+    candidate_list : list of dict
+       The serialized candidates, in the same order as `objs`.
+    """
+    obj_ids = [obj.id for obj in objs]
+
+    saved_groups = {obj_id: [] for obj_id in obj_ids}
+    if len(obj_ids) > 0:
+        saved_group_rows = (
+            DBSession()
+            .query(Source.obj_id, Group)
+            .join(Group, Source.group_id == Group.id)
+            .filter(Source.obj_id.in_(obj_ids))
+            .filter(Source.active.is_(True))
+            .filter(Group.id.in_(user_accessible_group_ids))
+        )
+        for obj_id, group in saved_group_rows:
+            saved_groups[obj_id].append(group)
+    is_source = {
+        row[0]
+        for row in DBSession()
+        .query(Source.obj_id)
+        .filter(Source.group_id.in_(user_accessible_group_ids))
+        .filter(Source.obj_id.in_(obj_ids))
+        .distinct()
+    }
+
+    passing_group_ids = {obj_id: [] for obj_id in obj_ids}
+    if len(obj_ids) > 0:
+        passing_filters = (
+            DBSession()
+            .query(Candidate.obj_id, Filter.id, Filter.group_id)
+            .join(Filter, Candidate.filter_id == Filter.id)
+            .filter(Candidate.obj_id.in_(obj_ids))
+            .filter(Filter.id.in_(user_accessible_filter_ids))
+            .distinct()
+        )
+        for obj_id, _, group_id in passing_filters:
+            passing_group_ids[obj_id].append(group_id)
+
+    source_obj_ids = [obj_id for obj_id in obj_ids if obj_id in is_source]
+    classifications = get_readable_by_obj_ids(
+        Classification, source_obj_ids, user_or_token
+    )
+    comments = get_readable_by_obj_ids(
+        Comment, obj_ids, user_or_token, options=[joinedload(Comment.author)]
+    )
+    annotations = get_readable_by_obj_ids(
+        Annotation, obj_ids, user_or_token, options=[joinedload(Annotation.author)]
+    )
+    detection_stats = get_detection_stats_by_obj_ids(obj_ids)
+
+    candidate_list = []
+    for obj in objs:
+        with DBSession().no_autoflush:
+            obj.is_source = obj.id in is_source
+            if obj.is_source:
+                obj.saved_groups = saved_groups[obj.id]
+                obj.classifications = classifications[obj.id]
+            obj.passing_group_ids = passing_group_ids[obj.id]
+            for comment in comments[obj.id]:
+                comment.author_info = comment.construct_author_info_dict()
+            for annotation in annotations[obj.id]:
+                annotation.author_info = annotation.construct_author_info_dict()
+            candidate_list.append(obj.to_dict())
+            candidate_list[-1]["comments"] = sorted(
+                [cmt.to_dict() for cmt in comments[obj.id]],
+                key=lambda x: x["created_at"],
+                reverse=True,
+            )
+            candidate_list[-1]["annotations"] = sorted(
+                annotations[obj.id], key=lambda x: x.origin
+            )
+            candidate_list[-1]["last_detected_at"] = detection_stats[obj.id][
+                "last_detected_at"
+            ]
+            candidate_list[-1]["gal_lat"] = obj.gal_lat_deg
+            candidate_list[-1]["gal_lon"] = obj.gal_lon_deg
+            candidate_list[-1]["luminosity_distance"] = obj.luminosity_distance
+            candidate_list[-1]["dm"] = obj.dm
+            candidate_list[-1][
+                "angular_diameter_distance"
+            ] = obj.angular_diameter_distance
+    return candidate_list
@@ -1,12 +1,32 @@
 from baselayer.app.access import auth_or_token
+from baselayer.app.env import load_env
+from baselayer.app.json_util import to_json
 from ...base import BaseHandler
 from .... import plot
 from ....models import ClassicalAssignment, Source, Telescope
+from ....utils.cache import Cache
 
+import json as json_lib
 import numpy as np
 from astropy import time as ap_time
 import pandas as pd
 
+_, cfg = load_env()
+
+photometry_plot_cache = None
+
+
+def get_photometry_plot_cache():
+    """Return the disk cache of rendered photometry plots, keyed on the
+    plotted data and the plot layout, opening it on first use."""
+    global photometry_plot_cache
+    if photometry_plot_cache is None:
+        photometry_plot_cache = Cache(
+            cache_dir="./cache/photometry_plots/",
+            max_items=cfg["misc.photometry_plot_cache_max_items"],
+        )
+    return photometry_plot_cache
+
 
 device_types = [
     "browser",
@@ -26,13 +46,32 @@ class PlotPhotometryHandler(BaseHandler):
         # Just return browser by default if not one of accepted types
         if device not in device_types:
             device = "browser"
-        json = plot.photometry_plot(
-            obj_id,
-            self.current_user,
-            height=int(height),
-            width=int(width),
-            device=device,
-        )
+
+        gids = sorted(self.access.group_ids)
+        version = plot.get_photometry_plot_version(obj_id, self.access)
+        cache_key = f"{obj_id}/{gids}/{device}/{width}x{height}/{version}"
+        json = None
+        photometry_plot_cache = get_photometry_plot_cache()
+        cached_plot = photometry_plot_cache[cache_key]
+        if cached_plot is not None:
+            try:
+                json = json_lib.loads(cached_plot.read_bytes())
+            except (FileNotFoundError, ValueError):
+                # evicted by another process
+                pass
+
+        if json is None:
+            json = plot.photometry_plot(
+                obj_id,
+                self.current_user,
+                height=int(height),
+                width=int(width),
+                device=device,
+            )
+            # objects without photometry have no plot to cache
+            if isinstance(json, dict):
+                photometry_plot_cache[cache_key] = to_json(json).encode('utf-8')
+
         self.verify_permissions()
         self.success(data={'bokehJSON': json, 'url': self.request.uri})
 
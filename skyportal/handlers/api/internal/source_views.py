@@ -51,7 +51,7 @@ class SourceViewsHandler(BaseHandler):
         for view, obj_id in query_results:
             s = Source.get_obj_if_readable_by(  # Returns Source.obj
                 obj_id,
-                self.current_user,
+                self.access,
                 options=[joinedload(Source.obj).joinedload(Obj.thumbnails)],
             )
             public_url = first_thumbnail_public_url(s.thumbnails)
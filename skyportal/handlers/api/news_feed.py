@@ -58,11 +58,7 @@ class NewsFeedHandler(BaseHandler):
                 model.obj_id.in_(
                     DBSession()
                     .query(Source.obj_id)
-                    .filter(
-                        Source.group_id.in_(
-                            [g.id for g in self.current_user.accessible_groups]
-                        )
-                    )
+                    .filter(self.access.in_groups(Source.group_id))
                 )
             )
             if model == Photometry:
@@ -1,6 +1,14 @@
+import asyncio
+import datetime
+import functools
+import zipfile
+
 import numpy as np
+from dateutil.parser import isoparse
 from sqlalchemy.orm import joinedload
 from marshmallow.exceptions import ValidationError
+from tornado.ioloop import IOLoop
+from tornado.iostream import StreamClosedError
 from baselayer.app.access import permissions, auth_or_token, AccessError
 from ..base import BaseHandler
 from ...models import (
@@ -12,6 +20,17 @@ from ...models import (
     Source,
 )
 from ...schema import ObservingRunPost, ObservingRunGetWithAssignments
+from ...utils import (
+    catalog_client,
+    facility_parameters,
+    source_image_parameters,
+    get_finding_chart,
+    get_finding_chart_pool,
+    prefetch_finding_chart_data,
+    _calculate_best_position_from_columns,
+)
+from ...utils.offset import starlist_formats
+from .photometry import get_photometry_positions
 
 
 class ObservingRunHandler(BaseHandler):
@@ -134,7 +153,7 @@ class ObservingRunHandler(BaseHandler):
             assignments = []
             for a in run.assignments:
                 try:
-                    obj = Obj.get_if_readable_by(a.obj.id, self.current_user)
+                    obj = Obj.get_if_readable_by(a.obj.id, self.access)
                 except AccessError:
                     continue
                 if obj is not None:
@@ -282,3 +301,280 @@ class ObservingRunHandler(BaseHandler):
 
         self.push_all(action="skyportal/FETCH_OBSERVING_RUNS")
         return self.success()
+
+
+class _ZipStream:
+    """Write-only file object buffering a ZIP archive between the chunks in
+    which it is sent, so that it is never held in memory as a whole."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ObservingRunFindingChartsHandler(BaseHandler):
+    @auth_or_token
+    async def get(self, run_id):
+        """
+        ---
+        description: |
+          Generate the finding charts of all the targets of an observing run,
+          and a starlist of the targets and their offset stars, as a ZIP file.
+          The charts are rendered in parallel and sent as they are completed.
+        tags:
+          - observing_runs
+        parameters:
+        - in: path
+          name: run_id
+          required: true
+          schema:
+            type: integer
+        - in: query
+          name: imsize
+          schema:
+            type: float
+            minimum: 2
+            maximum: 15
+          description: Image size in arcmin (square)
+        - in: query
+          name: facility
+          nullable: true
+          schema:
+            type: string
+            enum: [Keck, Shane, P200]
+        - in: query
+          name: image_source
+          nullable: true
+          schema:
+            type: string
+            enum: [desi, dss, ztfref]
+          description: Source of the image used in the finding charts
+        - in: query
+          name: use_ztfref
+          required: false
+          schema:
+            type: boolean
+          description: |
+            Use ZTFref catalog for offset star positions, otherwise DR2
+        - in: query
+          name: obstime
+          nullable: True
+          schema:
+            type: string
+          description: |
+            datetime of observation in isoformat (e.g. 2020-12-30T12:34:10).
+            Defaults to the sunset of the night of the run.
+        - in: query
+          name: num_offset_stars
+          schema:
+            type: integer
+            minimum: 0
+            maximum: 4
+          description: |
+            output desired number of offset stars [0,5] (default: 3)
+        responses:
+          200:
+            description: |
+              A ZIP file of the PDF finding charts and of the starlist
+            content:
+              application/zip:
+                schema:
+                  type: string
+                  format: binary
+          400:
+            content:
+              application/json:
+                schema: Error
+        """
+        run = (
+            DBSession()
+            .query(ObservingRun)
+            .options(
+                joinedload(ObservingRun.assignments).joinedload(
+                    ClassicalAssignment.obj
+                ),
+                joinedload(ObservingRun.instrument).joinedload(Instrument.telescope),
+            )
+            .filter(ObservingRun.id == run_id)
+            .first()
+        )
+        if run is None:
+            return self.error(
+                f"Could not load observing run {run_id}", data={"run_id": run_id}
+            )
+
+        imsize = self.get_query_argument('imsize', '4.0')
+        try:
+            imsize = float(imsize)
+        except ValueError:
+            # could not handle inputs
+            return self.error('Invalid argument for `imsize`')
+
+        if imsize < 2.0 or imsize > 15.0:
+            return self.error('The value for `imsize` is outside the allowed range')
+
+        facility = self.get_query_argument('facility', 'Keck')
+        image_source = self.get_query_argument('image_source', 'ztfref')
+        use_ztfref = self.get_query_argument('use_ztfref', True)
+        if isinstance(use_ztfref, str):
+            use_ztfref = use_ztfref in ['t', 'True', 'true', 'yes', 'y']
+
+        num_offset_stars = self.get_query_argument('num_offset_stars', '3')
+        try:
+            num_offset_stars = int(num_offset_stars)
+        except ValueError:
+            # could not handle inputs
+            return self.error('Invalid argument for `num_offset_stars`')
+
+        obstime = self.get_query_argument('obstime', None)
+        if obstime is None:
+            obstime = run.instrument.telescope.next_sunset(run.calendar_noon).isot
+        elif not isinstance(isoparse(obstime), datetime.datetime):
+            return self.error('obstime is not valid isoformat')
+
+        if facility not in facility_parameters:
+            return self.error('Invalid facility')
+
+        if image_source not in source_image_parameters:
+            return self.error('Invalid source image')
+
+        # the targets visible to the user, ordered by ra
+        objs = {}
+        for a in sorted(run.assignments, key=lambda a: a.obj.ra):
+            try:
+                obj = Obj.get_if_readable_by(a.obj.id, self.access)
+            except AccessError:
+                continue
+            if obj is not None:
+                objs[obj.id] = obj
+
+        positions = get_photometry_positions(list(objs))
+        targets = {
+            obj_id: _calculate_best_position_from_columns(
+                positions[obj_id], fallback=(obj.ra, obj.dec), how="snr2"
+            )
+            for obj_id, obj in objs.items()
+        }
+
+        self.verify_permissions()
+
+        if len(targets) == 0:
+            return self.error(f"Observing run {run_id} has no targets")
+
+        self.push_notification(
+            f'Generating {len(targets)} finding charts. Download will start soon.'
+        )
+
+        # Fetch the catalogs and images shared by nearby targets once, before
+        # rendering the charts in other processes
+        await asyncio.gather(
+            *[
+                catalog_client.run(
+                    prefetch_finding_chart_data,
+                    ra,
+                    dec,
+                    imsize=imsize,
+                    image_source=image_source,
+                )
+                for ra, dec in targets.values()
+            ],
+            return_exceptions=True,
+        )
+
+        pool = get_finding_chart_pool()
+        finder_kwargs = dict(
+            image_source=image_source,
+            output_format='pdf',
+            imsize=imsize,
+            how_many=num_offset_stars,
+            radius_degrees=facility_parameters[facility]["radius_degrees"],
+            mag_limit=facility_parameters[facility]["mag_limit"],
+            mag_min=facility_parameters[facility]["mag_min"],
+            min_sep_arcsec=facility_parameters[facility]["min_sep_arcsec"],
+            starlist_type=facility,
+            obstime=obstime,
+            use_source_pos_in_starlist=True,
+            allowed_queries=2,
+            queries_issued=0,
+            use_ztfref=use_ztfref,
+        )
+
+        async def render(obj_id, ra, dec):
+            try:
+                rez = await IOLoop.current().run_in_executor(
+                    pool,
+                    functools.partial(
+                        get_finding_chart, ra, dec, obj_id, **finder_kwargs
+                    ),
+                )
+            except Exception as e:
+                rez = {'success': False, 'reason': str(e)}
+            return obj_id, rez
+
+        # do not send result via `.success`, since that creates a JSON
+        self.set_status(200)
+        self.set_header("Content-Type", "application/zip")
+        self.set_header(
+            "Content-Disposition",
+            f"attachment; filename=observing_run_{run.id}_finding_charts.zip",
+        )
+        self.set_header(
+            'Cache-Control', 'no-store, no-cache, must-revalidate, max-age=0'
+        )
+
+        stream = _ZipStream()
+        starlists = {}
+        with zipfile.ZipFile(stream, mode='w') as archive:
+            for rendered in asyncio.as_completed(
+                [render(obj_id, ra, dec) for obj_id, (ra, dec) in targets.items()]
+            ):
+                obj_id, rez = await rendered
+                starlists[obj_id] = rez
+                if not rez['success']:
+                    continue
+                archive.writestr(rez['name'], rez['data'])
+                try:
+                    self.write(stream.pop())
+                    await self.flush()
+                except StreamClosedError:
+                    # the client has closed the connection
+                    return
+
+            # a single starlist of all the targets, ordered by ra
+            commentstr = starlist_formats[facility]["commentstr"]
+            header, failures, lines = [], [], []
+            for obj_id in targets:
+                rez = starlists[obj_id]
+                if not rez['success']:
+                    failures.append(
+                        f"{commentstr} No finding chart for {obj_id}: {rez['reason']}"
+                    )
+                    continue
+                for star in rez['starlist_info']:
+                    if 'ra' not in star:
+                        # first line of the format, e.g., for Shane
+                        if star['str'] not in header:
+                            header.append(star['str'])
+                    else:
+                        lines.append(star['str'])
+            archive.writestr(
+                f'observing_run_{run.id}_starlist_{facility}.txt',
+                '\n'.join(header + failures + lines) + '\n',
+            )
+
+        try:
+            self.write(stream.pop())
+            await self.flush()
+        except StreamClosedError:
+            pass
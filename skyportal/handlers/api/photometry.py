@@ -1,23 +1,31 @@
+import io
+import json
+import functools
 import uuid
 import math
+from datetime import datetime
 
 from astropy.time import Time
 from astropy.table import Table
 from marshmallow.exceptions import ValidationError
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import sncosmo
 from sncosmo.photdata import PhotometricData
 
 import sqlalchemy as sa
+import tornado
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.sql.expression import FromClause
 from sqlalchemy.sql import column
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, selectinload, Session
 from sqlalchemy import and_
 
 from baselayer.app.access import permissions, auth_or_token
 from baselayer.app.env import load_env
+from baselayer.app.json_util import to_json
 from ..base import BaseHandler
 from ...models import (
     DBSession,
@@ -27,6 +35,7 @@ from ...models import (
     Obj,
     PHOT_ZP,
     GroupPhotometry,
+    refresh_photometry_summaries,
 )
 
 from ...schema import (
@@ -37,10 +46,19 @@ from ...schema import (
     PhotometryRangeQuery,
 )
 from ...enum_types import ALLOWED_MAGSYSTEMS
+from ...utils import POSITION_COLUMNS
 
 
 _, cfg = load_env()
 
+PHOTOMETRY_STREAM_PAGE_SIZE = 1000
+
+# content types of the columnar output formats of the photometry endpoints
+COLUMNAR_PHOTOMETRY_FORMATS = {
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
 
 def nan_to_none(value):
     """Coerce a value to None if it is nan, else return value."""
@@ -54,293 +72,837 @@ def allscalar(d):
     return all(np.isscalar(v) or v is None for v in d.values())
 
 
-def serialize(phot, outsys, format):
-
-    return_value = {
-        'obj_id': phot.obj_id,
-        'ra': phot.ra,
-        'dec': phot.dec,
-        'filter': phot.filter,
-        'mjd': phot.mjd,
-        'instrument_id': phot.instrument_id,
-        'instrument_name': phot.instrument.name,
-        'ra_unc': phot.ra_unc,
-        'dec_unc': phot.dec_unc,
-        'origin': phot.origin,
-        'id': phot.id,
-        'groups': phot.groups,
-    }
-
-    filter = phot.filter
-
-    magsys_db = sncosmo.get_magsystem('ab')
-    outsys = sncosmo.get_magsystem(outsys)
-
-    relzp_out = 2.5 * np.log10(outsys.zpbandflux(filter))
-
-    # note: these are not the actual zeropoints for magnitudes in the db or
-    # packet, just ones that can be used to derive corrections when
-    # compared to relzp_out
+@functools.lru_cache(maxsize=None)
+def get_relative_zeropoint(magsys, filter):
+    """Return 2.5 log10 of the flux of the zeropoint of a magnitude system in
+    a filter. These are not the actual zeropoints, but differences between
+    them give the correction from one magnitude system to another. The
+    values are cached for the lifetime of the process.
+
+    Parameters
+    ----------
+    magsys : str
+        The name of the sncosmo magnitude system.
+    filter : str
+        The name of the sncosmo bandpass.
+
+    Returns
+    -------
+    relzp : float
+        The relative zeropoint.
+    """
+    return 2.5 * np.log10(sncosmo.get_magsystem(magsys).zpbandflux(filter))
+
+
+def get_zeropoint_corrections(outsys, insys, filters):
+    """Return the corrections from one magnitude system to another for an
+    array of filters, looking up the zeropoints once per distinct filter.
+
+    Parameters
+    ----------
+    outsys : str
+        The name of the sncosmo magnitude system to correct to.
+    insys : str
+        The name of the sncosmo magnitude system to correct from.
+    filters : array-like of str
+        The names of the sncosmo bandpasses.
+
+    Returns
+    -------
+    corrections : `numpy.ndarray`
+        The correction to add to magnitudes in `insys` in each filter.
+    """
+    unique_filters, filter_index = np.unique(filters, return_inverse=True)
+    return np.array(
+        [
+            get_relative_zeropoint(outsys, filter)
+            - get_relative_zeropoint(insys, filter)
+            for filter in unique_filters
+        ]
+    )[filter_index]
+
+
+def serialize_photometry(photometry, outsys, format):
+    """Serialize a list of Photometry rows in a given magnitude system and
+    format. The magnitudes, limits and zeropoints of all rows are computed
+    with array operations, using the cached zeropoint correction of each
+    filter.
+
+    Parameters
+    ----------
+    photometry : list of `skyportal.models.Photometry`
+        The rows to serialize. Their `instrument` and `groups` are accessed,
+        so load them eagerly when serializing many rows.
+    outsys : str
+        The magnitude system of the output.
+    format : {'mag', 'flux'}
+        Whether to return magnitudes or fluxes.
+
+    Returns
+    -------
+    output : list of dict
+        The serialized photometry, in the order of `photometry`.
+    """
+    if format not in ['mag', 'flux']:
+        raise ValueError(
+            'Invalid output format specified. Must be one of '
+            f"['flux', 'mag'], got '{format}'."
+        )
 
-    relzp_db = 2.5 * np.log10(magsys_db.zpbandflux(filter))
-    db_correction = relzp_out - relzp_db
+    outsys_name = sncosmo.get_magsystem(outsys).name
+    output = [
+        {
+            'obj_id': phot.obj_id,
+            'ra': phot.ra,
+            'dec': phot.dec,
+            'filter': phot.filter,
+            'mjd': phot.mjd,
+            'instrument_id': phot.instrument_id,
+            'instrument_name': phot.instrument.name,
+            'ra_unc': phot.ra_unc,
+            'dec_unc': phot.dec_unc,
+            'origin': phot.origin,
+            'id': phot.id,
+            'groups': phot.groups,
+            'magsys': outsys_name,
+        }
+        for phot in photometry
+    ]
+    if len(output) == 0:
+        return output
+
+    flux = np.array([phot.flux for phot in photometry], dtype=float)
+    fluxerr = np.array([phot.fluxerr for phot in photometry], dtype=float)
+
+    # correction from the AB system of the database to the output system
+    db_correction = get_zeropoint_corrections(
+        outsys, 'ab', [phot.filter for phot in photometry]
+    )
 
     # this is the zeropoint for fluxes in the database that is tied
     # to the new magnitude system
     corrected_db_zp = PHOT_ZP + db_correction
 
     if format == 'mag':
-        if (
-            phot.original_user_data is not None
-            and 'limiting_mag' in phot.original_user_data
-        ):
-            magsys_packet = sncosmo.get_magsystem(phot.original_user_data['magsys'])
-            relzp_packet = 2.5 * np.log10(magsys_packet.zpbandflux(filter))
-            packet_correction = relzp_out - relzp_packet
-            maglimit = phot.original_user_data['limiting_mag']
-            maglimit_out = maglimit + packet_correction
-        else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            detected = ~np.isnan(flux) & (flux > 0)
+            mag = np.where(detected, -2.5 * np.log10(flux) + corrected_db_zp, np.nan)
+            magerr = np.where(
+                detected & (fluxerr > 0), (2.5 / np.log(10)) * fluxerr / flux, np.nan
+            )
             # calculate the limiting mag
-            fluxerr = phot.fluxerr
-            fivesigma = 5 * fluxerr
-            maglimit_out = -2.5 * np.log10(fivesigma) + corrected_db_zp
-
-        return_value.update(
-            {
-                'mag': phot.mag + db_correction
-                if nan_to_none(phot.mag) is not None
-                else None,
-                'magerr': phot.e_mag if nan_to_none(phot.e_mag) is not None else None,
-                'magsys': outsys.name,
-                'limiting_mag': maglimit_out,
-            }
+            maglimit = -2.5 * np.log10(5 * fluxerr) + corrected_db_zp
+
+        for i, phot in enumerate(photometry):
+            if (
+                phot.original_user_data is not None
+                and 'limiting_mag' in phot.original_user_data
+            ):
+                packet_correction = get_relative_zeropoint(
+                    outsys, phot.filter
+                ) - get_relative_zeropoint(
+                    phot.original_user_data['magsys'], phot.filter
+                )
+                maglimit[i] = (
+                    phot.original_user_data['limiting_mag'] + packet_correction
+                )
+
+        for i, (m, e, lim) in enumerate(
+            zip(mag.tolist(), magerr.tolist(), maglimit.tolist())
+        ):
+            output[i].update(
+                {'mag': nan_to_none(m), 'magerr': nan_to_none(e), 'limiting_mag': lim}
+            )
+    else:
+        for i, (f, e, zp) in enumerate(
+            zip(flux.tolist(), fluxerr.tolist(), corrected_db_zp.tolist())
+        ):
+            output[i].update({'flux': nan_to_none(f), 'zp': zp, 'fluxerr': e})
+
+    return output
+
+
+def serialize(phot, outsys, format):
+    """Serialize a single Photometry row; see `serialize_photometry`."""
+    return serialize_photometry([phot], outsys, format)[0]
+
+
+def get_photometry_columns(query, outsys):
+    """Load the photometry selected by a query into a DataFrame, in a given
+    magnitude system. Only the needed columns are selected, and the result is
+    read column-wise without constructing Photometry objects. Both the flux
+    and the magnitude columns are returned.
+
+    Parameters
+    ----------
+    query : `sqlalchemy.orm.Query`
+        A query for Photometry, without loader options.
+    outsys : str
+        The magnitude system of the output.
+
+    Returns
+    -------
+    data : `pandas.DataFrame`
+        The photometry, one row per point, in the order of `query`.
+    """
+    group_ids = (
+        sa.select([sa.func.array_agg(GroupPhotometry.group_id)])
+        .where(GroupPhotometry.photometr_id == Photometry.id)
+        .label('group_ids')
+    )
+    statement = (
+        query.join(Instrument, Instrument.id == Photometry.instrument_id)
+        .with_entities(
+            Photometry.id,
+            Photometry.obj_id,
+            Photometry.instrument_id,
+            Instrument.name.label('instrument_name'),
+            Photometry.filter,
+            Photometry.mjd,
+            Photometry.ra,
+            Photometry.dec,
+            Photometry.ra_unc,
+            Photometry.dec_unc,
+            Photometry.origin,
+            group_ids,
+            Photometry.flux,
+            Photometry.fluxerr,
+            Photometry.original_user_data['limiting_mag']
+            .astext.cast(sa.Float)
+            .label('original_limiting_mag'),
+            Photometry.original_user_data['magsys'].astext.label('original_magsys'),
         )
-    elif format == 'flux':
-        return_value.update(
-            {
-                'flux': nan_to_none(phot.flux),
-                'magsys': outsys.name,
-                'zp': corrected_db_zp,
-                'fluxerr': phot.fluxerr,
-            }
+        .statement
+    )
+    data = pd.read_sql(statement, DBSession().connection())
+
+    flux = data['flux'].to_numpy(dtype=float)
+    fluxerr = data['fluxerr'].to_numpy(dtype=float)
+    filters = data['filter'].to_numpy(dtype=str)
+    corrected_db_zp = PHOT_ZP + get_zeropoint_corrections(outsys, 'ab', filters)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        detected = ~np.isnan(flux) & (flux > 0)
+        data['mag'] = np.where(
+            detected, -2.5 * np.log10(flux) + corrected_db_zp, np.nan
+        )
+        data['magerr'] = np.where(
+            detected & (fluxerr > 0), (2.5 / np.log(10)) * fluxerr / flux, np.nan
+        )
+        limiting_mag = -2.5 * np.log10(5 * fluxerr) + corrected_db_zp
+
+    # use the limiting magnitudes given by the uploaders where there are some
+    original_limiting_mag = data['original_limiting_mag'].to_numpy(dtype=float)
+    original_magsys = data['original_magsys'].to_numpy()
+    has_original_limit = ~np.isnan(original_limiting_mag)
+    for magsys in np.unique(original_magsys[has_original_limit]):
+        rows = has_original_limit & (original_magsys == magsys)
+        limiting_mag[rows] = original_limiting_mag[rows] + get_zeropoint_corrections(
+            outsys, magsys, filters[rows]
         )
+    data['limiting_mag'] = limiting_mag
+
+    data['zp'] = corrected_db_zp
+    data['magsys'] = sncosmo.get_magsystem(outsys).name
+    return data.drop(columns=['original_limiting_mag', 'original_magsys'])
+
+
+def serialize_photometry_columns(data, format):
+    """Encode photometry columns in a columnar file format.
+
+    Parameters
+    ----------
+    data : `pandas.DataFrame`
+        The photometry, as returned by `get_photometry_columns`.
+    format : {'arrow', 'parquet'}
+        Whether to return an Arrow IPC stream or a Parquet file.
+
+    Returns
+    -------
+    output : bytes
+        The encoded photometry.
+    """
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    if format == 'arrow':
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif format == 'parquet':
+        pq.write_table(table, sink)
     else:
         raise ValueError(
-            'Invalid output format specified. Must be one of '
-            f"['flux', 'mag'], got '{format}'."
+            'Invalid columnar format specified. Must be one of '
+            f"{list(COLUMNAR_PHOTOMETRY_FORMATS)}, got '{format}'."
+        )
+    return sink.getvalue().to_pybytes()
+
+
+def get_photometry_positions(obj_ids):
+    """Select the positions, fluxes and their uncertainties of the
+    photometry of Objs as arrays, without constructing Photometry objects.
+
+    Parameters
+    ----------
+    obj_ids : list of str
+        The IDs of the Objs.
+
+    Returns
+    -------
+    positions : dict
+        For each Obj, the arrays of the `POSITION_COLUMNS` of its photometry,
+        as taken by `_calculate_best_position_from_columns`.
+    """
+    data = pd.read_sql(
+        DBSession()
+        .query(
+            Photometry.obj_id,
+            *[getattr(Photometry, column) for column in POSITION_COLUMNS],
         )
-    return return_value
+        .filter(Photometry.obj_id.in_(obj_ids))
+        .statement,
+        DBSession().connection(),
+    )
+    by_obj = dict(tuple(data.groupby('obj_id')))
+    return {
+        obj_id: {
+            column: by_obj.get(obj_id, data.iloc[:0])[column].to_numpy(dtype=float)
+            for column in POSITION_COLUMNS
+        }
+        for obj_id in obj_ids
+    }
 
 
-class PhotometryHandler(BaseHandler):
-    def standardize_photometry_data(self):
+def lock_photometry_of_objs(obj_ids):
+    """Take transaction-level advisory locks on the photometry of a set of
+    Objs.
+
+    Every row of the deduplication index starts with the object ID, so
+    holding one lock per object is enough to make the search for duplicates
+    and the subsequent insert atomic, while uploads for different objects
+    proceed in parallel. The locks are acquired in the order of their keys
+    to avoid deadlocks between uploads that share objects, and are released
+    when the transaction ends.
+
+    Parameters
+    ----------
+    obj_ids : list of str
+        The IDs of the Objs about to receive photometry.
+    """
+    if len(obj_ids) == 0:
+        return
+
+    DBSession().execute(
+        sa.text(
+            # The ORDER BY of the outer query is what makes Postgres call
+            # the (volatile) lock function on the sorted keys; the order of a
+            # subquery is not guaranteed to be preserved
+            "SELECT pg_advisory_xact_lock(lock_key) FROM ("
+            "SELECT DISTINCT hashtext('photometry:' || obj_id) AS lock_key "
+            "FROM unnest(CAST(:obj_ids AS VARCHAR[])) AS obj_id) AS lock_keys "
+            "ORDER BY lock_key"
+        ),
+        {'obj_ids': list(obj_ids)},
+    )
+
+
+def lock_photometry_point(photometry, obj_ids=()):
+    """Lock the photometry of the Obj of a photometry point, as well as that
+    of other Objs, and reload the point once the locks are held, so that it
+    reflects any update committed while waiting for them.
+
+    Parameters
+    ----------
+    photometry : `skyportal.models.Photometry`
+        The photometry point about to be updated or deleted.
+    obj_ids : list of str, optional
+        The IDs of other Objs whose photometry is about to change.
+
+    Returns
+    -------
+    photometry : `skyportal.models.Photometry` or None
+        The reloaded photometry point, or None if it was deleted in the
+        meantime.
+    """
+    locked_obj_ids = set()
+    while photometry.obj_id not in locked_obj_ids:
+        # the point may have been moved to another Obj before it was locked
+        locked_obj_ids |= {photometry.obj_id, *obj_ids}
+        lock_photometry_of_objs(sorted(locked_obj_ids))
+        photometry = Photometry.query.populate_existing().get(photometry.id)
+        if photometry is None:
+            return None
+    return photometry
+
+
+def standardize_photometry_data(data):
+    """Validate photometry posted in the format of `PhotMagFlexible` or
+    `PhotFluxFlexible`, and convert it to fluxes in microjanskies in the AB
+    system.
+
+    Parameters
+    ----------
+    data: dict
+        The photometry, as posted to `PhotometryHandler.post`. Values may be
+        scalars or lists of equal length.
+
+    Returns
+    -------
+    df: `pandas.DataFrame`
+        One row per photometry point, with the additional columns
+        `standardized_flux` and `standardized_fluxerr`.
+    instrument_cache: dict
+        Mapping of the instrument IDs in `df` to `Instrument` objects.
+    """
+
+    if not isinstance(data, dict):
+        raise ValidationError(
+            'Top level JSON must be an instance of `dict`, got ' f'{type(data)}.'
+        )
 
-        data = self.get_json()
+    if "altdata" in data and not data["altdata"]:
+        del data["altdata"]
 
-        if not isinstance(data, dict):
+    # quick validation - just to make sure things have the right fields
+    try:
+        data = PhotMagFlexible.load(data)
+    except ValidationError as e1:
+        try:
+            data = PhotFluxFlexible.load(data)
+        except ValidationError as e2:
             raise ValidationError(
-                'Top level JSON must be an instance of `dict`, got ' f'{type(data)}.'
+                'Invalid input format: Tried to parse data '
+                f'in mag space, got: '
+                f'"{e1.normalized_messages()}." Tried '
+                f'to parse data in flux space, got:'
+                f' "{e2.normalized_messages()}."'
             )
-
-        if "altdata" in data and not data["altdata"]:
-            del data["altdata"]
-
-        # quick validation - just to make sure things have the right fields
-        try:
-            data = PhotMagFlexible.load(data)
-        except ValidationError as e1:
-            try:
-                data = PhotFluxFlexible.load(data)
-            except ValidationError as e2:
-                raise ValidationError(
-                    'Invalid input format: Tried to parse data '
-                    f'in mag space, got: '
-                    f'"{e1.normalized_messages()}." Tried '
-                    f'to parse data in flux space, got:'
-                    f' "{e2.normalized_messages()}."'
-                )
-            else:
-                kind = 'flux'
         else:
-            kind = 'mag'
+            kind = 'flux'
+    else:
+        kind = 'mag'
 
-        # not used here
-        _ = data.pop('group_ids', None)
+    # not used here
+    _ = data.pop('group_ids', None)
 
-        if allscalar(data):
-            data = [data]
+    if allscalar(data):
+        data = [data]
 
-        try:
-            df = pd.DataFrame(data)
-        except ValueError as e:
-            if "altdata" in data and "Mixing dicts with non-Series" in str(e):
-                try:
-                    data["altdata"] = [
-                        {key: value[i] for key, value in data["altdata"].items()}
-                        for i in range(
-                            len(data["altdata"][list(data["altdata"].keys())[-1]])
-                        )
-                    ]
-                    df = pd.DataFrame(data)
-                except ValueError:
-                    raise ValidationError(
-                        'Unable to coerce passed JSON to a series of packets. '
-                        f'Error was: "{e}"'
+    try:
+        df = pd.DataFrame(data)
+    except ValueError as e:
+        if "altdata" in data and "Mixing dicts with non-Series" in str(e):
+            try:
+                data["altdata"] = [
+                    {key: value[i] for key, value in data["altdata"].items()}
+                    for i in range(
+                        len(data["altdata"][list(data["altdata"].keys())[-1]])
                     )
-            else:
+                ]
+                df = pd.DataFrame(data)
+            except ValueError:
                 raise ValidationError(
                     'Unable to coerce passed JSON to a series of packets. '
                     f'Error was: "{e}"'
                 )
+        else:
+            raise ValidationError(
+                'Unable to coerce passed JSON to a series of packets. '
+                f'Error was: "{e}"'
+            )
+
+    # `to_numeric` coerces numbers written as strings to numeric types
+    #  (int, float)
+
+    #  errors='ignore' means if something is actually an alphanumeric
+    #  string, just leave it alone and dont error out
 
-        # `to_numeric` coerces numbers written as strings to numeric types
-        #  (int, float)
+    #  apply is used to apply it to each column
+    # (https://stackoverflow.com/questions/34844711/convert-entire-pandas
+    # -dataframe-to-integers-in-pandas-0-17-0/34844867
+    df = df.apply(pd.to_numeric, errors='ignore')
 
-        #  errors='ignore' means if something is actually an alphanumeric
-        #  string, just leave it alone and dont error out
+    # set origin to '' where it is None.
+    df.loc[df['origin'].isna(), 'origin'] = ''
 
-        #  apply is used to apply it to each column
-        # (https://stackoverflow.com/questions/34844711/convert-entire-pandas
-        # -dataframe-to-integers-in-pandas-0-17-0/34844867
-        df = df.apply(pd.to_numeric, errors='ignore')
+    if kind == 'mag':
+        # ensure that neither or both mag and magerr are null
+        magnull = df['mag'].isna()
+        magerrnull = df['magerr'].isna()
+        magdet = ~magnull
 
-        # set origin to '' where it is None.
-        df.loc[df['origin'].isna(), 'origin'] = ''
+        # https://en.wikipedia.org/wiki/Bitwise_operation#XOR
+        bad = magerrnull ^ magnull  # bitwise exclusive or -- returns true
+        #  if A and not B or B and not A
 
-        if kind == 'mag':
-            # ensure that neither or both mag and magerr are null
-            magnull = df['mag'].isna()
-            magerrnull = df['magerr'].isna()
-            magdet = ~magnull
+        # coerce to numpy array
+        bad = bad.values
 
-            # https://en.wikipedia.org/wiki/Bitwise_operation#XOR
-            bad = magerrnull ^ magnull  # bitwise exclusive or -- returns true
-            #  if A and not B or B and not A
+        if any(bad):
+            # find the first offending packet
+            first_offender = np.argwhere(bad)[0, 0]
+            packet = df.iloc[first_offender].to_dict()
 
-            # coerce to numpy array
-            bad = bad.values
+            # coerce nans to nones
+            for key in packet:
+                if key != 'standardized_flux':
+                    packet[key] = nan_to_none(packet[key])
 
-            if any(bad):
-                # find the first offending packet
-                first_offender = np.argwhere(bad)[0, 0]
+            raise ValidationError(
+                f'Error parsing packet "{packet}": mag '
+                f'and magerr must both be null, or both be '
+                f'not null.'
+            )
+
+        for field in ['mag', 'magerr', 'limiting_mag']:
+            infinite = np.isinf(df[field].values)
+            if any(infinite):
+                first_offender = np.argwhere(infinite)[0, 0]
                 packet = df.iloc[first_offender].to_dict()
 
                 # coerce nans to nones
                 for key in packet:
-                    if key != 'standardized_flux':
-                        packet[key] = nan_to_none(packet[key])
+                    packet[key] = nan_to_none(packet[key])
 
                 raise ValidationError(
-                    f'Error parsing packet "{packet}": mag '
-                    f'and magerr must both be null, or both be '
-                    f'not null.'
+                    f'Error parsing packet "{packet}": '
+                    f'field {field} must be finite.'
                 )
 
-            for field in ['mag', 'magerr', 'limiting_mag']:
-                infinite = np.isinf(df[field].values)
-                if any(infinite):
-                    first_offender = np.argwhere(infinite)[0, 0]
-                    packet = df.iloc[first_offender].to_dict()
+        # ensure nothing is null for the required fields
+        for field in PhotMagFlexible.required_keys:
+            missing = df[field].isna()
+            if any(missing):
+                first_offender = np.argwhere(missing)[0, 0]
+                packet = df.iloc[first_offender].to_dict()
 
-                    # coerce nans to nones
-                    for key in packet:
-                        packet[key] = nan_to_none(packet[key])
+                # coerce nans to nones
+                for key in packet:
+                    packet[key] = nan_to_none(packet[key])
 
-                    raise ValidationError(
-                        f'Error parsing packet "{packet}": '
-                        f'field {field} must be finite.'
-                    )
+                raise ValidationError(
+                    f'Error parsing packet "{packet}": '
+                    f'missing required field {field}.'
+                )
 
-            # ensure nothing is null for the required fields
-            for field in PhotMagFlexible.required_keys:
-                missing = df[field].isna()
-                if any(missing):
-                    first_offender = np.argwhere(missing)[0, 0]
-                    packet = df.iloc[first_offender].to_dict()
+        # convert the mags to fluxes
+        # detections
+        detflux = 10 ** (-0.4 * (df[magdet]['mag'] - PHOT_ZP))
+        detfluxerr = df[magdet]['magerr'] / (2.5 / np.log(10)) * detflux
 
-                    # coerce nans to nones
-                    for key in packet:
-                        packet[key] = nan_to_none(packet[key])
+        # non-detections
+        limmag_flux = 10 ** (-0.4 * (df[magnull]['limiting_mag'] - PHOT_ZP))
+        ndetfluxerr = limmag_flux / df[magnull]['limiting_mag_nsigma']
 
-                    raise ValidationError(
-                        f'Error parsing packet "{packet}": '
-                        f'missing required field {field}.'
-                    )
+        # initialize flux to be none
+        phot_table = Table.from_pandas(df[['mjd', 'magsys', 'filter']])
 
-            # convert the mags to fluxes
-            # detections
-            detflux = 10 ** (-0.4 * (df[magdet]['mag'] - PHOT_ZP))
-            detfluxerr = df[magdet]['magerr'] / (2.5 / np.log(10)) * detflux
+        phot_table['zp'] = PHOT_ZP
+        phot_table['flux'] = np.nan
+        phot_table['fluxerr'] = np.nan
+        phot_table['flux'][magdet] = detflux
+        phot_table['fluxerr'][magdet] = detfluxerr
+        phot_table['fluxerr'][magnull] = ndetfluxerr
 
-            # non-detections
-            limmag_flux = 10 ** (-0.4 * (df[magnull]['limiting_mag'] - PHOT_ZP))
-            ndetfluxerr = limmag_flux / df[magnull]['limiting_mag_nsigma']
+    else:
+        for field in PhotFluxFlexible.required_keys:
+            missing = df[field].isna().values
+            if any(missing):
+                first_offender = np.argwhere(missing)[0, 0]
+                packet = df.iloc[first_offender].to_dict()
 
-            # initialize flux to be none
-            phot_table = Table.from_pandas(df[['mjd', 'magsys', 'filter']])
+                for key in packet:
+                    packet[key] = nan_to_none(packet[key])
 
-            phot_table['zp'] = PHOT_ZP
-            phot_table['flux'] = np.nan
-            phot_table['fluxerr'] = np.nan
-            phot_table['flux'][magdet] = detflux
-            phot_table['fluxerr'][magdet] = detfluxerr
-            phot_table['fluxerr'][magnull] = ndetfluxerr
+                raise ValidationError(
+                    f'Error parsing packet "{packet}": '
+                    f'missing required field {field}.'
+                )
 
-        else:
-            for field in PhotFluxFlexible.required_keys:
-                missing = df[field].isna().values
-                if any(missing):
-                    first_offender = np.argwhere(missing)[0, 0]
-                    packet = df.iloc[first_offender].to_dict()
+        for field in ['flux', 'fluxerr']:
+            infinite = np.isinf(df[field].values)
+            if any(infinite):
+                first_offender = np.argwhere(infinite)[0, 0]
+                packet = df.iloc[first_offender].to_dict()
 
-                    for key in packet:
-                        packet[key] = nan_to_none(packet[key])
+                # coerce nans to nones
+                for key in packet:
+                    packet[key] = nan_to_none(packet[key])
 
-                    raise ValidationError(
-                        f'Error parsing packet "{packet}": '
-                        f'missing required field {field}.'
-                    )
+                raise ValidationError(
+                    f'Error parsing packet "{packet}": '
+                    f'field {field} must be finite.'
+                )
 
-            for field in ['flux', 'fluxerr']:
-                infinite = np.isinf(df[field].values)
-                if any(infinite):
-                    first_offender = np.argwhere(infinite)[0, 0]
-                    packet = df.iloc[first_offender].to_dict()
+        phot_table = Table.from_pandas(df[['mjd', 'magsys', 'filter', 'zp']])
+        phot_table['flux'] = df['flux'].fillna(np.nan)
+        phot_table['fluxerr'] = df['fluxerr'].fillna(np.nan)
 
-                    # coerce nans to nones
-                    for key in packet:
-                        packet[key] = nan_to_none(packet[key])
+    # convert to microjanskies, AB for DB storage as a vectorized operation
+    pdata = PhotometricData(phot_table)
+    standardized = pdata.normalized(zp=PHOT_ZP, zpsys='ab')
 
-                    raise ValidationError(
-                        f'Error parsing packet "{packet}": '
-                        f'field {field} must be finite.'
-                    )
+    df['standardized_flux'] = standardized.flux
+    df['standardized_fluxerr'] = standardized.fluxerr
 
-            phot_table = Table.from_pandas(df[['mjd', 'magsys', 'filter', 'zp']])
-            phot_table['flux'] = df['flux'].fillna(np.nan)
-            phot_table['fluxerr'] = df['fluxerr'].fillna(np.nan)
+    instrument_cache = {}
+    for iid in df['instrument_id'].unique():
+        instrument = Instrument.query.get(int(iid))
+        if not instrument:
+            raise ValidationError(f'Invalid instrument ID: {iid}')
+        instrument_cache[iid] = instrument
 
-        # convert to microjanskies, AB for DB storage as a vectorized operation
-        pdata = PhotometricData(phot_table)
-        standardized = pdata.normalized(zp=PHOT_ZP, zpsys='ab')
+    obj_ids = df['obj_id'].unique().tolist()
+    existing_obj_ids = {
+        obj_id for obj_id, in DBSession().query(Obj.id).filter(Obj.id.in_(obj_ids))
+    }
+    for oid in obj_ids:
+        if oid not in existing_obj_ids:
+            raise ValidationError(f'Invalid object ID: {oid}')
+
+    return df, instrument_cache
+
+
+def stage_photometry_data(df, instrument_cache):
+    """COPY a photometry dataframe returned by `standardize_photometry_data`
+    into a temporary table that is dropped at the end of the transaction.
+
+    Parameters
+    ----------
+    df: `pandas.DataFrame`
+        The standardized photometry.
+    instrument_cache: dict
+        Mapping of the instrument IDs in `df` to `Instrument` objects.
+
+    Returns
+    -------
+    staging: `sqlalchemy.sql.expression.TableClause`
+        The staging table. Besides the Photometry columns, it contains
+        `pdidx` (the index of the row in `df`), a pre-allocated Photometry
+        `id`, and `existing_id`, which is set by the caller to the ID of
+        any existing duplicate of the row.
+    """
+
+    for instrument_id, filters in df.groupby('instrument_id')['filter']:
+        instrument = instrument_cache[instrument_id]
+        invalid = ~filters.isin(instrument.filters)
+        if invalid.any():
+            raise ValidationError(
+                f"Instrument {instrument.name} has no filter "
+                f"{filters[invalid].iloc[0]}."
+            )
+
+    def to_json(value):
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return None
+        return json.dumps(value)
+
+    user_data_keys = [
+        key for key in ['limiting_mag', 'magsys', 'limiting_mag_nsigma'] if key in df
+    ]
+    original_user_data = df[user_data_keys].astype(object)
+    original_user_data = original_user_data.where(pd.notnull(original_user_data), None)
+
+    rows = pd.DataFrame(
+        {
+            'pdidx': df.index,
+            'obj_id': df['obj_id'],
+            'instrument_id': df['instrument_id'].astype(int),
+            'origin': df['origin'].astype(str),
+            'mjd': df['mjd'],
+            # NaN fluxes (non-detections) are stored as 'NaN', not NULL
+            'flux': df['standardized_flux'].astype(object).fillna('NaN'),
+            'fluxerr': df['standardized_fluxerr'],
+            'filter': df['filter'],
+            'ra': df['ra'],
+            'dec': df['dec'],
+            'ra_unc': df['ra_unc'],
+            'dec_unc': df['dec_unc'],
+            'altdata': [to_json(value) for value in df['altdata']],
+            'original_user_data': [
+                to_json(value) if len(value) > 0 else None
+                for value in original_user_data.to_dict('records')
+            ],
+        }
+    )
+
+    name = f'photometry_staging_{uuid.uuid4().hex}'
+    columns = [
+        column('pdidx', sa.Integer),
+        column('id', sa.Integer),
+        column('existing_id', sa.Integer),
+    ] + [column(c, Photometry.__table__.c[c].type) for c in rows.columns[1:]]
+    staging = sa.table(name, *columns)
+
+    DBSession().execute(
+        f"""
+        CREATE TEMPORARY TABLE {name} (
+            pdidx INTEGER PRIMARY KEY,
+            id INTEGER NOT NULL DEFAULT nextval('photometry_id_seq'),
+            existing_id INTEGER,
+            obj_id CHARACTER VARYING NOT NULL,
+            instrument_id INTEGER NOT NULL,
+            origin CHARACTER VARYING NOT NULL,
+            mjd DOUBLE PRECISION NOT NULL,
+            flux DOUBLE PRECISION NOT NULL,
+            fluxerr DOUBLE PRECISION NOT NULL,
+            filter bandpasses NOT NULL,
+            ra DOUBLE PRECISION,
+            dec DOUBLE PRECISION,
+            ra_unc DOUBLE PRECISION,
+            dec_unc DOUBLE PRECISION,
+            altdata JSONB,
+            original_user_data JSONB
+        ) ON COMMIT DROP
+        """
+    )
+
+    buffer = io.StringIO()
+    rows.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor = DBSession().connection().connection.cursor()
+    cursor.copy_expert(
+        f'COPY {name} ({", ".join(rows.columns)}) FROM STDIN '
+        'WITH (FORMAT csv, FORCE_NOT_NULL (origin))',
+        buffer,
+    )
+    DBSession().execute(f'ANALYZE {name}')
+
+    return staging
+
+
+def bulk_insert_new_photometry_data(
+    df, instrument_cache, group_ids, owner_id, validate=True
+):
+    """Set-based equivalent of `PhotometryHandler.insert_new_photometry_data`
+    for large uploads: `df` is staged with COPY, duplicates are found with a
+    single join on the deduplication index and the new rows and their group
+    links are written with INSERT ... SELECT.
+
+    Parameters
+    ----------
+    df: `pandas.DataFrame`
+        The standardized photometry.
+    instrument_cache: dict
+        Mapping of the instrument IDs in `df` to `Instrument` objects.
+    group_ids: list of int
+        The groups to share the photometry with.
+    owner_id: int
+        The ID of the User uploading the photometry.
+    validate: bool
+        If True, raise a ValidationError if any of the photometry already
+        exists. Otherwise, existing photometry is shared with any of
+        `group_ids` it is not yet shared with.
+
+    Returns
+    -------
+    ids: list of int
+        The ID of the (new or existing) Photometry of each row of `df`.
+    upload_id: str
+        The upload ID of the new photometry.
+    """
+
+    staging = stage_photometry_data(df, instrument_cache)
+    photometry = Photometry.__table__
+    DBSession().execute(
+        staging.update()
+        .values(existing_id=photometry.c.id)
+        .where(photometry.c.obj_id == staging.c.obj_id)
+        .where(photometry.c.instrument_id == staging.c.instrument_id)
+        .where(photometry.c.origin == staging.c.origin)
+        .where(photometry.c.mjd == staging.c.mjd)
+        .where(photometry.c.fluxerr == staging.c.fluxerr)
+        .where(photometry.c.flux == staging.c.flux)
+    )
+
+    if validate:
+        duplicated_photometry = (
+            DBSession()
+            .query(Photometry)
+            .join(staging, Photometry.id == staging.c.existing_id)
+            .options(joinedload(Photometry.groups))
+        )
+        dict_rep = [d.to_dict() for d in duplicated_photometry]
+        if len(dict_rep) > 0:
+            raise ValidationError(
+                'The following photometry already exists '
+                f'in the database: {dict_rep}.'
+            )
 
-        df['standardized_flux'] = standardized.flux
-        df['standardized_fluxerr'] = standardized.fluxerr
+    upload_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    new_rows = staging.c.existing_id.is_(None)
+    copied_columns = [c.name for c in staging.columns][3:]
+    DBSession().execute(
+        photometry.insert().from_select(
+            [
+                'id',
+                *copied_columns,
+                'upload_id',
+                'owner_id',
+                'created_at',
+                'modified',
+            ],
+            sa.select(
+                [
+                    staging.c.id,
+                    *[staging.c[c] for c in copied_columns],
+                    sa.literal(upload_id),
+                    sa.literal(owner_id),
+                    sa.literal(now),
+                    sa.literal(now),
+                ]
+            ).where(new_rows),
+        )
+    )
+
+    groups = Group.__table__
+    group_photometry = GroupPhotometry.__table__
+    DBSession().execute(
+        group_photometry.insert().from_select(
+            ['photometr_id', 'group_id', 'created_at', 'modified'],
+            sa.select([staging.c.id, groups.c.id, sa.literal(now), sa.literal(now)])
+            .where(new_rows)
+            .where(groups.c.id.in_(group_ids)),
+        )
+    )
+
+    if not validate:
+        # share the existing photometry with any new groups
+        already_shared = (
+            sa.exists()
+            .where(group_photometry.c.photometr_id == staging.c.existing_id)
+            .where(group_photometry.c.group_id == groups.c.id)
+        )
+        DBSession().execute(
+            group_photometry.insert().from_select(
+                ['photometr_id', 'group_id', 'created_at', 'modified'],
+                sa.select(
+                    [
+                        staging.c.existing_id,
+                        groups.c.id,
+                        sa.literal(now),
+                        sa.literal(now),
+                    ]
+                )
+                .distinct()
+                .where(staging.c.existing_id.isnot(None))
+                .where(groups.c.id.in_(group_ids))
+                .where(~already_shared),
+            )
+        )
 
-        instrument_cache = {}
-        for iid in df['instrument_id'].unique():
-            instrument = Instrument.query.get(int(iid))
-            if not instrument:
-                raise ValidationError(f'Invalid instrument ID: {iid}')
-            instrument_cache[iid] = instrument
+    ids = [
+        existing_id if existing_id is not None else id
+        for id, existing_id in DBSession().execute(
+            sa.select([staging.c.id, staging.c.existing_id]).order_by(staging.c.pdidx)
+        )
+    ]
 
-        for oid in df['obj_id'].unique():
-            obj = Obj.query.get(oid)
-            if not obj:
-                raise ValidationError(f'Invalid object ID: {oid}')
+    refresh_photometry_summaries(df['obj_id'].unique().tolist())
+    return ids, upload_id
 
-        return df, instrument_cache
 
+class PhotometryHandler(BaseHandler):
     def get_values_table_and_condition(self, df):
         """Return a postgres VALUES representation of the indexed columns of
         a photometry dataframe returned by `standardize_photometry_data`.
@@ -560,8 +1122,22 @@ class PhotometryHandler(BaseHandler):
                 params.append({'photometr_id': id, 'group_id': group_id})
 
         DBSession().execute(groupquery, params)
+
+        refresh_photometry_summaries(df['obj_id'].unique().tolist())
         return ids, upload_id
 
+    def use_bulk_ingest(self, df):
+        """Whether to ingest `df` with `bulk_insert_new_photometry_data`.
+
+        The `bulk` query argument forces (`true`) or disables (`false`) the
+        COPY-based path; otherwise it is used for uploads of at least
+        `misc.photometry_bulk_ingest_min_rows` points.
+        """
+        bulk = self.get_query_argument('bulk', None)
+        if bulk is not None:
+            return is_true_argument(bulk)
+        return len(df) >= cfg['misc.photometry_bulk_ingest_min_rows']
+
     def get_group_ids(self):
         data = self.get_json()
         group_ids = data.pop("group_ids", [])
@@ -602,6 +1178,16 @@ class PhotometryHandler(BaseHandler):
         description: Upload photometry
         tags:
           - photometry
+        parameters:
+          - in: query
+            name: bulk
+            nullable: true
+            schema:
+              type: boolean
+            description: |
+              Stage the photometry with COPY and insert it with set-based
+              queries. Defaults to true for uploads of at least
+              `misc.photometry_bulk_ingest_min_rows` points.
         requestBody:
           content:
             application/json:
@@ -640,23 +1226,22 @@ class PhotometryHandler(BaseHandler):
             return self.error(e.args[0])
 
         try:
-            df, instrument_cache = self.standardize_photometry_data()
+            df, instrument_cache = standardize_photometry_data(self.get_json())
         except ValidationError as e:
             return self.error(e.args[0])
 
-        # This lock ensures that the Photometry table data are not modified in any way
-        # between when the query for duplicate photometry is first executed and
-        # when the insert statement with the new photometry is performed.
-        # From the psql docs: This mode protects a table against concurrent
-        # data changes, and is self-exclusive so that only one session can
-        # hold it at a time.
-        DBSession().execute(
-            f'LOCK TABLE {Photometry.__tablename__} IN SHARE ROW EXCLUSIVE MODE'
-        )
+        # Make sure no other upload touches the photometry of these objects
+        # between the query for duplicates and the insert of the new rows
+        lock_photometry_of_objs(df['obj_id'].unique().tolist())
         try:
-            ids, upload_id = self.insert_new_photometry_data(
-                df, instrument_cache, group_ids
-            )
+            if self.use_bulk_ingest(df):
+                ids, upload_id = bulk_insert_new_photometry_data(
+                    df, instrument_cache, group_ids, self.associated_user_object.id
+                )
+            else:
+                ids, upload_id = self.insert_new_photometry_data(
+                    df, instrument_cache, group_ids
+                )
         except ValidationError as e:
             return self.error(e.args[0])
 
@@ -670,6 +1255,16 @@ class PhotometryHandler(BaseHandler):
         description: Update and/or upload photometry, resolving potential duplicates
         tags:
           - photometry
+        parameters:
+          - in: query
+            name: bulk
+            nullable: true
+            schema:
+              type: boolean
+            description: |
+              Stage the photometry with COPY and insert it with set-based
+              queries. Defaults to true for uploads of at least
+              `misc.photometry_bulk_ingest_min_rows` points.
         requestBody:
           content:
             application/json:
@@ -708,21 +1303,29 @@ class PhotometryHandler(BaseHandler):
             return self.error(e.args[0])
 
         try:
-            df, instrument_cache = self.standardize_photometry_data()
+            df, instrument_cache = standardize_photometry_data(self.get_json())
         except ValidationError as e:
             return self.error(e.args[0])
 
-        values_table, condition = self.get_values_table_and_condition(df)
+        # Make sure no other upload touches the photometry of these objects
+        # between the query for duplicates and the insert of the new rows
+        lock_photometry_of_objs(df['obj_id'].unique().tolist())
 
-        # This lock ensures that the Photometry table data are not modified
-        # in any way between when the query for duplicate photometry is first
-        # executed and when the insert statement with the new photometry is
-        # performed. From the psql docs: This mode protects a table against
-        # concurrent data changes, and is self-exclusive so that only one
-        # session can hold it at a time.
-        DBSession().execute(
-            f'LOCK TABLE {Photometry.__tablename__} IN SHARE ROW EXCLUSIVE MODE'
-        )
+        if self.use_bulk_ingest(df):
+            try:
+                ids, _ = bulk_insert_new_photometry_data(
+                    df,
+                    instrument_cache,
+                    group_ids,
+                    self.associated_user_object.id,
+                    validate=False,
+                )
+            except ValidationError as e:
+                return self.error(e.args[0])
+            self.finalize_transaction()
+            return self.success(data={'ids': ids})
+
+        values_table, condition = self.get_values_table_and_condition(df)
 
         new_photometry_query = (
             DBSession()
@@ -773,7 +1376,7 @@ class PhotometryHandler(BaseHandler):
             for (df_index, _), id in zip(new_photometry.iterrows(), ids):
                 id_map[df_index] = id
 
-        # release the lock
+        # release the locks
         self.finalize_transaction()
 
         # get ids in the correct order
@@ -827,10 +1430,8 @@ class PhotometryHandler(BaseHandler):
         """
 
         photometry = Photometry.get_if_readable_by(photometry_id, self.current_user)
-        if not photometry.is_modifiable_by(self.associated_user_object):
-            return self.error(
-                f'Cannot delete photometry point that is owned by {photometry.owner}.'
-            )
+        if photometry is None:
+            return self.error('Invalid photometry ID')
 
         data = self.get_json()
         group_ids = data.pop("group_ids", None)
@@ -849,9 +1450,18 @@ class PhotometryHandler(BaseHandler):
                     f' "{e2.normalized_messages()}."'
                 )
 
+        photometry = lock_photometry_point(photometry, [phot.obj_id])
+        if photometry is None:
+            return self.error('Invalid photometry ID')
+        if not photometry.is_modifiable_by(self.associated_user_object):
+            return self.error(
+                f'Cannot delete photometry point that is owned by {photometry.owner}.'
+            )
+
         phot.original_user_data = data
         phot.id = photometry_id
         DBSession().merge(phot)
+        refresh_photometry_summaries([photometry.obj_id, phot.obj_id])
 
         # Update groups, if relevant
         if group_ids is not None:
@@ -895,6 +1505,11 @@ class PhotometryHandler(BaseHandler):
                 schema: Error
         """
         photometry = Photometry.get_if_readable_by(photometry_id, self.current_user)
+        if photometry is None:
+            return self.error('Invalid photometry ID')
+        photometry = lock_photometry_point(photometry)
+        if photometry is None:
+            return self.error('Invalid photometry ID')
         if not photometry.is_modifiable_by(self.associated_user_object):
             return self.error(
                 f'Cannot delete photometry point that is owned by {photometry.owner}.'
@@ -903,6 +1518,7 @@ class PhotometryHandler(BaseHandler):
         DBSession().query(Photometry).filter(
             Photometry.id == int(photometry_id)
         ).delete()
+        refresh_photometry_summaries([photometry.obj_id])
         self.finalize_transaction()
 
         return self.success()
@@ -914,13 +1530,40 @@ class ObjPhotometryHandler(BaseHandler):
         obj = Obj.query.get(obj_id)
         if obj is None:
             return self.error('Invalid object id.')
-        photometry = Obj.get_photometry_readable_by_user(obj_id, self.current_user)
         format = self.get_query_argument('format', 'mag')
         outsys = self.get_query_argument('magsys', 'ab')
-        self.verify_permissions()
-        return self.success(
-            data=[serialize(phot, outsys, format) for phot in photometry]
+        if outsys not in ALLOWED_MAGSYSTEMS:
+            return self.error('Invalid mag system.')
+
+        if format in COLUMNAR_PHOTOMETRY_FORMATS:
+            query = (
+                Photometry.query.filter(Photometry.obj_id == obj_id)
+                .filter(Photometry.groups.any(self.access.in_groups(Group.id)))
+                .order_by(Photometry.mjd, Photometry.id)
+            )
+            output = serialize_photometry_columns(
+                get_photometry_columns(query, outsys), format
+            )
+            self.verify_permissions()
+            self.set_status(200)
+            self.set_header('Content-Type', COLUMNAR_PHOTOMETRY_FORMATS[format])
+            self.set_header(
+                'Content-Disposition',
+                f'attachment; filename={obj_id}_photometry.{format}',
+            )
+            self.write(output)
+            return
+
+        photometry = Obj.get_photometry_readable_by_user(
+            obj_id,
+            self.access,
+            options=[
+                joinedload(Photometry.instrument),
+                selectinload(Photometry.groups),
+            ],
         )
+        self.verify_permissions()
+        return self.success(data=serialize_photometry(photometry, outsys, format))
 
 
 class BulkDeletePhotometryHandler(BaseHandler):
@@ -951,20 +1594,49 @@ class BulkDeletePhotometryHandler(BaseHandler):
         phot_id = Photometry.query.filter(Photometry.upload_id == upload_id).first().id
         _ = Photometry.get_if_readable_by(phot_id, self.current_user)
 
+        obj_ids = [
+            row[0]
+            for row in DBSession()
+            .query(Photometry.obj_id)
+            .filter(Photometry.upload_id == upload_id)
+            .distinct()
+        ]
+        lock_photometry_of_objs(obj_ids)
         n_deleted = (
             DBSession()
             .query(Photometry)
             .filter(Photometry.upload_id == upload_id)
             .delete()
         )
+        refresh_photometry_summaries(obj_ids)
         self.finalize_transaction()
 
         return self.success(f"Deleted {n_deleted} photometry points.")
 
 
+def is_true_argument(value):
+    """Whether a boolean query argument is set (`true`, `t` or `1`, in any
+    case)."""
+    return value.lower() in ['true', 't', '1']
+
+
+def encode_photometry_cursor(phot):
+    """Return the keyset pagination cursor pointing after a Photometry row."""
+    return f'{phot.mjd!r},{phot.id}'
+
+
+def decode_photometry_cursor(cursor):
+    """Return the (mjd, id) key of a cursor made by `encode_photometry_cursor`."""
+    try:
+        mjd, id = cursor.split(',')
+        return float(mjd), int(id)
+    except ValueError:
+        raise ValidationError(f'Invalid cursor: {cursor}')
+
+
 class PhotometryRangeHandler(BaseHandler):
     @auth_or_token
-    def get(self):
+    async def get(self):
         """Docstring appears below as an f-string."""
 
         json = self.get_json()
@@ -980,20 +1652,48 @@ class PhotometryRangeHandler(BaseHandler):
             return self.error('Invalid mag system.')
 
         format = self.get_query_argument('format', default='mag')
-        if format not in ['mag', 'flux']:
+        if format not in ['mag', 'flux'] + list(COLUMNAR_PHOTOMETRY_FORMATS):
             return self.error('Invalid output format.')
 
+        num_per_page = self.get_query_argument('numPerPage', None)
+        if num_per_page is not None:
+            try:
+                num_per_page = int(num_per_page)
+            except ValueError:
+                return self.error('Invalid numPerPage value.')
+            if num_per_page <= 0:
+                return self.error('numPerPage must be positive.')
+
+        cursor = self.get_query_argument('cursor', None)
+        if cursor is not None:
+            try:
+                cursor = decode_photometry_cursor(cursor)
+            except ValidationError as e:
+                return self.error(e.args[0])
+
+        stream = is_true_argument(self.get_query_argument('stream', 'false'))
+
+        if format in COLUMNAR_PHOTOMETRY_FORMATS and (
+            stream or num_per_page is not None or cursor is not None
+        ):
+            return self.error(
+                'numPerPage, cursor and stream are not supported with the '
+                f'{format} format.'
+            )
+
         instrument_ids = standardized['instrument_ids']
         min_date = standardized['min_date']
         max_date = standardized['max_date']
 
-        gids = [g.id for g in self.current_user.accessible_groups]
-
         query = (
             DBSession()
             .query(Photometry)
-            .join(GroupPhotometry)
-            .filter(GroupPhotometry.group_id.in_(gids))
+            .filter(
+                sa.exists()
+                .where(GroupPhotometry.photometr_id == Photometry.id)
+                .where(self.access.in_groups(GroupPhotometry.group_id))
+            )
+            .order_by(Photometry.mjd, Photometry.id)
         )
 
         if instrument_ids is not None:
@@ -1005,9 +1705,86 @@ class PhotometryRangeHandler(BaseHandler):
             mjd = Time(max_date, format='datetime').mjd
             query = query.filter(Photometry.mjd <= mjd)
 
-        output = [serialize(p, magsys, format) for p in query]
+        if format in COLUMNAR_PHOTOMETRY_FORMATS:
+            output = serialize_photometry_columns(
+                get_photometry_columns(query, magsys), format
+            )
+            self.verify_permissions()
+            self.set_status(200)
+            self.set_header('Content-Type', COLUMNAR_PHOTOMETRY_FORMATS[format])
+            self.set_header(
+                'Content-Disposition', f'attachment; filename=photometry.{format}'
+            )
+            self.write(output)
+            return
+
+        def get_page(cursor, limit, session=None):
+            page_query = query.options(
+                joinedload(Photometry.instrument), selectinload(Photometry.groups)
+            )
+            if cursor is not None:
+                page_query = page_query.filter(
+                    sa.tuple_(Photometry.mjd, Photometry.id) > cursor
+                )
+            if limit is not None:
+                page_query = page_query.limit(limit)
+            if session is not None:
+                page_query = page_query.with_session(session)
+            return page_query.all()
+
+        if stream:
+            # Send the photometry as newline-delimited JSON, fetching and
+            # serializing it one page at a time so that memory use does not
+            # depend on the size of the range
+            self.verify_permissions()
+            self.set_status(200)
+            self.set_header('Content-Type', 'application/x-ndjson')
+            limit = num_per_page or PHOTOMETRY_STREAM_PAGE_SIZE
+            # The scoped DBSession is shared with the requests handled while
+            # this one waits for the client, which may close it, so the pages
+            # are fetched in a session of this request. Its rows are not
+            # checked by `verify_permissions`, but the query only selects
+            # those shared with the accessible groups, as in
+            # `Photometry.read`.
+            session = Session(bind=DBSession().get_bind())
+            try:
+                while True:
+                    page = get_page(cursor, limit, session=session)
+                    output = serialize_photometry(page, magsys, format)
+                    try:
+                        self.write(''.join(f'{to_json(row)}\n' for row in output))
+                        await self.flush()
+                    except tornado.iostream.StreamClosedError:
+                        # the client has closed the connection
+                        break
+                    if len(page) < limit:
+                        break
+                    cursor = decode_photometry_cursor(
+                        encode_photometry_cursor(page[-1])
+                    )
+                    # keep the session from accumulating the streamed rows
+                    session.expunge_all()
+                    del page, output
+            finally:
+                session.close()
+            return
+
+        page = get_page(cursor, num_per_page)
+        output = serialize_photometry(page, magsys, format)
         self.verify_permissions()
-        return self.success(data=output)
+        if num_per_page is None:
+            return self.success(data=output)
+
+        next_cursor = (
+            encode_photometry_cursor(page[-1]) if len(page) == num_per_page else None
+        )
+        return self.success(
+            data={
+                'photometry': output,
+                'numPerPage': num_per_page,
+                'nextCursor': next_cursor,
+            }
+        )
 
 
 PhotometryHandler.get.__doc__ = f"""
@@ -1074,12 +1851,17 @@ ObjPhotometryHandler.get.__doc__ = f"""
             description: >-
               Return the photometry in flux or magnitude space?
               If a value for this query parameter is not provided, the
-              result will be returned in magnitude space.
+              result will be returned in magnitude space. `arrow` and
+              `parquet` return a table with both the flux and magnitude
+              columns as an Arrow IPC stream or a Parquet file, instead of
+              JSON.
             schema:
               type: string
               enum:
                 - mag
                 - flux
+                - arrow
+                - parquet
           - in: query
             name: magsys
             required: false
@@ -1097,6 +1879,14 @@ ObjPhotometryHandler.get.__doc__ = f"""
                   oneOf:
                     - $ref: "#/components/schemas/ArrayOfPhotometryFluxs"
                     - $ref: "#/components/schemas/ArrayOfPhotometryMags"
+              application/vnd.apache.arrow.stream:
+                schema:
+                  type: string
+                  format: binary
+              application/vnd.apache.parquet:
+                schema:
+                  type: string
+                  format: binary
           400:
             content:
               application/json:
@@ -1115,12 +1905,17 @@ PhotometryRangeHandler.get.__doc__ = f"""
             description: >-
               Return the photometry in flux or magnitude space?
               If a value for this query parameter is not provided, the
-              result will be returned in magnitude space.
+              result will be returned in magnitude space. `arrow` and
+              `parquet` return a table with both the flux and magnitude
+              columns as an Arrow IPC stream or a Parquet file, instead of
+              JSON.
             schema:
               type: string
               enum:
                 - mag
                 - flux
+                - arrow
+                - parquet
           - in: query
             name: magsys
             required: false
@@ -1129,6 +1924,33 @@ PhotometryRangeHandler.get.__doc__ = f"""
             schema:
               type: string
               enum: {list(ALLOWED_MAGSYSTEMS)}
+          - in: query
+            name: numPerPage
+            nullable: true
+            schema:
+              type: integer
+            description: |
+              Number of photometry points per page. If provided, the response
+              data contains the `photometry` of the page and a `nextCursor`
+              to pass as `cursor` to get the next page (null on the last
+              page). Defaults to returning all points as a single list.
+          - in: query
+            name: cursor
+            nullable: true
+            schema:
+              type: string
+            description: |
+              `nextCursor` of the previous page. Points are ordered by MJD and
+              ID, and only those after the cursor are returned.
+          - in: query
+            name: stream
+            nullable: true
+            schema:
+              type: boolean
+            description: |
+              Stream all of the points after `cursor` as newline-delimited
+              JSON (application/x-ndjson), one point per line, fetched
+              `numPerPage` (default {PHOTOMETRY_STREAM_PAGE_SIZE}) at a time.
         requestBody:
           content:
             application/json:
@@ -1142,6 +1964,14 @@ PhotometryRangeHandler.get.__doc__ = f"""
                   oneOf:
                     - $ref: "#/components/schemas/ArrayOfPhotometryFluxs"
                     - $ref: "#/components/schemas/ArrayOfPhotometryMags"
+              application/vnd.apache.arrow.stream:
+                schema:
+                  type: string
+                  format: binary
+              application/vnd.apache.parquet:
+                schema:
+                  type: string
+                  format: binary
           400:
             content:
               application/json:
@@ -1,5 +1,4 @@
 import datetime
-from json.decoder import JSONDecodeError
 import python_http_client.exceptions
 from twilio.base.exceptions import TwilioException
 import tornado
@@ -7,7 +6,7 @@ from tornado.ioloop import IOLoop
 import io
 import math
 from dateutil.parser import isoparse
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, selectinload
 from sqlalchemy import func, or_, tuple_
 import arrow
 from marshmallow import Schema, fields
@@ -34,16 +33,23 @@ from ...models import (
     Listing,
     Spectrum,
     SourceView,
+    Annotation,
+    Comment,
+    Photometry,
+    AccessContext,
+    get_readable_by_obj_ids,
+    get_detection_stats_by_obj_ids,
 )
 from ...utils import (
+    catalog_client,
     get_nearby_offset_stars,
     facility_parameters,
     source_image_parameters,
     get_finding_chart,
-    _calculate_best_position_for_offset_stars,
+    _calculate_best_position_from_columns,
 )
 from .candidate import grab_query_results, update_redshift_history_if_relevant
-from .photometry import serialize
+from .photometry import get_photometry_positions, serialize_photometry
 
 
 SOURCES_PER_PAGE = 100
@@ -63,6 +69,194 @@ def apply_active_or_requested_filtering(query, include_requested, requested_only
     return query
 
 
+def get_source_groups(
+    obj_ids, group_ids, include_requested=False, requested_only=False
+):
+    """Return the groups each of a set of Objs has been saved to, annotated
+    with the save information, using a single query for all Objs.
+
+    Parameters
+    ----------
+    obj_ids : list of string
+       The IDs of the Objs to look up.
+    group_ids : list of int
+       The IDs of the groups to consider (usually the requesting user's
+       accessible groups).
+    include_requested : bool, optional
+       Include sources that have been requested (shared) but not saved.
+    requested_only : bool, optional
+       Only include sources that have been requested but not saved.
+
+    Returns
+    -------
+    groups_by_obj_id : dict
+       Mapping of each Obj ID to a list of serialized groups, each with the
+       additional keys `active`, `requested`, `saved_at` and `saved_by`.
+    """
+    groups_by_obj_id = {obj_id: [] for obj_id in obj_ids}
+    if len(groups_by_obj_id) == 0:
+        return groups_by_obj_id
+
+    query = (
+        DBSession()
+        .query(Source, Group)
+        .join(Group, Source.group_id == Group.id)
+        .filter(
+            Source.obj_id.in_(groups_by_obj_id),
+            Group.id.in_(group_ids),
+        )
+        .options(joinedload(Source.saved_by))
+    )
+    query = apply_active_or_requested_filtering(
+        query, include_requested, requested_only
+    )
+    for source, group in query:
+        group_info = group.to_dict()
+        group_info["active"] = source.active
+        group_info["requested"] = source.requested
+        group_info["saved_at"] = source.saved_at
+        group_info["saved_by"] = (
+            source.saved_by.to_dict() if source.saved_by is not None else None
+        )
+        groups_by_obj_id[source.obj_id].append(group_info)
+    return groups_by_obj_id
+
+
+def get_sources_info(
+    objs,
+    user_or_token,
+    include_comments=False,
+    include_photometry=False,
+    include_photometry_exists=False,
+    include_spectrum_exists=False,
+    include_requested=False,
+    requested_only=False,
+):
+    """Serialize a page of Objs for the `SourceHandler` list response.
+
+    The groups, comments, annotations, classifications, photometry and
+    detection statistics of all Objs are fetched with a fixed number of
+    queries that does not depend on the number of Objs, and the response is
+    then assembled in memory.
+
+    Parameters
+    ----------
+    objs : list of `skyportal.models.Obj`
+       The Objs to serialize.
+    user_or_token : `baselayer.app.models.User`, `baselayer.app.models.Token` or `AccessContext`
+       The requesting `User` or `Token` object, or its access context.
+    include_comments : bool, optional
+       Include the readable comments of each source.
+    include_photometry : bool, optional
+       Include the readable photometry of each source.
+    include_photometry_exists : bool, optional
+       Include whether each source has readable photometry.
+    include_spectrum_exists : bool, optional
+       Include whether each source has readable spectra.
+    include_requested : bool, optional
+       Include groups the sources have been requested (shared) to.
+    requested_only : bool, optional
+       Only include groups the sources have been requested to.
+
+    Returns
+    -------
+    source_list : list of dict
+       The serialized sources, in the same order as `objs`.
+    """
+    obj_ids = [obj.id for obj in objs]
+    access = AccessContext.of(user_or_token)
+    user_accessible_group_ids = access.group_ids
+
+    groups = get_source_groups(
+        obj_ids,
+        user_accessible_group_ids,
+        include_requested=include_requested,
+        requested_only=requested_only,
+    )
+    detection_stats = get_detection_stats_by_obj_ids(obj_ids)
+    classifications = get_readable_by_obj_ids(Classification, obj_ids, access)
+    annotations = get_readable_by_obj_ids(
+        Annotation, obj_ids, access, options=[joinedload(Annotation.author)]
+    )
+    if include_comments:
+        comments = get_readable_by_obj_ids(
+            Comment, obj_ids, access, options=[joinedload(Comment.author)]
+        )
+    if include_photometry:
+        photometry = get_readable_by_obj_ids(
+            Photometry,
+            obj_ids,
+            access,
+            options=[joinedload(Photometry.instrument)],
+        )
+    if include_photometry_exists:
+        if include_photometry:
+            obj_ids_with_photometry = {
+                obj_id for obj_id, points in photometry.items() if len(points) > 0
+            }
+        else:
+            obj_ids_with_photometry = {
+                row[0]
+                for row in DBSession()
+                .query(Photometry.obj_id)
+                .filter(Photometry.obj_id.in_(obj_ids))
+                .filter(Photometry.groups.any(access.in_groups(Group.id)))
+                .distinct()
+            }
+    if include_spectrum_exists:
+        obj_ids_with_spectra = {
+            row[0]
+            for row in DBSession()
+            .query(Spectrum.obj_id)
+            .filter(Spectrum.obj_id.in_(obj_ids))
+            .filter(Spectrum.groups.any(access.in_groups(Group.id)))
+            .distinct()
+        }
+
+    source_list = []
+    for source in objs:
+        source_info = source.to_dict()
+        if include_comments:
+            for comment in comments[source.id]:
+                comment.author_info = comment.construct_author_info_dict()
+            source_info["comments"] = sorted(
+                [
+                    {
+                        k: v
+                        for k, v in comment.to_dict().items()
+                        if k != "attachment_bytes"
+                    }
+                    for comment in comments[source.id]
+                ],
+                key=lambda x: x["created_at"],
+                reverse=True,
+            )
+        source_info["classifications"] = classifications[source.id]
+        for annotation in annotations[source.id]:
+            annotation.author_info = annotation.construct_author_info_dict()
+        source_info["annotations"] = sorted(
+            annotations[source.id], key=lambda x: x.origin
+        )
+        source_info.update(detection_stats[source.id])
+        source_info["gal_lon"] = source.gal_lon_deg
+        source_info["gal_lat"] = source.gal_lat_deg
+        source_info["luminosity_distance"] = source.luminosity_distance
+        source_info["dm"] = source.dm
+        source_info["angular_diameter_distance"] = source.angular_diameter_distance
+        if include_photometry:
+            source_info["photometry"] = serialize_photometry(
+                photometry[source.id], 'ab', 'flux'
+            )
+        if include_photometry_exists:
+            source_info["photometry_exists"] = source.id in obj_ids_with_photometry
+        if include_spectrum_exists:
+            source_info["spectrum_exists"] = source.id in obj_ids_with_spectra
+        source_info["groups"] = groups[source.id]
+        source_list.append(source_info)
+
+    return source_list
+
+
 def add_ps1_thumbnail_and_push_ws_msg(obj, request_handler):
     try:
         obj.add_ps1_thumbnail()
@@ -532,7 +726,7 @@ class SourceHandler(BaseHandler):
                     f'Invalid group ids field ({group_ids}; Could not parse all elements to integers'
                 )
 
-        user_accessible_group_ids = [g.id for g in self.current_user.accessible_groups]
+        user_accessible_group_ids = self.access.group_ids
 
         simbad_class = self.get_query_argument('simbadClass', None)
         has_tns_name = self.get_query_argument('hasTNSname', None)
@@ -556,7 +750,7 @@ class SourceHandler(BaseHandler):
 
             s = Obj.get_if_readable_by(
                 obj_id,
-                self.current_user,
+                self.access,
                 options=query_options,
             )
 
@@ -614,58 +808,30 @@ class SourceHandler(BaseHandler):
             ]
             if include_photometry:
                 photometry = Obj.get_photometry_readable_by_user(
-                    obj_id, self.current_user
+                    obj_id,
+                    self.access,
+                    options=[
+                        joinedload(Photometry.instrument),
+                        selectinload(Photometry.groups),
+                    ],
+                )
+                source_info["photometry"] = serialize_photometry(
+                    photometry, 'ab', 'flux'
                 )
-                source_info["photometry"] = [
-                    serialize(phot, 'ab', 'flux') for phot in photometry
-                ]
             if include_photometry_exists:
                 source_info["photometry_exists"] = (
-                    len(Obj.get_photometry_readable_by_user(obj_id, self.current_user))
-                    > 0
+                    len(Obj.get_photometry_readable_by_user(obj_id, self.access)) > 0
                 )
             if include_spectrum_exists:
                 source_info["spectrum_exists"] = (
-                    len(Obj.get_spectra_readable_by(obj_id, self.current_user)) > 0
-                )
-            query = (
-                DBSession()
-                .query(Group)
-                .join(Source)
-                .filter(
-                    Source.obj_id == source_info["id"],
-                    Group.id.in_(user_accessible_group_ids),
-                )
-            )
-            query = apply_active_or_requested_filtering(
-                query, include_requested, requested_only
-            )
-            source_info["groups"] = [g.to_dict() for g in query.all()]
-            for group in source_info["groups"]:
-                source_table_row = Source.query.filter(
-                    Source.obj_id == s.id, Source.group_id == group["id"]
-                ).first()
-                group["active"] = source_table_row.active
-                group["requested"] = source_table_row.requested
-                group["saved_at"] = source_table_row.saved_at
-                group["saved_by"] = (
-                    source_table_row.saved_by.to_dict()
-                    if source_table_row.saved_by is not None
-                    else None
-                )
-
-            # add the date(s) this source was saved to each of these groups
-            for i, g in enumerate(source_info["groups"]):
-                saved_at = (
-                    DBSession()
-                    .query(Source.saved_at)
-                    .filter(
-                        Source.obj_id == source_info["id"], Source.group_id == g["id"]
-                    )
-                    .first()
-                    .saved_at
+                    len(Obj.get_spectra_readable_by(obj_id, self.access)) > 0
                 )
-                source_info["groups"][i]['saved_at'] = saved_at
+            source_info["groups"] = get_source_groups(
+                [s.id],
+                user_accessible_group_ids,
+                include_requested=include_requested,
+                requested_only=requested_only,
+            )[s.id]
 
             self.verify_permissions()
             return self.success(data=source_info)
@@ -891,102 +1057,16 @@ class SourceHandler(BaseHandler):
             )
 
         if not save_summary:
-            source_list = []
-            for source in query_results["sources"]:
-                source_list.append(source.to_dict())
-                if include_comments:
-                    source_list[-1]["comments"] = sorted(
-                        [
-                            {
-                                k: v
-                                for k, v in c.to_dict().items()
-                                if k != "attachment_bytes"
-                            }
-                            for c in source.get_comments_readable_by(self.current_user)
-                        ],
-                        key=lambda x: x["created_at"],
-                        reverse=True,
-                    )
-                source_list[-1][
-                    "classifications"
-                ] = source.get_classifications_readable_by(self.current_user)
-                source_list[-1]["annotations"] = sorted(
-                    source.get_annotations_readable_by(self.current_user),
-                    key=lambda x: x.origin,
-                )
-                source_list[-1]["last_detected_at"] = source.last_detected_at
-                source_list[-1]["last_detected_mag"] = source.last_detected_mag
-                source_list[-1]["peak_detected_at"] = source.peak_detected_at
-                source_list[-1]["peak_detected_mag"] = source.peak_detected_mag
-                source_list[-1]["gal_lon"] = source.gal_lon_deg
-                source_list[-1]["gal_lat"] = source.gal_lat_deg
-                source_list[-1]["luminosity_distance"] = source.luminosity_distance
-                source_list[-1]["dm"] = source.dm
-                source_list[-1][
-                    "angular_diameter_distance"
-                ] = source.angular_diameter_distance
-                if include_photometry:
-                    photometry = Obj.get_photometry_readable_by_user(
-                        source.id, self.current_user
-                    )
-                    source_list[-1]["photometry"] = [
-                        serialize(phot, 'ab', 'flux') for phot in photometry
-                    ]
-                if include_photometry_exists:
-                    source_list[-1]["photometry_exists"] = (
-                        len(
-                            Obj.get_photometry_readable_by_user(
-                                source.id, self.current_user
-                            )
-                        )
-                        > 0
-                    )
-                if include_spectrum_exists:
-                    source_list[-1]["spectrum_exists"] = (
-                        len(Obj.get_spectra_readable_by(source.id, self.current_user))
-                        > 0
-                    )
-
-                groups_query = (
-                    DBSession()
-                    .query(Group)
-                    .join(Source)
-                    .filter(
-                        Source.obj_id == source_list[-1]["id"],
-                        Group.id.in_(user_accessible_group_ids),
-                    )
-                )
-                groups_query = apply_active_or_requested_filtering(
-                    groups_query, include_requested, requested_only
-                )
-                groups = groups_query.all()
-                source_list[-1]["groups"] = [g.to_dict() for g in groups]
-                for group in source_list[-1]["groups"]:
-                    source_table_row = Source.query.filter(
-                        Source.obj_id == source.id, Source.group_id == group["id"]
-                    ).first()
-                    group["active"] = source_table_row.active
-                    group["requested"] = source_table_row.requested
-                    group["saved_at"] = source_table_row.saved_at
-                    group["saved_by"] = (
-                        source_table_row.saved_by.to_dict()
-                        if source_table_row.saved_by is not None
-                        else None
-                    )
-
-                # add the date(s) this source was saved to each of these groups
-                for i, g in enumerate(source_list[-1]["groups"]):
-                    saved_at = (
-                        DBSession()
-                        .query(Source.saved_at)
-                        .filter(
-                            Source.obj_id == source_list[-1]["id"],
-                            Source.group_id == g["id"],
-                        )
-                        .first()
-                        .saved_at
-                    )
-                    source_list[-1]["groups"][i]['saved_at'] = saved_at
+            source_list = get_sources_info(
+                query_results["sources"],
+                self.access,
+                include_comments=include_comments,
+                include_photometry=include_photometry,
+                include_photometry_exists=include_photometry_exists,
+                include_spectrum_exists=include_spectrum_exists,
+                include_requested=include_requested,
+                requested_only=requested_only,
+            )
             query_results["sources"] = source_list
 
         self.verify_permissions()
@@ -1312,28 +1392,17 @@ class SourceOffsetsHandler(BaseHandler):
               application/json:
                 schema: Error
         """
-        source = Obj.get_if_readable_by(
-            obj_id,
-            self.current_user,
-            options=[joinedload(Obj.photometry)],
-        )
+        source = Obj.get_if_readable_by(obj_id, self.current_user)
         if source is None:
             return self.error('Source not found', status=404)
 
         initial_pos = (source.ra, source.dec)
 
-        try:
-            best_ra, best_dec = _calculate_best_position_for_offset_stars(
-                source.photometry,
-                fallback=(initial_pos[0], initial_pos[1]),
-                how="snr2",
-            )
-        except JSONDecodeError:
-            self.push_notification(
-                'Source position using photometry points failed.'
-                ' Reverting to discovery position.'
-            )
-            best_ra, best_dec = initial_pos[0], initial_pos[1]
+        best_ra, best_dec = _calculate_best_position_from_columns(
+            get_photometry_positions([source.id])[source.id],
+            fallback=(initial_pos[0], initial_pos[1]),
+            how="snr2",
+        )
 
         facility = self.get_query_argument('facility', 'Keck')
         num_offset_stars = self.get_query_argument('num_offset_stars', '3')
@@ -1384,7 +1453,7 @@ class SourceOffsetsHandler(BaseHandler):
                 queries_issued,
                 noffsets,
                 used_ztfref,
-            ) = await IOLoop.current().run_in_executor(None, offset_func)
+            ) = await catalog_client.run(offset_func)
         except ValueError:
             return self.error("Error querying for nearby offset stars")
 
@@ -1488,11 +1557,7 @@ class SourceFinderHandler(BaseHandler):
               application/json:
                 schema: Error
         """
-        source = Obj.get_if_readable_by(
-            obj_id,
-            self.current_user,
-            options=[joinedload(Obj.photometry)],
-        )
+        source = Obj.get_if_readable_by(obj_id, self.current_user)
         if source is None:
             return self.error('Source not found', status=404)
 
@@ -1511,18 +1576,11 @@ class SourceFinderHandler(BaseHandler):
             return self.error('The value for `imsize` is outside the allowed range')
 
         initial_pos = (source.ra, source.dec)
-        try:
-            best_ra, best_dec = _calculate_best_position_for_offset_stars(
-                source.photometry,
-                fallback=(initial_pos[0], initial_pos[1]),
-                how="snr2",
-            )
-        except JSONDecodeError:
-            self.push_notification(
-                'Source position using photometry points failed.'
-                ' Reverting to discovery position.'
-            )
-            best_ra, best_dec = initial_pos[0], initial_pos[1]
+        best_ra, best_dec = _calculate_best_position_from_columns(
+            get_photometry_positions([source.id])[source.id],
+            fallback=(initial_pos[0], initial_pos[1]),
+            how="snr2",
+        )
 
         facility = self.get_query_argument('facility', 'Keck')
         image_source = self.get_query_argument('image_source', 'ztfref')
@@ -1578,7 +1636,7 @@ class SourceFinderHandler(BaseHandler):
         self.push_notification(
             'Finding chart generation in progress. Download will start soon.'
         )
-        rez = await IOLoop.current().run_in_executor(None, finder)
+        rez = await catalog_client.run(finder)
 
         filename = rez["name"]
         image = io.BytesIO(rez["data"])
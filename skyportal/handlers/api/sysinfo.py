@@ -5,7 +5,7 @@ from baselayer.app.env import load_env
 from baselayer.app.access import auth_or_token
 from ..base import BaseHandler
 
-from skyportal.models import cosmo
+from skyportal.models import cosmo, get_access_cache
 from skyportal.utils import gitlog
 
 
@@ -59,6 +59,22 @@ class SysInfoHandler(BaseHandler):
                             cosmoref:
                                 type: string
                                 description: Reference for the cosmology used.
+                            accessCache:
+                                type: object
+                                description: |
+                                  Whether the cache of user permissions and
+                                  accessible groups and streams shared by the
+                                  app processes is enabled, its hits and misses
+                                  across processes, and its number of entries.
+                                properties:
+                                  enabled:
+                                    type: boolean
+                                  hits:
+                                    type: integer
+                                  misses:
+                                    type: integer
+                                  entries:
+                                    type: integer
         """
         # if another build system has written a gitlog file, use it
         loginfo = ""
@@ -95,5 +111,6 @@ class SysInfoHandler(BaseHandler):
                 "cosmology": str(cosmo),
                 "cosmoref": cosmo.__doc__,
                 "gitlog": parsed_log,
+                "accessCache": get_access_cache().stats(),
             }
         )
@@ -1,13 +1,30 @@
+import asyncio
 import os
 import io
 import base64
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from marshmallow.exceptions import ValidationError
 from sqlalchemy.exc import StatementError
 from PIL import Image, UnidentifiedImageError
+from tornado.ioloop import IOLoop
 from baselayer.app.access import permissions, auth_or_token
 from ..base import BaseHandler
-from ...models import DBSession, Obj, Source, Thumbnail
+from ...enum_types import THUMBNAIL_TYPES
+from ...models import DBSession, Obj, Source, Thumbnail, get_readable_obj_ids
+from ...utils.thumbnail_store import ThumbnailStore, VARIANT_FORMATS
+
+basedir = Path(os.path.dirname(__file__)) / '..' / '..'
+if os.path.abspath(basedir).endswith('skyportal/skyportal'):
+    basedir = basedir / '..'
+
+# Uploaded thumbnails, stored by the digest of their contents
+thumbnail_store = ThumbnailStore(
+    os.path.abspath(basedir / 'static/thumbnails'), '/static/thumbnails'
+)
+
+# Threads decoding and validating the images of bulk uploads
+decode_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='thumbnail-decode')
 
 
 class ThumbnailHandler(BaseHandler):
@@ -74,6 +91,8 @@ class ThumbnailHandler(BaseHandler):
             return self.error(f"Error creating new thumbnail: {e}")
         except UnidentifiedImageError as e:
             return self.error(f"Invalid file type: {e}")
+        # the Thumbnail must not be visible before its file is written
+        thumbnail_store.flush()
         self.finalize_transaction()
 
         return self.success(data={"id": t.id})
@@ -191,15 +210,237 @@ class ThumbnailHandler(BaseHandler):
         return self.success()
 
 
-def create_thumbnail(thumbnail_data, thumbnail_type, obj_id):
-    basedir = Path(os.path.dirname(__file__)) / '..' / '..'
-    if os.path.abspath(basedir).endswith('skyportal/skyportal'):
-        basedir = basedir / '..'
-    file_uri = os.path.abspath(
-        basedir / f'static/thumbnails/{obj_id}_{thumbnail_type}.png'
-    )
-    if not os.path.exists(os.path.dirname(file_uri)):
-        (basedir / 'static/thumbnails').mkdir(parents=True)
+class ThumbnailImageHandler(BaseHandler):
+    @auth_or_token
+    async def get(self, digest, extension):
+        """
+        ---
+        description: |
+          Retrieve an uploaded thumbnail image in another format, optionally
+          downscaled. The image is identified by the name of its file in the
+          `public_url` of the Thumbnail, which is the SHA-256 digest of its
+          contents, so that responses can be cached indefinitely.
+        tags:
+          - thumbnails
+        parameters:
+          - in: path
+            name: digest
+            required: true
+            schema:
+              type: string
+          - in: path
+            name: extension
+            required: true
+            schema:
+              type: string
+              enum: [png, webp]
+          - in: query
+            name: size
+            nullable: true
+            schema:
+              type: integer
+              minimum: 16
+              maximum: 500
+            description: |
+              Maximum width and height of the image, in pixels. Images are
+              not enlarged.
+        responses:
+          200:
+            content:
+              image/webp:
+                schema:
+                  type: string
+                  format: binary
+              image/png:
+                schema:
+                  type: string
+                  format: binary
+          400:
+            content:
+              application/json:
+                schema: Error
+        """
+        if extension not in VARIANT_FORMATS:
+            return self.error(f'Unsupported thumbnail format: {extension}')
+
+        size = self.get_query_argument('size', None)
+        if size is not None:
+            try:
+                size = int(size)
+            except ValueError:
+                return self.error('Invalid argument for `size`')
+            if not 16 <= size <= 500:
+                return self.error('The value for `size` is outside the allowed range')
+
+        data = await IOLoop.current().run_in_executor(
+            None, thumbnail_store.variant, digest, extension, size
+        )
+        if data is None:
+            return self.error(f'Could not load thumbnail {digest}', status=404)
+
+        self.verify_permissions()
+        self.set_header('Content-Type', f'image/{extension}')
+        self.set_header('Cache-Control', 'public, max-age=31536000, immutable')
+        self.write(data)
+
+
+class ThumbnailBulkHandler(BaseHandler):
+    @permissions(['Upload data'])
+    async def post(self):
+        """
+        ---
+        description: |
+          Upload many thumbnails at once, e.g., the new, reference and
+          difference images of a batch of alerts. Either all the thumbnails
+          are created, or none is.
+        tags:
+          - thumbnails
+        requestBody:
+          content:
+            application/json:
+              schema:
+                type: object
+                properties:
+                  thumbnails:
+                    type: array
+                    items:
+                      type: object
+                      properties:
+                        obj_id:
+                          type: string
+                          description: ID of object associated with the thumbnail.
+                        data:
+                          type: string
+                          format: byte
+                          description: base64-encoded PNG image file contents. Image size must be between 16px and 500px on a side.
+                        ttype:
+                          type: string
+                          description: Thumbnail type. Must be one of 'new', 'ref', 'sub', 'sdss', 'dr8', 'new_gz', 'ref_gz', 'sub_gz'
+                      required:
+                        - obj_id
+                        - data
+                        - ttype
+                required:
+                  - thumbnails
+        responses:
+          200:
+            content:
+              application/json:
+                schema:
+                  allOf:
+                    - $ref: '#/components/schemas/Success'
+                    - type: object
+                      properties:
+                        data:
+                          type: object
+                          properties:
+                            ids:
+                              type: array
+                              items:
+                                type: integer
+                              description: New thumbnail IDs, in the order of the uploaded thumbnails
+          400:
+            content:
+              application/json:
+                schema: Error
+        """
+        data = self.get_json()
+        thumbnails = data.get('thumbnails')
+        if not isinstance(thumbnails, list):
+            return self.error("Missing required parameter: thumbnails")
+        if len(thumbnails) == 0:
+            return self.success(data={"ids": []})
+
+        for i, thumbnail in enumerate(thumbnails):
+            if not isinstance(thumbnail, dict):
+                return self.error(f"Invalid thumbnail {i}: expected an object")
+            for key in ['obj_id', 'data', 'ttype']:
+                if key not in thumbnail:
+                    return self.error(
+                        f"Missing required parameter for thumbnail {i}: {key}"
+                    )
+            if thumbnail['ttype'] not in THUMBNAIL_TYPES:
+                return self.error(
+                    f"Invalid ttype for thumbnail {i}: {thumbnail['ttype']}"
+                )
+
+        obj_ids = {thumbnail['obj_id'] for thumbnail in thumbnails}
+        readable_obj_ids = get_readable_obj_ids(obj_ids, self.current_user)
+        invalid_obj_ids = obj_ids - readable_obj_ids
+        if len(invalid_obj_ids) > 0:
+            return self.error(
+                f"Invalid obj_ids: {', '.join(sorted(map(str, invalid_obj_ids)))}"
+            )
+
+        loop = IOLoop.current()
+        results = await asyncio.gather(
+            *[
+                loop.run_in_executor(decode_pool, decode_thumbnail, thumbnail['data'])
+                for thumbnail in thumbnails
+            ],
+            return_exceptions=True,
+        )
+        for i, result in enumerate(results):
+            if isinstance(result, ValueError):
+                return self.error(
+                    f"Error in creating thumbnail {i}: invalid value(s): {result}"
+                )
+            if isinstance(result, UnidentifiedImageError):
+                return self.error(f"Invalid file type for thumbnail {i}: {result}")
+            if isinstance(result, Exception):
+                raise result
+
+        # pre-fetch the thumbnail PKs, so that all the rows can be inserted
+        # with a single statement
+        ids = [
+            id
+            for id, in DBSession().execute(
+                f"SELECT nextval('thumbnails_id_seq') FROM "
+                f"generate_series(1, {len(thumbnails)})"
+            )
+        ]
+        params = [
+            dict(
+                id=id,
+                obj_id=thumbnail['obj_id'],
+                type=thumbnail['ttype'],
+                file_uri=str(thumbnail_store.path(digest)),
+                public_url=thumbnail_store.url(digest),
+            )
+            for id, thumbnail, (_, digest) in zip(ids, thumbnails, results)
+        ]
+        DBSession().execute(Thumbnail.__table__.insert(), params)
+
+        for file_bytes, _ in results:
+            thumbnail_store.put(file_bytes)
+        # the Thumbnails must not be visible before their files are written
+        await loop.run_in_executor(None, thumbnail_store.flush)
+        self.finalize_transaction()
+
+        return self.success(data={"ids": ids})
+
+
+def decode_thumbnail(thumbnail_data):
+    """Decode and validate the contents of an uploaded thumbnail.
+
+    Parameters
+    ----------
+    thumbnail_data : str
+        base64-encoded PNG image file contents.
+
+    Returns
+    -------
+    (bytes, str)
+        The contents of the file, and their digest.
+
+    Raises
+    ------
+    ValueError
+        If the image is not a PNG of allowed size, or `thumbnail_data` is not
+        valid base64.
+    PIL.UnidentifiedImageError
+        If the contents are not an image.
+    """
     file_bytes = base64.b64decode(thumbnail_data)
     im = Image.open(io.BytesIO(file_bytes))
     if im.format != 'PNG':
@@ -209,15 +450,19 @@ def create_thumbnail(thumbnail_data, thumbnail_type, obj_id):
             'Invalid thumbnail size. Only thumbnails '
             'between (16, 16) and (500, 500) allowed.'
         )
+    return file_bytes, thumbnail_store.digest_of_data(file_bytes)
+
+
+def create_thumbnail(thumbnail_data, thumbnail_type, obj_id):
+    file_bytes, digest = decode_thumbnail(thumbnail_data)
     t = Thumbnail(
         obj_id=obj_id,
         type=thumbnail_type,
-        file_uri=file_uri,
-        public_url=f'/static/thumbnails/{obj_id}_{thumbnail_type}.png',
+        file_uri=str(thumbnail_store.path(digest)),
+        public_url=thumbnail_store.url(digest),
     )
     DBSession().add(t)
     DBSession().flush()
 
-    with open(file_uri, 'wb') as f:
-        f.write(file_bytes)
+    thumbnail_store.put(file_bytes)
     return t
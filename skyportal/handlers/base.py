@@ -1,5 +1,6 @@
 from baselayer.app.handlers.base import BaseHandler as BaselayerHandler
 from .. import __version__
+from ..models import AccessContext
 
 
 class BaseHandler(BaselayerHandler):
@@ -9,6 +10,15 @@ class BaseHandler(BaselayerHandler):
             return self.current_user
         return self.current_user.created_by
 
+    @property
+    def access(self):
+        """The `AccessContext` of the current user. Handlers are instantiated
+        per request, so the accessible Groups, Streams and Filters are looked
+        up at most once per request."""
+        if getattr(self, '_access', None) is None:
+            self._access = AccessContext(self.current_user)
+        return self._access
+
     def success(self, *args, **kwargs):
         super().success(*args, **kwargs, extra={'version': __version__})
 
@@ -1,3 +1,5 @@
+import functools
+import itertools
 import json
 import re
 import uuid
@@ -23,7 +25,7 @@ from sqlalchemy.dialects import postgresql as psql
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import relationship, joinedload
+from sqlalchemy.orm import relationship, joinedload, selectinload
 from sqlalchemy.schema import UniqueConstraint
 from sqlalchemy_utils import URLType, EmailType
 from sqlalchemy_utils.types import JSONType
@@ -65,6 +67,7 @@ from .enum_types import (
     api_classnames,
     listener_classnames,
 )
+from .utils.access_cache import AccessCache
 from .utils.cosmology import establish_cosmology
 
 # In the AB system, a brightness of 23.9 mag corresponds to 1 microJy.
@@ -547,6 +550,289 @@ def token_groups(self):
 Token.groups = token_groups
 
 
+_access_cache = None
+
+
+def get_access_cache():
+    """Return the `AccessCache` shared by all app processes (see
+    `AccessContext`), which is kept per database so that, e.g., the test and
+    development databases do not share their entries. It is opened on first
+    use, and cleared when the app starts."""
+    global _access_cache
+    if _access_cache is None:
+        _access_cache = AccessCache(
+            f"./cache/access/{cfg['database.database']}.sqlite",
+            ttl=cfg["misc.access_cache_ttl"],
+        )
+    return _access_cache
+
+
+class AccessContext:
+    """The Groups, Streams and Filters accessible to a User or Token, each
+    looked up at most once.
+
+    Handlers create one per request (see `BaseHandler.access`) and pass it
+    to the `get_*_readable_by` helpers in place of the User or Token, so
+    that the accessible IDs are not recomputed by every helper call or for
+    every row of a list.
+
+    The permissions and, except for System Admins, the accessible Group and
+    Stream IDs are also kept in the access cache (see `get_access_cache`),
+    so that they are shared by the requests of all app processes until the
+    commit of a change to the roles, ACLs, Group or Stream memberships of
+    the User invalidates them (see `collect_access_changes`), or until they
+    expire.
+    System Admins can access every Group and Stream, so their IDs are looked
+    up on every request instead of being invalidated by every new Group or
+    Stream.
+
+    Parameters
+    ----------
+    user_or_token : `baselayer.app.models.User` or `baselayer.app.models.Token`
+       The requesting `User` or `Token` object.
+    """
+
+    def __init__(self, user_or_token):
+        self.user_or_token = user_or_token
+        self._cache_entry = None
+        self._permissions = None
+        self._accessible_groups = None
+        self._group_ids = None
+        self._stream_ids = None
+        self._filter_ids = None
+
+    @classmethod
+    def of(cls, user_or_token):
+        """Return `user_or_token` if it is already an AccessContext, or a new
+        AccessContext for it otherwise."""
+        if isinstance(user_or_token, cls):
+            return user_or_token
+        return cls(user_or_token)
+
+    @property
+    def cache_entry(self):
+        """The entry of the User or Token in the access cache, which is
+        computed and stored on a miss."""
+        if self._cache_entry is None:
+            if isinstance(self.user_or_token, Token):
+                key = f"token:{self.user_or_token.id}"
+                user_id = self.user_or_token.created_by_id
+            else:
+                key = f"user:{self.user_or_token.id}"
+                user_id = self.user_or_token.id
+
+            access_cache = get_access_cache()
+            entry = access_cache.get(key)
+            if entry is None:
+                version = access_cache.version(user_id)
+                permissions = list(self.user_or_token.permissions)
+                entry = {"permissions": permissions}
+                if "System admin" not in permissions:
+                    entry["group_ids"] = [g.id for g in self.accessible_groups]
+                    entry["stream_ids"] = [
+                        stream.id for stream in self.user_or_token.accessible_streams
+                    ]
+                access_cache.set(key, user_id, entry, version)
+            self._cache_entry = entry
+        return self._cache_entry
+
+    @property
+    def permissions(self):
+        """The names of the ACLs of the User or Token."""
+        if self._permissions is None:
+            if get_access_cache().enabled:
+                self._permissions = self.cache_entry["permissions"]
+            else:
+                self._permissions = list(self.user_or_token.permissions)
+        return self._permissions
+
+    @property
+    def is_system_admin(self):
+        return "System admin" in self.permissions
+
+    @property
+    def accessible_groups(self):
+        """The accessible Groups, as in `User.accessible_groups`."""
+        if self._accessible_groups is None:
+            self._accessible_groups = self.user_or_token.accessible_groups
+        return self._accessible_groups
+
+    @property
+    def group_ids(self):
+        """The IDs of the accessible Groups."""
+        if self._group_ids is None:
+            if self.is_system_admin:
+                if self._accessible_groups is None:
+                    # no need to load every Group
+                    self._group_ids = [id for id, in DBSession().query(Group.id)]
+                else:
+                    self._group_ids = [g.id for g in self._accessible_groups]
+            elif get_access_cache().enabled:
+                self._group_ids = self.cache_entry["group_ids"]
+            else:
+                self._group_ids = [g.id for g in self.accessible_groups]
+        return self._group_ids
+
+    @property
+    def stream_ids(self):
+        """The IDs of the accessible Streams."""
+        if self._stream_ids is None:
+            if self.is_system_admin:
+                self._stream_ids = [id for id, in DBSession().query(Stream.id)]
+            elif get_access_cache().enabled:
+                self._stream_ids = self.cache_entry["stream_ids"]
+            else:
+                self._stream_ids = [
+                    stream.id for stream in self.user_or_token.accessible_streams
+                ]
+        return self._stream_ids
+
+    @property
+    def filter_ids(self):
+        """The IDs of the Filters of the accessible Groups."""
+        if self._filter_ids is None:
+            self._filter_ids = [
+                id
+                for id, in DBSession()
+                .query(Filter.id)
+                .filter(self.in_groups(Filter.group_id))
+            ]
+        return self._filter_ids
+
+    @staticmethod
+    def _in_ids(column, ids):
+        # Bind the IDs as a single array parameter, so that the statement is
+        # the same whatever the number of IDs
+        return column == sa.any_(sa.literal(ids, type_=ARRAY(sa.Integer)))
+
+    def in_groups(self, column):
+        """Return a clause that is true where `column` is the ID of an
+        accessible Group."""
+        return self._in_ids(column, self.group_ids)
+
+    def in_streams(self, column):
+        """Return a clause that is true where `column` is the ID of an
+        accessible Stream."""
+        return self._in_ids(column, self.stream_ids)
+
+    def in_filters(self, column):
+        """Return a clause that is true where `column` is the ID of a Filter
+        of an accessible Group."""
+        return self._in_ids(column, self.filter_ids)
+
+
+# Join tables whose rows determine the permissions or the accessible Groups
+# and Streams of Users and Tokens
+ACCESS_TABLES = {
+    'group_users',
+    'stream_users',
+    'user_roles',
+    'user_acls',
+    'token_acls',
+    'role_acls',
+}
+
+# Tables whose deleted rows may cascade to the rows of ACCESS_TABLES in the
+# database, without the session seeing them
+ACCESS_PARENT_TABLES = {'groups', 'streams', 'roles', 'acls'}
+
+
+@functools.lru_cache(maxsize=None)
+def access_relationships(mapper):
+    """Return the relationships of a mapper through ACCESS_TABLES, e.g.,
+    `Group.users` or `User.roles`."""
+    return [
+        rel
+        for rel in mapper.relationships
+        if rel.secondary is not None and rel.secondary.name in ACCESS_TABLES
+    ]
+
+
+def users_with_changed_access(session):
+    """Return the IDs of the Users whose permissions or accessible Groups and
+    Streams may be changed by the rows being flushed by `session`, either
+    directly or through the collections of a relationship, or None if those
+    of all Users may be."""
+    user_ids = set()
+    for row in set(session.new) | set(session.dirty) | set(session.deleted):
+        state = sa.inspect(row)
+        table = state.mapper.local_table.name
+        if table == 'role_acls' or (
+            table in ACCESS_PARENT_TABLES and row in session.deleted
+        ):
+            return None
+        if table == 'token_acls':
+            token = session.query(Token).get(row.token_id)
+            if token is not None:
+                user_ids.add(token.created_by_id)
+            continue
+        if table in ACCESS_TABLES:
+            user_ids.add(row.user_id)
+            continue
+
+        for rel in access_relationships(state.mapper):
+            history = state.attrs[rel.key].history
+            if not history.has_changes():
+                continue
+            if rel.secondary.name == 'role_acls':
+                return None
+            if isinstance(row, User):
+                user_ids.add(row.id)
+            elif isinstance(row, Token):
+                user_ids.add(row.created_by_id)
+            else:
+                # e.g., the members of a Group or the Users of a Role
+                user_ids.update(
+                    user.id
+                    for user in history.added + history.deleted
+                    if isinstance(user, User)
+                )
+    return user_ids
+
+
+@event.listens_for(DBSession, 'after_flush')
+def collect_access_changes(session, flush_context):
+    """Record the Users whose access is changed by a flush, so that their
+    entries in the access cache are invalidated once the transaction is
+    committed, whether the change is made by a handler, a script or a
+    fixture."""
+    if not get_access_cache().enabled or session.info.get('access_changed_all'):
+        return
+    user_ids = users_with_changed_access(session)
+    if user_ids is None:
+        session.info['access_changed_all'] = True
+    else:
+        session.info.setdefault('access_changed_user_ids', set()).update(user_ids)
+
+
+@event.listens_for(DBSession, 'after_bulk_delete')
+@event.listens_for(DBSession, 'after_bulk_update')
+def collect_bulk_access_changes(context):
+    """Record that the access of all Users may be changed by a bulk delete
+    or update of the rows of ACCESS_TABLES, e.g., `GroupUser.query.filter(
+    ...).delete()`, whose rows are unknown to the session."""
+    if context.mapper.local_table.name in ACCESS_TABLES | ACCESS_PARENT_TABLES:
+        context.session.info['access_changed_all'] = True
+
+
+@event.listens_for(DBSession, 'after_commit')
+def invalidate_access_changes(session):
+    access_cache = get_access_cache()
+    if session.info.pop('access_changed_all', False):
+        session.info.pop('access_changed_user_ids', None)
+        access_cache.clear()
+    else:
+        access_cache.invalidate_users(
+            session.info.pop('access_changed_user_ids', set())
+        )
+
+
+@event.listens_for(DBSession, 'after_rollback')
+def discard_access_changes(session):
+    session.info.pop('access_changed_all', None)
+    session.info.pop('access_changed_user_ids', None)
+
+
 class Obj(Base, ha.Point):
     """A record of an astronomical Object and its metadata, such as position,
     positional uncertainties, name, and redshift."""
@@ -727,10 +1013,15 @@ class Obj(Base, ha.Point):
     def last_detected_at(cls):
         """UTC ISO date at which the object was last detected above a given S/N (3.0 by default)."""
         return (
-            sa.select([sa.func.max(Photometry.iso)])
-            .where(Photometry.obj_id == cls.id)
-            .where(Photometry.snr.isnot(None))
-            .where(Photometry.snr > PHOT_DETECTION_THRESHOLD)
+            sa.select(
+                [
+                    sa.func.to_timestamp(
+                        (sa.func.max(PhotometrySummary.last_detected_mjd) - 40_587)
+                        * 86400.0
+                    )
+                ]
+            )
+            .where(PhotometrySummary.obj_id == cls.id)
             .label('last_detected_at')
         )
 
@@ -747,21 +1038,11 @@ class Obj(Base, ha.Point):
     @last_detected_mag.expression
     def last_detected_mag(cls):
         """Magnitude at which the object was last detected above a given S/N (3.0 by default)."""
-        last_detected = (
-            sa.select([cls.id, sa.func.max(Photometry.mjd).label("max_mjd")])
-            .where(Photometry.obj_id == cls.id)
-            .where(Photometry.snr.isnot(None))
-            .where(Photometry.snr > PHOT_DETECTION_THRESHOLD)
-            .group_by(cls.id)
-            .alias()
-        )
         return (
-            sa.select([Photometry.mag])
-            .where(Photometry.obj_id == cls.id)
-            .where(Photometry.snr.isnot(None))
-            .where(Photometry.snr > PHOT_DETECTION_THRESHOLD)
-            .where(cls.id == last_detected.c.id)
-            .where(Photometry.mjd == last_detected.c.max_mjd)
+            sa.select([PhotometrySummary.last_detected_mag])
+            .where(PhotometrySummary.obj_id == cls.id)
+            .order_by(PhotometrySummary.last_detected_mjd.desc())
+            .limit(1)
             .label('last_detected_mag')
         )
 
@@ -779,11 +1060,18 @@ class Obj(Base, ha.Point):
     def peak_detected_at(cls):
         """UTC ISO date at which the object was detected at peak magnitude above a given S/N (3.0 by default)."""
         return (
-            sa.select([Photometry.iso])
-            .where(Photometry.obj_id == cls.id)
-            .where(Photometry.snr.isnot(None))
-            .where(Photometry.snr > PHOT_DETECTION_THRESHOLD)
-            .order_by(Photometry.mag.desc())
+            sa.select(
+                [
+                    sa.func.to_timestamp(
+                        (PhotometrySummary.peak_detected_mjd - 40_587) * 86400.0
+                    )
+                ]
+            )
+            .where(PhotometrySummary.obj_id == cls.id)
+            .order_by(
+                PhotometrySummary.peak_detected_mag.desc(),
+                PhotometrySummary.peak_detected_mjd,
+            )
             .limit(1)
             .label('peak_detected_at')
         )
@@ -802,10 +1090,8 @@ class Obj(Base, ha.Point):
     def peak_detected_mag(cls):
         """Peak magnitude at which the object was detected above a given S/N (3.0 by default)."""
         return (
-            sa.select([sa.func.max(Photometry.mag)])
-            .where(Photometry.obj_id == cls.id)
-            .where(Photometry.snr.isnot(None))
-            .where(Photometry.snr > PHOT_DETECTION_THRESHOLD)
+            sa.select([sa.func.max(PhotometrySummary.peak_detected_mag)])
+            .where(PhotometrySummary.obj_id == cls.id)
             .label('peak_detected_mag')
         )
 
@@ -1115,8 +1401,8 @@ def get_candidate_if_readable_by(obj_id, user_or_token, options=[]):
     ----------
     obj_id : integer or string
        Primary key of the Obj.
-    user_or_token : `baselayer.app.models.User` or `baselayer.app.models.Token`
-       The requesting `User` or `Token` object.
+    user_or_token : `baselayer.app.models.User`, `baselayer.app.models.Token` or `AccessContext`
+       The requesting `User` or `Token` object, or its access context.
     options : list of `sqlalchemy.orm.MapperOption`s
        Options that wil be passed to `options()` in the loader query.
 
@@ -1128,14 +1414,10 @@ def get_candidate_if_readable_by(obj_id, user_or_token, options=[]):
 
     if Candidate.query.filter(Candidate.obj_id == obj_id).first() is None:
         return None
-    user_group_ids = [g.id for g in user_or_token.accessible_groups]
+    access = AccessContext.of(user_or_token)
     c = (
         Candidate.query.filter(Candidate.obj_id == obj_id)
-        .filter(
-            Candidate.filter_id.in_(
-                DBSession.query(Filter.id).filter(Filter.group_id.in_(user_group_ids))
-            )
-        )
+        .filter(access.in_filters(Candidate.filter_id))
         .options(options)
         .first()
     )
@@ -1284,8 +1566,8 @@ def get_source_if_readable_by(obj_id, user_or_token, options=[]):
     ----------
     obj_id : integer or string
        Primary key of the Obj.
-    user_or_token : `baselayer.app.models.User` or `baselayer.app.models.Token`
-       The requesting `User` or `Token` object.
+    user_or_token : `baselayer.app.models.User`, `baselayer.app.models.Token` or `AccessContext`
+       The requesting `User` or `Token` object, or its access context.
     options : list of `sqlalchemy.orm.MapperOption`s
        Options that wil be passed to `options()` in the loader query.
 
@@ -1297,10 +1579,10 @@ def get_source_if_readable_by(obj_id, user_or_token, options=[]):
 
     if Obj.query.get(obj_id) is None:
         return None
-    user_group_ids = [g.id for g in user_or_token.accessible_groups]
+    access = AccessContext.of(user_or_token)
     s = (
         Source.query.filter(Source.obj_id == obj_id)
-        .filter(Source.group_id.in_(user_group_ids))
+        .filter(access.in_groups(Source.group_id))
         .options(options)
         .first()
     )
@@ -1323,8 +1605,8 @@ def get_obj_if_readable_by(obj_id, user_or_token, options=[]):
     ----------
     obj_id : integer or string
        Primary key of the Obj.
-    user_or_token : `baselayer.app.models.User` or `baselayer.app.models.Token`
-       The requesting `User` or `Token` object.
+    user_or_token : `baselayer.app.models.User`, `baselayer.app.models.Token` or `AccessContext`
+       The requesting `User` or `Token` object, or its access context.
     options : list of `sqlalchemy.orm.MapperOption`s
        Options that wil be passed to `options()` in the loader query.
 
@@ -1342,20 +1624,21 @@ def get_obj_if_readable_by(obj_id, user_or_token, options=[]):
 
     if Obj.query.get(obj_id) is None:
         return None
-    if "System admin" in user_or_token.permissions:
+    access = AccessContext.of(user_or_token)
+    if access.is_system_admin:
         return Obj.query.options(options).get(obj_id)
 
     # the order of the following attempts is important -
     # this one should come first
-    if Obj.get_photometry_readable_by_user(obj_id, user_or_token):
+    if Obj.get_photometry_readable_by_user(obj_id, access):
         return Obj.query.options(options).get(obj_id)
 
     try:
         source_opts = [construct_joinedload(Source.obj, o.path) for o in options]
-        obj = Source.get_obj_if_readable_by(obj_id, user_or_token, source_opts)
+        obj = Source.get_obj_if_readable_by(obj_id, access, source_opts)
     except AccessError:  # They may still be able to view the associated Candidate
         cand_opts = [construct_joinedload(Candidate.obj, o.path) for o in options]
-        obj = Candidate.get_obj_if_readable_by(obj_id, user_or_token, cand_opts)
+        obj = Candidate.get_obj_if_readable_by(obj_id, access, cand_opts)
 
     if obj is None:
         raise AccessError('Insufficient permissions.')
@@ -1367,6 +1650,59 @@ def get_obj_if_readable_by(obj_id, user_or_token, options=[]):
 Obj.get_if_readable_by = get_obj_if_readable_by
 
 
+def get_readable_obj_ids(obj_ids, user_or_token):
+    """Return the IDs of the Objs, among a set of Obj IDs, that the requesting
+    User or Token owner can read, following the same rules as
+    `Obj.get_if_readable_by`. All Objs are resolved with a single query.
+
+    Parameters
+    ----------
+    obj_ids : list of string
+       The IDs of the Objs to look up.
+    user_or_token : `baselayer.app.models.User`, `baselayer.app.models.Token` or `AccessContext`
+       The requesting `User` or `Token` object, or its access context.
+
+    Returns
+    -------
+    readable_obj_ids : set of string
+       The IDs of the Objs that exist and are readable.
+    """
+    obj_ids = set(obj_ids)
+    if len(obj_ids) == 0:
+        return set()
+
+    access = AccessContext.of(user_or_token)
+    query = DBSession().query(Obj.id).filter(Obj.id.in_(obj_ids))
+    if not access.is_system_admin:
+        query = query.filter(
+            sa.or_(
+                Obj.photometry.any(Photometry.groups.any(access.in_groups(Group.id))),
+                Obj.sources.any(access.in_groups(Source.group_id)),
+                Obj.candidates.any(access.in_filters(Candidate.filter_id)),
+            )
+        )
+    return {obj_id for obj_id, in query}
+
+
+def insert_linked_thumbnails(positions):
+    """Insert the SDSS and DESI DR8 thumbnails of several Objs, as
+    `Obj.add_linked_thumbnails` does for one Obj, with a single statement and
+    without committing.
+
+    Parameters
+    ----------
+    positions : list of (str, float, float)
+       The ID, right ascension and declination [deg] of each Obj.
+    """
+    rows = []
+    for obj_id, ra, dec in positions:
+        obj = Obj(ra=ra, dec=dec)
+        rows.append({'obj_id': obj_id, 'type': 'sdss', 'public_url': obj.sdss_url})
+        rows.append({'obj_id': obj_id, 'type': 'dr8', 'public_url': obj.desi_dr8_url})
+    if len(rows) > 0:
+        DBSession().execute(Thumbnail.__table__.insert(), rows)
+
+
 def get_obj_comments_readable_by(self, user_or_token):
     """Query the database and return the Comments on this Obj that are accessible
     to any of the User or Token owner's accessible Groups.
@@ -1449,7 +1785,7 @@ def get_obj_classifications_readable_by(self, user_or_token):
 Obj.get_classifications_readable_by = get_obj_classifications_readable_by
 
 
-def get_photometry_readable_by_user(obj_id, user_or_token):
+def get_photometry_readable_by_user(obj_id, user_or_token, options=()):
     """Query the database and return the Photometry for this Obj that is shared
     with any of the User or Token owner's accessible Groups.
 
@@ -1457,8 +1793,10 @@ def get_photometry_readable_by_user(obj_id, user_or_token):
     ----------
     obj_id : string
        The ID of the Obj to look up.
-    user_or_token : `baselayer.app.models.User` or `baselayer.app.models.Token`
-       The requesting `User` or `Token` object.
+    user_or_token : `baselayer.app.models.User`, `baselayer.app.models.Token` or `AccessContext`
+       The requesting `User` or `Token` object, or its access context.
+    options : list of `sqlalchemy.orm.MapperOption`s
+       Options that wil be passed to `options()` in the loader query.
 
     Returns
     -------
@@ -1468,10 +1806,9 @@ def get_photometry_readable_by_user(obj_id, user_or_token):
     return (
         Photometry.query.filter(Photometry.obj_id == obj_id)
         .filter(
-            Photometry.groups.any(
-                Group.id.in_([g.id for g in user_or_token.accessible_groups])
-            )
+            Photometry.groups.any(AccessContext.of(user_or_token).in_groups(Group.id))
         )
+        .options(options)
         .all()
     )
 
@@ -1487,8 +1824,8 @@ def get_spectra_readable_by(obj_id, user_or_token, options=()):
     ----------
     obj_id : string
        The ID of the Obj to look up.
-    user_or_token : `baselayer.app.models.User` or `baselayer.app.models.Token`
-       The requesting `User` or `Token` object.
+    user_or_token : `baselayer.app.models.User`, `baselayer.app.models.Token` or `AccessContext`
+       The requesting `User` or `Token` object, or its access context.
     options : list of `sqlalchemy.orm.MapperOption`s
        Options that wil be passed to `options()` in the loader query.
 
@@ -1501,9 +1838,7 @@ def get_spectra_readable_by(obj_id, user_or_token, options=()):
     return (
         Spectrum.query.filter(Spectrum.obj_id == obj_id)
         .filter(
-            Spectrum.groups.any(
-                Group.id.in_([g.id for g in user_or_token.accessible_groups])
-            )
+            Spectrum.groups.any(AccessContext.of(user_or_token).in_groups(Group.id))
         )
         .options(options)
         .all()
@@ -1513,6 +1848,105 @@ def get_spectra_readable_by(obj_id, user_or_token, options=()):
 Obj.get_spectra_readable_by = get_spectra_readable_by
 
 
+def get_readable_by_obj_ids(cls, obj_ids, user_or_token, options=()):
+    """Query the database and return the rows of a group-shared table (e.g.,
+    Comments, Annotations, Classifications or Photometry) attached to any of
+    a set of Objs and shared with any of the User or Token owner's accessible
+    Groups. All Objs are resolved with a single query.
+
+    Parameters
+    ----------
+    cls : `baselayer.app.models.DeclarativeMeta`
+       The mapped class to query. Must have `obj_id` and `groups` attributes.
+    obj_ids : list of string
+       The IDs of the Objs to look up.
+    user_or_token : `baselayer.app.models.User`, `baselayer.app.models.Token` or `AccessContext`
+       The requesting `User` or `Token` object, or its access context.
+    options : list of `sqlalchemy.orm.MapperOption`s
+       Additional options that will be passed to `options()` in the loader
+       query. The `groups` of each row are always eagerly loaded.
+
+    Returns
+    -------
+    rows_by_obj_id : dict
+       Mapping of each Obj ID to the list of its accessible rows, ordered by
+       creation time.
+    """
+    rows_by_obj_id = {obj_id: [] for obj_id in obj_ids}
+    if len(rows_by_obj_id) == 0:
+        return rows_by_obj_id
+
+    rows = (
+        cls.query.filter(cls.obj_id.in_(rows_by_obj_id))
+        .filter(cls.groups.any(AccessContext.of(user_or_token).in_groups(Group.id)))
+        .options(selectinload(cls.groups), *options)
+        .order_by(cls.created_at)
+        .all()
+    )
+    for row in rows:
+        rows_by_obj_id[row.obj_id].append(row)
+    return rows_by_obj_id
+
+
+def get_detection_stats_by_obj_ids(obj_ids):
+    """Return the last and peak detections of a set of Objs, computed with
+    two queries regardless of the number of Objs. The values are identical to
+    those of the `Obj.last_detected_at`, `Obj.last_detected_mag`,
+    `Obj.peak_detected_at` and `Obj.peak_detected_mag` hybrid properties, but
+    do not require loading the photometry of each Obj.
+
+    Parameters
+    ----------
+    obj_ids : list of string
+       The IDs of the Objs to look up.
+
+    Returns
+    -------
+    stats_by_obj_id : dict
+       Mapping of each Obj ID to a dict with the keys `last_detected_at`,
+       `last_detected_mag`, `peak_detected_at` and `peak_detected_mag`
+       (all None for Objs without detections).
+    """
+    stats_by_obj_id = {
+        obj_id: {
+            'last_detected_at': None,
+            'last_detected_mag': None,
+            'peak_detected_at': None,
+            'peak_detected_mag': None,
+        }
+        for obj_id in obj_ids
+    }
+    if len(stats_by_obj_id) == 0:
+        return stats_by_obj_id
+
+    detections = (
+        DBSession()
+        .query(Photometry.obj_id, Photometry.mjd, Photometry.mag)
+        .filter(Photometry.obj_id.in_(stats_by_obj_id))
+        .filter(Photometry.snr.isnot(None))
+        .filter(Photometry.snr > PHOT_DETECTION_THRESHOLD)
+        .distinct(Photometry.obj_id)
+    )
+
+    last_detections = detections.order_by(Photometry.obj_id, Photometry.mjd.desc())
+    for obj_id, mjd, mag in last_detections:
+        stats_by_obj_id[obj_id]['last_detected_at'] = arrow.get(
+            (mjd - 40_587) * 86400.0
+        )
+        stats_by_obj_id[obj_id]['last_detected_mag'] = mag
+
+    peak_detections = detections.order_by(
+        Photometry.obj_id, Photometry.mag.desc(), Photometry.mjd
+    )
+    for obj_id, mjd, mag in peak_detections:
+        stats_by_obj_id[obj_id]['peak_detected_at'] = arrow.get(
+            (mjd - 40_587) * 86400.0
+        )
+        stats_by_obj_id[obj_id]['peak_detected_mag'] = mag
+
+    return stats_by_obj_id
+
+
 User.sources = relationship(
     'Obj',
     backref='users',
@@ -1961,8 +2395,8 @@ def get_taxonomy_usable_by_user(taxonomy_id, user_or_token):
     ----------
     taxonomy_id : integer
        The ID of the requested Taxonomy.
-    user_or_token : `baselayer.app.models.User` or `baselayer.app.models.Token`
-       The requesting `User` or `Token` object.
+    user_or_token : `baselayer.app.models.User`, `baselayer.app.models.Token` or `AccessContext`
+       The requesting `User` or `Token` object, or its access context.
 
     Returns
     -------
@@ -1973,9 +2407,7 @@ def get_taxonomy_usable_by_user(taxonomy_id, user_or_token):
     return (
         Taxonomy.query.filter(Taxonomy.id == taxonomy_id)
         .filter(
-            Taxonomy.groups.any(
-                Group.id.in_([g.id for g in user_or_token.accessible_groups])
-            )
+            Taxonomy.groups.any(AccessContext.of(user_or_token).in_groups(Group.id))
         )
         .all()
     )
@@ -2444,6 +2876,8 @@ Photometry.__table_args__ = (
         Photometry.flux,
         unique=True,
     ),
+    # Keyset pagination of photometry ranges orders and seeks on (mjd, id)
+    sa.Index('photometry_mjd_id_index', Photometry.mjd, Photometry.id),
 )
 
 
@@ -2461,6 +2895,163 @@ GroupPhotometry.delete = GroupPhotometry.update = (
 )
 
 
+class PhotometrySummary(Base):
+    """Per-filter summary of the detections (S/N above the detection
+    threshold, 3.0 by default) of an Obj, kept in sync with the Photometry
+    table by `refresh_photometry_summaries`."""
+
+    __tablename__ = 'photometry_summaries'
+
+    obj_id = sa.Column(
+        sa.ForeignKey('objs.id', ondelete='CASCADE'),
+        nullable=False,
+        index=True,
+        doc="ID of the summarized Obj.",
+    )
+    filter = sa.Column(
+        allowed_bandpasses,
+        nullable=False,
+        doc='Filter of the summarized detections.',
+    )
+    detection_count = sa.Column(
+        sa.Integer, nullable=False, doc="Number of detections in this filter."
+    )
+    first_detected_mjd = sa.Column(
+        sa.Float, nullable=False, doc="MJD of the first detection."
+    )
+    first_detected_mag = sa.Column(
+        sa.Float, nullable=False, doc="AB magnitude of the first detection."
+    )
+    last_detected_mjd = sa.Column(
+        sa.Float, nullable=False, index=True, doc="MJD of the last detection."
+    )
+    last_detected_mag = sa.Column(
+        sa.Float, nullable=False, doc="AB magnitude of the last detection."
+    )
+    peak_detected_mjd = sa.Column(
+        sa.Float, nullable=False, doc="MJD of the peak detection."
+    )
+    peak_detected_mag = sa.Column(
+        sa.Float,
+        nullable=False,
+        index=True,
+        doc="Peak AB magnitude, with the same convention as "
+        "`Obj.peak_detected_mag`.",
+    )
+
+
+PhotometrySummary.__table_args__ = (
+    sa.Index(
+        'photometry_summaries_obj_id_filter_index',
+        PhotometrySummary.obj_id,
+        PhotometrySummary.filter,
+        unique=True,
+    ),
+)
+
+
+def refresh_photometry_summaries(obj_ids, session=None):
+    """Recompute the `PhotometrySummary` rows of a set of Objs from their
+    Photometry, in the current transaction.
+
+    Photometry added, modified or deleted through the ORM is summarized when
+    it is flushed (see `collect_flushed_photometry`); this must be
+    called after writing Photometry with SQL statements, COPY or bulk
+    queries, e.g., `Photometry.query.filter(...).delete()`.
+
+    Parameters
+    ----------
+    obj_ids : list of string
+       The IDs of the Objs whose Photometry was added, modified or deleted.
+    session : sqlalchemy.orm.Session, optional
+       Session to execute the queries in, without flushing it first.
+       Defaults to `DBSession()`, whose pending changes are flushed.
+    """
+    obj_ids = list(set(obj_ids))
+    if len(obj_ids) == 0:
+        return
+
+    if session is None:
+        session = DBSession()
+        # Make pending ORM changes to Photometry visible to the queries below
+        session.flush()
+
+    partition = [Photometry.obj_id, Photometry.filter]
+
+    def first_value(column, *order_by):
+        return sa.func.first_value(column).over(
+            partition_by=partition, order_by=order_by
+        )
+
+    detections = (
+        sa.select(
+            [
+                Photometry.obj_id,
+                Photometry.filter,
+                sa.func.count().over(partition_by=partition),
+                first_value(Photometry.mjd, Photometry.mjd),
+                first_value(Photometry.mag, Photometry.mjd),
+                first_value(Photometry.mjd, Photometry.mjd.desc()),
+                first_value(Photometry.mag, Photometry.mjd.desc()),
+                first_value(Photometry.mjd, Photometry.mag.desc(), Photometry.mjd),
+                first_value(Photometry.mag, Photometry.mag.desc(), Photometry.mjd),
+                sa.func.now(),
+                sa.func.now(),
+            ]
+        )
+        .where(Photometry.obj_id.in_(obj_ids))
+        .where(Photometry.snr.isnot(None))
+        .where(Photometry.snr > PHOT_DETECTION_THRESHOLD)
+        .distinct(Photometry.obj_id, Photometry.filter)
+    )
+
+    table = PhotometrySummary.__table__
+    session.execute(table.delete().where(table.c.obj_id.in_(obj_ids)))
+    session.execute(
+        table.insert().from_select(
+            [
+                'obj_id',
+                'filter',
+                'detection_count',
+                'first_detected_mjd',
+                'first_detected_mag',
+                'last_detected_mjd',
+                'last_detected_mag',
+                'peak_detected_mjd',
+                'peak_detected_mag',
+                'created_at',
+                'modified',
+            ],
+            detections,
+        )
+    )
+
+
+@event.listens_for(DBSession, 'before_flush')
+def collect_flushed_photometry(session, flush_context, instances):
+    """Record the Objs whose Photometry is added, modified or deleted through
+    the ORM, e.g., by fixtures or scripts, while their rows can still be
+    loaded."""
+    obj_ids = session.info.setdefault('photometry_obj_ids', set())
+    for phot in itertools.chain(session.new, session.deleted):
+        if isinstance(phot, Photometry):
+            # new Photometry may only be related to its Obj yet
+            obj_ids.add(phot.obj.id if phot.obj_id is None else phot.obj_id)
+    for phot in session.dirty:
+        if isinstance(phot, Photometry) and session.is_modified(phot):
+            obj_ids.add(phot.obj_id)
+            # the Obj the Photometry was moved from
+            obj_ids.update(sa.inspect(phot).attrs.obj_id.history.deleted)
+
+
+@event.listens_for(DBSession, 'after_flush')
+def refresh_flushed_photometry_summaries(session, flush_context):
+    """Refresh the summaries of the Objs recorded by
+    `collect_flushed_photometry`, in the same transaction."""
+    obj_ids = session.info.pop('photometry_obj_ids', set())
+    refresh_photometry_summaries(obj_ids, session=session)
+
+
 class Spectrum(Base):
     """Wavelength-dependent measurement of the flux of an object through a
     dispersive element."""
@@ -3003,7 +3594,9 @@ class Thumbnail(Base):
 
     create = read = AccessibleIfRelatedRowsAreAccessible(obj='read')
 
-    # TODO delete file after deleting row
+    # Uploaded files are stored by the digest of their contents, and may be
+    # shared by several Thumbnails. Files that no Thumbnail refers to anymore
+    # are removed by tools/collect_thumbnail_garbage.py
     type = sa.Column(
         thumbnail_types, doc='Thumbnail type (e.g., ref, new, sub, dr8, ps1, ...)'
     )
@@ -26,8 +26,11 @@ from matplotlib import cm
 from matplotlib.colors import rgb2hex
 
 import os
+import sqlalchemy as sa
+from sqlalchemy.orm import joinedload
 from baselayer.app.env import load_env
 from skyportal.models import (
+    AccessContext,
     DBSession,
     Obj,
     Photometry,
@@ -36,7 +39,12 @@ from skyportal.models import (
     Telescope,
     PHOT_ZP,
     Spectrum,
+    Annotation,
+    ClassicalAssignment,
+    FollowupRequest,
+    GroupPhotometry,
     GroupSpectrum,
+    GroupAnnotation,
 )
 
 import sncosmo
@@ -162,6 +170,116 @@ def get_color(bandpass_name):
         return bandcolor
 
 
+def get_photometry_labels(data):
+    """Return the legend label of each photometry point, built from its
+    instrument, filter and, where there is one, origin.
+
+    Parameters
+    ----------
+    data : `pandas.DataFrame`
+        The photometry, with `instrument`, `filter` and `origin` columns.
+
+    Returns
+    -------
+    `pandas.Series`
+        The labels, in the format instrument/filter[/origin].
+    """
+    labels = data['instrument'].astype(str) + '/' + data['filter'].astype(str)
+    has_origin = data['origin'].notna()
+    labels[has_origin] += '/' + data.loc[has_origin, 'origin'].astype(str)
+    return labels
+
+
+def get_errorbar_segments(x, y, yerr):
+    """Return the coordinates of vertical error bars, in the format expected
+    by the `xs` and `ys` columns of a `multi_line` glyph.
+
+    Parameters
+    ----------
+    x, y, yerr : array-like
+        The coordinates of the points and their errors.
+
+    Returns
+    -------
+    xs, ys : list of list of float
+        The start and end coordinates of the bar of each point.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    yerr = np.asarray(yerr, dtype=float)
+    return (
+        np.column_stack((x, x)).tolist(),
+        np.column_stack((y - yerr, y + yerr)).tolist(),
+    )
+
+
+def get_spectra_data(spectra):
+    """Concatenate spectra into the columns plotted by `spectroscopy_plot`.
+
+    Parameters
+    ----------
+    spectra : list of `skyportal.models.Spectrum`
+        The spectra, with their instruments, telescopes, assignments and
+        follow-up requests loaded.
+
+    Returns
+    -------
+    data : `pandas.DataFrame`
+        One row per spectrum point, with the fluxes of each spectrum
+        normalized to a median absolute flux of 1, sorted by date observed
+        and wavelength.
+    smoothed_flux : `pandas.Series`
+        The rolling average of pairs of consecutive raw fluxes within each
+        spectrum, without NaNs.
+    """
+    wavelengths = [np.asarray(s.wavelengths, dtype=float) for s in spectra]
+    fluxes = [np.asarray(s.fluxes, dtype=float) for s in spectra]
+    lengths = [len(f) for f in fluxes]
+
+    # normalize spectra to a median flux of 1 for easy comparison
+    normfacs = np.array([np.nanmedian(np.abs(f)) for f in fluxes])
+    normfacs[normfacs == 0.0] = 1e-20
+
+    raw_flux = np.concatenate(fluxes)
+    data = pd.DataFrame(
+        {
+            'wavelength': np.concatenate(wavelengths),
+            'flux': raw_flux / np.repeat(normfacs, lengths),
+            'id': np.repeat([s.id for s in spectra], lengths),
+            'telescope': np.repeat(
+                [s.instrument.telescope.name for s in spectra], lengths
+            ),
+            'instrument': np.repeat([s.instrument.name for s in spectra], lengths),
+            'date_observed': np.repeat(
+                [s.observed_at.isoformat(sep=' ', timespec='seconds') for s in spectra],
+                lengths,
+            ),
+            'pi': np.repeat(
+                [
+                    s.assignment.run.pi
+                    if s.assignment is not None
+                    else (
+                        s.followup_request.allocation.pi
+                        if s.followup_request is not None
+                        else ""
+                    )
+                    for s in spectra
+                ],
+                lengths,
+            ),
+        }
+    )
+    data.sort_values(by=['date_observed', 'wavelength'], inplace=True)
+
+    # Smooth the spectra by averaging consecutive points of each spectrum
+    spectrum_index = np.repeat(np.arange(len(spectra)), lengths)
+    same_spectrum = spectrum_index[1:] == spectrum_index[:-1]
+    smoothed_flux = pd.Series(((raw_flux[1:] + raw_flux[:-1]) / 2)[same_spectrum])
+    smoothed_flux = smoothed_flux.dropna()
+
+    return data, smoothed_flux
+
+
 def annotate_spec(plot, spectra, lower, upper):
     """Annotate photometry plot with spectral markers.
 
@@ -218,6 +336,67 @@ def annotate_spec(plot, spectra, lower, upper):
         )
 
 
+def get_photometry_plot_version(obj_id, user):
+    """Return a fingerprint of the data shown on the photometry plot of an
+    Obj to a user. It changes whenever photometry, spectra or annotations of
+    the Obj are added, modified, deleted or made accessible to the user, or
+    when the Obj itself (e.g., its redshift) is modified, and is computed
+    with a single aggregate query. Spectra are selected with the same
+    accessibility query as in `photometry_plot`.
+
+    Parameters
+    ----------
+    obj_id : str
+        ID of the plotted Obj.
+    user : `baselayer.app.models.User`, `baselayer.app.models.Token` or `AccessContext`
+        The user the plot is made for, or their access context.
+
+    Returns
+    -------
+    str
+        The fingerprint.
+    """
+    access = AccessContext.of(user)
+
+    def summarize(model, join_model):
+        return (
+            sa.select(
+                [
+                    sa.func.count(join_model.id),
+                    sa.func.max(join_model.id),
+                    sa.func.max(model.id),
+                    sa.func.max(model.modified),
+                ]
+            )
+            .select_from(model.__table__.join(join_model.__table__))
+            .where(model.obj_id == obj_id)
+            .where(access.in_groups(join_model.group_id))
+        )
+
+    spectra = (
+        Spectrum.query_records_accessible_by(access.user_or_token)
+        .filter(Spectrum.obj_id == obj_id)
+        .with_entities(
+            sa.func.count(Spectrum.id),
+            sa.null(),
+            sa.func.max(Spectrum.id),
+            sa.func.max(Spectrum.modified),
+        )
+    )
+
+    rows = DBSession().execute(
+        sa.union_all(
+            summarize(Photometry, GroupPhotometry),
+            spectra.statement,
+            summarize(Annotation, GroupAnnotation),
+            sa.select([sa.literal(1), sa.null(), sa.null(), Obj.modified]).where(
+                Obj.id == obj_id
+            ),
+        )
+    )
+    return ';'.join(','.join(str(value) for value in row) for row in rows)
+
+
 def photometry_plot(obj_id, user, width=600, height=300, device="browser"):
     """Create object photometry scatter plot.
 
@@ -259,16 +438,10 @@ def photometry_plot(obj_id, user, width=600, height=300, device="browser"):
         .all()
     )
 
-    data['color'] = [get_color(f) for f in data['filter']]
-
-    labels = []
-    for i, datarow in data.iterrows():
-        label = f'{datarow["instrument"]}/{datarow["filter"]}'
-        if datarow['origin'] is not None:
-            label += f'/{datarow["origin"]}'
-        labels.append(label)
-
-    data['label'] = labels
+    data['color'] = data['filter'].map(
+        {f: get_color(f) for f in data['filter'].unique()}
+    )
+    data['label'] = get_photometry_labels(data)
     data['zp'] = PHOT_ZP
     data['magsys'] = 'ab'
     data['alpha'] = 1.0
@@ -375,16 +548,7 @@ def photometry_plot(obj_id, user, width=600, height=300, device="browser"):
         imhover.renderers.append(model_dict[key])
 
         key = 'obserr' + str(i)
-        y_err_x = []
-        y_err_y = []
-
-        for d, ro in df.iterrows():
-            px = ro['mjd']
-            py = ro['flux']
-            err = ro['fluxerr']
-
-            y_err_x.append((px, px))
-            y_err_y.append((py - err, py + err))
+        y_err_x, y_err_y = get_errorbar_segments(df['mjd'], df['flux'], df['fluxerr'])
 
         model_dict[key] = plot.multi_line(
             xs='xs',
@@ -647,16 +811,9 @@ def photometry_plot(obj_id, user, width=600, height=300, device="browser"):
         imhover.renderers.append(model_dict[key])
 
         key = 'obserr' + str(i)
-        y_err_x = []
-        y_err_y = []
-
-        for d, ro in df[df['obs']].iterrows():
-            px = ro['mjd']
-            py = ro['mag']
-            err = ro['magerr']
-
-            y_err_x.append((px, px))
-            y_err_y.append((py - err, py + err))
+        y_err_x, y_err_y = get_errorbar_segments(
+            df[df['obs']]['mjd'], df[df['obs']]['mag'], df[df['obs']]['magerr']
+        )
 
         model_dict[key] = plot.multi_line(
             xs='xs',
@@ -902,17 +1059,12 @@ def photometry_plot(obj_id, user, width=600, height=300, device="browser"):
 
                 # errorbars for phases
                 key = 'fold' + ph + f'err{i}'
-                y_err_x = []
-                y_err_y = []
-
                 # get each visible error value
-                for d, ro in df[df['obs']].iterrows():
-                    px = ro['mjd_fold' + ph]
-                    py = ro['mag']
-                    err = ro['magerr']
-                    # set up error tuples
-                    y_err_x.append((px, px))
-                    y_err_y.append((py - err, py + err))
+                y_err_x, y_err_y = get_errorbar_segments(
+                    df[df['obs']]['mjd_fold' + ph],
+                    df[df['obs']]['mag'],
+                    df[df['obs']]['magerr'],
+                )
                 # plot phase errors
                 period_model_dict[key] = period_plot.multi_line(
                     xs='xs',
@@ -1064,6 +1216,13 @@ def spectroscopy_plot(
             Spectrum.obj_id == obj_id,
             GroupSpectrum.group_id.in_([g.id for g in user.accessible_groups]),
         )
+        .options(
+            joinedload(Spectrum.instrument).joinedload(Instrument.telescope),
+            joinedload(Spectrum.assignment).joinedload(ClassicalAssignment.run),
+            joinedload(Spectrum.followup_request).joinedload(
+                FollowupRequest.allocation
+            ),
+        )
     ).all()
 
     if spec_id is not None:
@@ -1075,49 +1234,7 @@ def spectroscopy_plot(
     palette = list(map(rgb2hex, rainbow(range(len(spectra)))))
     color_map = dict(zip([s.id for s in spectra], palette))
 
-    data = []
-    for i, s in enumerate(spectra):
-
-        # normalize spectra to a median flux of 1 for easy comparison
-        normfac = np.nanmedian(np.abs(s.fluxes))
-        normfac = normfac if normfac != 0.0 else 1e-20
-
-        df = pd.DataFrame(
-            {
-                'wavelength': s.wavelengths,
-                'flux': s.fluxes / normfac,
-                'id': s.id,
-                'telescope': s.instrument.telescope.name,
-                'instrument': s.instrument.name,
-                'date_observed': s.observed_at.isoformat(sep=' ', timespec='seconds'),
-                'pi': (
-                    s.assignment.run.pi
-                    if s.assignment is not None
-                    else (
-                        s.followup_request.allocation.pi
-                        if s.followup_request is not None
-                        else ""
-                    )
-                ),
-            }
-        )
-        data.append(df)
-    data = pd.concat(data)
-
-    data.sort_values(by=['date_observed', 'wavelength'], inplace=True)
-
-    dfs = []
-    for i, s in enumerate(spectra):
-        # Smooth the spectrum by using a rolling average
-        df = (
-            pd.DataFrame({'wavelength': s.wavelengths, 'flux': s.fluxes})
-            .rolling(2)
-            .mean(numeric_only=True)
-            .dropna()
-        )
-        dfs.append(df)
-
-    smoothed_data = pd.concat(dfs)
+    data, smoothed_flux = get_spectra_data(spectra)
 
     split = data.groupby('id', sort=False)
 
@@ -1131,8 +1248,8 @@ def spectroscopy_plot(
             ('PI', '@pi'),
         ]
     )
-    smoothed_max = np.max(smoothed_data['flux'])
-    smoothed_min = np.min(smoothed_data['flux'])
+    smoothed_max = np.max(smoothed_flux)
+    smoothed_min = np.min(smoothed_flux)
     ymax = smoothed_max * 1.05
     ymin = smoothed_min - 0.05 * (smoothed_max - smoothed_min)
     xmin = np.min(data['wavelength']) - 100
@@ -1187,14 +1304,14 @@ def spectroscopy_plot(
     # TODO how to choose a good default?
     plot.y_range = Range1d(0, 1.03 * data.flux.max())
 
-    spec_labels = []
-    for k, _ in split:
-        s = Spectrum.query.get(k)
-        label = f'{s.instrument.telescope.nickname}/{s.instrument.name} ({s.observed_at.date().isoformat()})'
-        spec_labels.append(label)
+    spec_labels = {
+        s.id: f'{s.instrument.telescope.nickname}/{s.instrument.name} '
+        f'({s.observed_at.date().isoformat()})'
+        for s in spectra
+    }
 
     toggle = CheckboxWithLegendGroup(
-        labels=spec_labels,
+        labels=[spec_labels[k] for k, _ in split],
         active=list(range(len(spectra))),
         colors=[color_map[k] for k, df in split],
         width=width // 5,
@@ -0,0 +1,487 @@
+from datetime import datetime
+import io
+import uuid
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+from sqlalchemy.sql import column
+
+from .models import (
+    PHOT_DETECTION_THRESHOLD,
+    PHOT_ZP,
+    Candidate,
+    Comment,
+    DBSession,
+    GroupComment,
+    GroupPhotometry,
+    GroupSpectrum,
+    Obj,
+    Photometry,
+    Source,
+    Spectrum,
+    refresh_photometry_summaries,
+)
+
+# Range of the MJDs of the peaks of the synthetic transients
+PEAK_MJD_RANGE = (58000.0, 59500.0)
+
+# Wavelength range of the synthetic spectra [Angstrom]
+SPECTRUM_WAVELENGTH_RANGE = (3500.0, 9500.0)
+
+COMMENT_TEXTS = [
+    'Looks like a SN Ia a few days before peak.',
+    'Nuclear transient? Check the host galaxy.',
+    'Probably bogus, next to a bright star.',
+    'Requested a spectrum.',
+    'Rising fast in r.',
+    'Variable star.',
+    'Faded below the detection limit.',
+    'Redshift from the host: see the spectrum.',
+]
+
+# MJD of the Unix epoch
+UNIX_EPOCH_MJD = 40587.0
+
+
+def mjd_to_datetime(mjd):
+    """Convert an array of MJDs to naive UTC datetimes."""
+    return pd.to_datetime((np.asarray(mjd) - UNIX_EPOCH_MJD) * 86400.0, unit='s')
+
+
+def copy_rows(table, rows):
+    """COPY the rows of a DataFrame, whose columns are named after columns of
+    `table`, into `table`. Empty strings and NaNs are written as NULL.
+
+    Returns
+    -------
+    int
+        The number of rows.
+    """
+    buffer = io.StringIO()
+    rows.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    columns = ', '.join(f'"{column}"' for column in rows.columns)
+    cursor = DBSession().connection().connection.cursor()
+    cursor.copy_expert(
+        f'COPY {table.name} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer
+    )
+    return len(rows)
+
+
+def array_literals(values):
+    """Format the rows of a 2D array as Postgres array literals."""
+    template = '{' + ','.join(['%.6g'] * values.shape[1]) + '}'
+    return [template % tuple(row) for row in values.tolist()]
+
+
+class DatasetGenerator:
+    def __init__(
+        self,
+        user,
+        groups,
+        filters,
+        instruments,
+        seed=0,
+        id_prefix=None,
+        photometry_per_obj=100,
+        cadence=2.0,
+        candidate_fraction=0.5,
+        source_fraction=0.1,
+        spectrum_fraction=0.02,
+        comments_per_obj=0.2,
+        spectrum_points=1000,
+    ):
+        """
+        Write synthetic Objs, with their Candidates, Sources, Photometry,
+        Spectra and Comments, directly to the database with COPY, to build
+        databases of realistic size for load and scaling tests.
+
+        Each Obj is a transient with a Gaussian rise and an exponential
+        decline, observed by one of the imaging `instruments`, in a random
+        filter, every `cadence` days on average. Faint points are partly
+        reported as non-detections. Candidates pass random `filters`, and
+        Sources are saved to random `groups`; the Photometry, Spectra and
+        Comments of an Obj are shared with the groups of the filters it
+        passed and of its Sources, or else with one random group.
+
+        The data written by `generate` only depends on the seed and on its
+        arguments, so that a dataset can be reproduced and extended.
+
+        Parameters
+        ----------
+        user : `baselayer.app.models.User`
+            Owner of the generated data.
+        groups : list of `skyportal.models.Group`
+            Groups to save Sources to and share data with.
+        filters : list of `skyportal.models.Filter`
+            Filters of the Candidates. Their groups are added to `groups`.
+        instruments : list of `skyportal.models.Instrument`
+            Instruments of the Photometry (those with filters) and of the
+            Spectra (spectrographs).
+        seed : int, optional
+            Seed of the random generator.
+        id_prefix : str, optional
+            Prefix of the IDs of the Objs, followed by their 9-digit index.
+            Defaults to `synth<seed>_`.
+        photometry_per_obj : float, optional
+            Mean number of photometry points per Obj.
+        cadence : float, optional
+            Mean interval between photometry points [days].
+        candidate_fraction : float, optional
+            Fraction of Objs that passed filters.
+        source_fraction : float, optional
+            Fraction of Objs saved as Sources.
+        spectrum_fraction : float, optional
+            Fraction of Objs with one or two Spectra.
+        comments_per_obj : float, optional
+            Mean number of Comments per Obj.
+        spectrum_points : int, optional
+            Number of wavelengths of each Spectrum.
+        """
+        self.photometry_instruments = [i for i in instruments if len(i.filters) > 0]
+        self.spectrograph_ids = np.array(
+            [i.id for i in instruments if i.does_spectroscopy], dtype=np.int64
+        )
+        if len(self.photometry_instruments) == 0:
+            raise ValueError('At least one instrument with filters is required.')
+
+        self.user_id = user.id
+        self.filter_ids = np.array([f.id for f in filters], dtype=np.int64)
+        self.group_ids = np.array(
+            sorted({g.id for g in groups} | {f.group_id for f in filters}),
+            dtype=np.int64,
+        )
+        if len(self.group_ids) == 0:
+            raise ValueError('At least one group is required.')
+        # which group each filter belongs to
+        self.filter_groups = np.zeros(
+            (len(self.filter_ids), len(self.group_ids)), dtype=bool
+        )
+        for i, f in enumerate(filters):
+            self.filter_groups[i, np.searchsorted(self.group_ids, f.group_id)] = True
+
+        self.instrument_ids = np.array(
+            [i.id for i in self.photometry_instruments], dtype=np.int64
+        )
+        # bandpasses of each imaging instrument, padded with their first one
+        max_filters = max(len(i.filters) for i in self.photometry_instruments)
+        self.bandpasses = np.array(
+            [
+                list(i.filters) + [i.filters[0]] * (max_filters - len(i.filters))
+                for i in self.photometry_instruments
+            ]
+        )
+        self.n_bandpasses = np.array(
+            [len(i.filters) for i in self.photometry_instruments]
+        )
+
+        self.seed = seed
+        self.id_prefix = f'synth{seed}_' if id_prefix is None else id_prefix
+        self.photometry_per_obj = photometry_per_obj
+        self.cadence = cadence
+        self.candidate_fraction = candidate_fraction
+        self.source_fraction = source_fraction
+        self.spectrum_fraction = spectrum_fraction
+        self.comments_per_obj = comments_per_obj
+        self.wavelengths = np.linspace(*SPECTRUM_WAVELENGTH_RANGE, spectrum_points)
+
+    def random_groups(self, rng, n, fraction):
+        """Return an (n, n_groups) mask of groups, with one random group per
+        row plus each other group with probability `fraction`."""
+        mask = rng.uniform(size=(n, len(self.group_ids))) < fraction
+        mask[np.arange(n), rng.integers(len(self.group_ids), size=n)] = True
+        return mask
+
+    def share(self, link_table, data_table, sharing, now):
+        """Share the rows of a data table with the groups of their Objs.
+
+        Parameters
+        ----------
+        link_table : `sqlalchemy.Table`
+            The table linking the data to groups, e.g., `group_photometry`.
+        data_table : `sqlalchemy.Table`
+            The data table, with an `obj_id` column.
+        sharing : `sqlalchemy.sql.expression.TableClause`
+            The `obj_id` and `group_id` of the groups of each new Obj.
+        now : `datetime.datetime`
+            Creation time of the links.
+
+        Returns
+        -------
+        int
+            The number of links.
+        """
+        data_column = next(
+            c.name
+            for c in link_table.columns
+            if any(fk.references(data_table) for fk in c.foreign_keys)
+        )
+        return (
+            DBSession()
+            .execute(
+                link_table.insert().from_select(
+                    [data_column, 'group_id', 'created_at', 'modified'],
+                    sa.select(
+                        [
+                            data_table.c.id,
+                            sharing.c.group_id,
+                            sa.literal(now),
+                            sa.literal(now),
+                        ]
+                    ).where(data_table.c.obj_id == sharing.c.obj_id),
+                )
+            )
+            .rowcount
+        )
+
+    def generate(self, start, n_objs):
+        """Write the Objs with indices `start` to `start + n_objs - 1`, and
+        their data. The caller commits the transaction.
+
+        Returns
+        -------
+        dict
+            Number of rows written to each table.
+        """
+        rng = np.random.default_rng([self.seed, start])
+        now = datetime.utcnow()
+        # constant columns are formatted once
+        created = now.isoformat(sep=' ')
+        obj_ids = np.array(
+            [f'{self.id_prefix}{i:09d}' for i in range(start, start + n_objs)]
+        )
+        ra = rng.uniform(0, 360, n_objs)
+        dec = np.degrees(np.arcsin(rng.uniform(-1, 1, n_objs)))
+        peak_mjd = rng.uniform(*PEAK_MJD_RANGE, n_objs)
+        peak_flux = 10 ** (-0.4 * (rng.uniform(16, 21, n_objs) - PHOT_ZP))
+        rise_time = rng.uniform(5, 20, n_objs)
+        decline_time = rng.uniform(10, 60, n_objs)
+        counts = {}
+
+        # Photometry, from a few rise times before the peak
+        n_points = np.maximum(rng.poisson(self.photometry_per_obj, n_objs), 1)
+        point_objs = np.repeat(np.arange(n_objs), n_points)
+        first_points = np.cumsum(n_points) - n_points
+        elapsed = np.cumsum(rng.exponential(self.cadence, len(point_objs)))
+        elapsed -= np.repeat(elapsed[first_points], n_points)
+        mjd = (peak_mjd - 3 * rise_time)[point_objs] + elapsed
+        phase = mjd - peak_mjd[point_objs]
+        model_flux = peak_flux[point_objs] * np.where(
+            phase < 0,
+            np.exp(-0.5 * (phase / rise_time[point_objs]) ** 2),
+            np.exp(-np.maximum(phase, 0) / decline_time[point_objs]),
+        )
+        limiting_mag = rng.normal(20.5, 0.5, len(point_objs))
+        fluxerr = 10 ** (-0.4 * (limiting_mag - PHOT_ZP)) / 5
+        flux = model_flux + rng.normal(size=len(point_objs)) * fluxerr
+        detected = flux / fluxerr > PHOT_DETECTION_THRESHOLD
+        upper_limits = ~detected & (rng.uniform(size=len(point_objs)) < 0.5)
+        flux[upper_limits] = np.nan
+
+        instruments = rng.integers(len(self.photometry_instruments), size=n_objs)
+        point_instruments = instruments[point_objs]
+        bandpasses = self.bandpasses[
+            point_instruments,
+            (
+                rng.uniform(size=len(point_objs)) * self.n_bandpasses[point_instruments]
+            ).astype(int),
+        ]
+
+        # Candidates pass their filters at the first detection
+        first_detection = np.full(n_objs, np.inf)
+        np.minimum.at(first_detection, point_objs[detected], mjd[detected])
+        first_detection = np.where(
+            np.isfinite(first_detection), first_detection, peak_mjd
+        )
+        passed = rng.uniform(size=(n_objs, len(self.filter_ids))) < 0.5
+        if len(self.filter_ids) > 0:
+            passed[
+                np.arange(n_objs), rng.integers(len(self.filter_ids), size=n_objs)
+            ] = True
+        passed &= (rng.uniform(size=n_objs) < self.candidate_fraction)[:, None]
+        saved = self.random_groups(rng, n_objs, 0.2)
+        saved &= (rng.uniform(size=n_objs) < self.source_fraction)[:, None]
+        shared = (passed.astype(int) @ self.filter_groups.astype(int) > 0) | saved
+        unshared = ~shared.any(axis=1)
+        shared[unshared] = self.random_groups(rng, unshared.sum(), 0.0)
+
+        has_redshift = rng.uniform(size=n_objs) < 0.3
+        counts['objs'] = copy_rows(
+            Obj.__table__,
+            pd.DataFrame(
+                {
+                    'id': obj_ids,
+                    'ra': ra,
+                    'dec': dec,
+                    'ra_dis': ra,
+                    'dec_dis': dec,
+                    'offset': 0.0,
+                    'redshift': np.where(
+                        has_redshift, rng.uniform(0.01, 0.2, n_objs), np.nan
+                    ),
+                    'transient': False,
+                    'varstar': False,
+                    'is_roid': False,
+                    'score': rng.uniform(size=n_objs),
+                    # keys used for websocket messages are not reproducible
+                    'internal_key': [str(uuid.uuid4()) for _ in range(n_objs)],
+                    'detect_photometry_count': np.bincount(
+                        point_objs[detected], minlength=n_objs
+                    ),
+                    'created_at': created,
+                    'modified': created,
+                }
+            ),
+        )
+
+        candidate_objs, candidate_filters = np.nonzero(passed)
+        counts['candidates'] = copy_rows(
+            Candidate.__table__,
+            pd.DataFrame(
+                {
+                    'obj_id': obj_ids[candidate_objs],
+                    'filter_id': self.filter_ids[candidate_filters],
+                    'passed_at': mjd_to_datetime(first_detection[candidate_objs]),
+                    'passing_alert_id': rng.integers(
+                        1, 2 ** 62, size=len(candidate_objs)
+                    ),
+                    'uploader_id': self.user_id,
+                    'created_at': created,
+                    'modified': created,
+                }
+            ),
+        )
+
+        source_objs, source_groups = np.nonzero(saved)
+        counts['sources'] = copy_rows(
+            Source.__table__,
+            pd.DataFrame(
+                {
+                    'obj_id': obj_ids[source_objs],
+                    'group_id': self.group_ids[source_groups],
+                    'saved_by_id': self.user_id,
+                    'saved_at': mjd_to_datetime(
+                        first_detection[source_objs]
+                        + rng.uniform(0, 5, len(source_objs))
+                    ),
+                    'created_at': created,
+                    'modified': created,
+                }
+            ),
+        )
+
+        # the groups each new Obj's data is shared with
+        sharing = sa.table(
+            f'synthetic_sharing_{uuid.uuid4().hex}',
+            column('obj_id', sa.String),
+            column('group_id', sa.Integer),
+        )
+        DBSession().execute(
+            f"""
+            CREATE TEMPORARY TABLE {sharing.name} (
+                obj_id CHARACTER VARYING NOT NULL,
+                group_id INTEGER NOT NULL
+            ) ON COMMIT DROP
+            """
+        )
+        sharing_objs, sharing_groups = np.nonzero(shared)
+        copy_rows(
+            sharing,
+            pd.DataFrame(
+                {
+                    'obj_id': obj_ids[sharing_objs],
+                    'group_id': self.group_ids[sharing_groups],
+                }
+            ),
+        )
+        DBSession().execute(f'ANALYZE {sharing.name}')
+
+        counts['photometry'] = copy_rows(
+            Photometry.__table__,
+            pd.DataFrame(
+                {
+                    'obj_id': obj_ids[point_objs],
+                    'instrument_id': self.instrument_ids[point_instruments],
+                    'mjd': mjd,
+                    # NaN fluxes (non-detections) are stored as 'NaN', not NULL
+                    'flux': pd.Series(flux).astype(object).fillna('NaN'),
+                    'fluxerr': fluxerr,
+                    'filter': bandpasses,
+                    'ra': ra[point_objs]
+                    + rng.normal(0, 0.1 / 3600, len(point_objs))
+                    / np.cos(np.radians(dec[point_objs])),
+                    'dec': dec[point_objs] + rng.normal(0, 0.1 / 3600, len(point_objs)),
+                    'upload_id': str(uuid.uuid4()),
+                    'owner_id': self.user_id,
+                    'created_at': created,
+                    'modified': created,
+                }
+            ),
+        )
+        counts['group_photometry'] = self.share(
+            GroupPhotometry.__table__, Photometry.__table__, sharing, now
+        )
+
+        counts['spectra'] = counts['group_spectra'] = 0
+        if len(self.spectrograph_ids) > 0:
+            n_spectra = rng.integers(1, 3, n_objs) * (
+                rng.uniform(size=n_objs) < self.spectrum_fraction
+            )
+            spectrum_objs = np.repeat(np.arange(n_objs), n_spectra)
+            n_rows = len(spectrum_objs)
+            continuum = (
+                rng.uniform(1e-17, 1e-15, n_rows)[:, None]
+                * (self.wavelengths / 6000.0) ** rng.uniform(-3, 1, n_rows)[:, None]
+            )
+            errors = 0.05 * continuum
+            fluxes = continuum + rng.normal(size=continuum.shape) * errors
+            counts['spectra'] = copy_rows(
+                Spectrum.__table__,
+                pd.DataFrame(
+                    {
+                        'obj_id': obj_ids[spectrum_objs],
+                        'wavelengths': array_literals(self.wavelengths[None, :])
+                        * n_rows,
+                        'fluxes': array_literals(fluxes),
+                        'errors': array_literals(errors),
+                        'observed_at': mjd_to_datetime(
+                            peak_mjd[spectrum_objs] + rng.uniform(-5, 30, n_rows)
+                        ),
+                        'instrument_id': self.spectrograph_ids[
+                            rng.integers(len(self.spectrograph_ids), size=n_rows)
+                        ],
+                        'owner_id': self.user_id,
+                        'created_at': created,
+                        'modified': created,
+                    }
+                ),
+            )
+            counts['group_spectra'] = self.share(
+                GroupSpectrum.__table__, Spectrum.__table__, sharing, now
+            )
+
+        comment_objs = np.repeat(
+            np.arange(n_objs), rng.poisson(self.comments_per_obj, n_objs)
+        )
+        counts['comments'] = copy_rows(
+            Comment.__table__,
+            pd.DataFrame(
+                {
+                    'text': np.array(COMMENT_TEXTS)[
+                        rng.integers(len(COMMENT_TEXTS), size=len(comment_objs))
+                    ],
+                    'ctype': 'text',
+                    'author_id': self.user_id,
+                    'obj_id': obj_ids[comment_objs],
+                    'created_at': created,
+                    'modified': created,
+                }
+            ),
+        )
+        counts['group_comments'] = self.share(
+            GroupComment.__table__, Comment.__table__, sharing, now
+        )
+
+        refresh_photometry_summaries(obj_ids.tolist())
+        return counts
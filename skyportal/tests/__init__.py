@@ -1,6 +1,8 @@
 import os
+import contextlib
 import urllib.parse
 import requests
+import sqlalchemy as sa
 
 from baselayer.app.env import load_env
 
@@ -57,3 +59,31 @@ def api(
                 return response.status_code, response.json()
         else:
             return response.status_code, None
+
+
+@contextlib.contextmanager
+def count_sql_statements(session):
+    """Count the SQL statements issued through a session's engine.
+
+    Parameters
+    ----------
+    session : `sqlalchemy.orm.Session`
+        The session whose bound engine is instrumented.
+
+    Yields
+    ------
+    statements : list of str
+        The statements executed inside the `with` block, appended to as they
+        are issued.
+    """
+    engine = session.get_bind()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    sa.event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", before_cursor_execute)
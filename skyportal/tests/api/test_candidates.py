@@ -2,7 +2,10 @@ import datetime
 import numpy.testing as npt
 import uuid
 
-from skyportal.tests import api
+from skyportal.tests import api, count_sql_statements
+from skyportal.tests.fixtures import ObjFactory
+from skyportal.models import DBSession, Candidate, Obj, Source, Thumbnail
+from skyportal.handlers.api.candidate import get_candidates_info
 
 from tdtax import taxonomy, __version__
 
@@ -1307,3 +1310,139 @@ def test_candidate_list_not_saved_to_all_selected_groups(
         )
         == 0
     )
+
+
+def test_token_user_post_candidates_in_bulk(
+    upload_data_token, view_only_token, public_filter, public_filter2
+):
+    obj_ids = [str(uuid.uuid4()) for _ in range(3)]
+    passed_at = str(datetime.datetime.utcnow())
+    candidates = [
+        {
+            "id": obj_id,
+            "ra": 234.22 + i,
+            "dec": -22.33,
+            "redshift": 3,
+            "filter_ids": [public_filter.id],
+            "passing_alert_id": i,
+            "passed_at": passed_at,
+        }
+        for i, obj_id in enumerate(obj_ids)
+    ]
+    status, data = api(
+        "POST",
+        "candidates/bulk",
+        data={"candidates": candidates},
+        token=upload_data_token,
+    )
+    assert status == 200
+    ids = data["data"]["ids"]
+    assert len(ids) == 3
+
+    for i, obj_id in enumerate(obj_ids):
+        status, data = api("GET", f"candidates/{obj_id}", token=view_only_token)
+        assert status == 200
+        npt.assert_almost_equal(data["data"]["ra"], 234.22 + i)
+        assert data["data"]["redshift"] == 3
+
+        thumbnail_types = {
+            t.type for t in Thumbnail.query.filter(Thumbnail.obj_id == obj_id)
+        }
+        assert thumbnail_types == {"sdss", "dr8"}
+
+    # posting the same candidates again updates them
+    candidates[0]["passing_alert_id"] = 10
+    candidates[0]["redshift"] = 0.5
+    status, data = api(
+        "POST",
+        "candidates/bulk",
+        data={"candidates": candidates},
+        token=upload_data_token,
+    )
+    assert status == 200
+    assert data["data"]["ids"] == ids
+    candidate = Candidate.query.get(ids[0])
+    DBSession().refresh(candidate)
+    assert candidate.passing_alert_id == 10
+    obj = Obj.query.get(obj_ids[0])
+    DBSession().refresh(obj)
+    assert obj.redshift == 0.5
+    assert len(obj.redshift_history) == 2
+    assert Thumbnail.query.filter(Thumbnail.obj_id == obj_ids[0]).count() == 2
+
+    # the upload is rejected if any filter is not accessible
+    status, data = api(
+        "POST",
+        "candidates/bulk",
+        data={
+            "candidates": [
+                {**candidates[0], "filter_ids": [public_filter.id]},
+                {**candidates[1], "filter_ids": [public_filter2.id]},
+            ]
+        },
+        token=upload_data_token,
+    )
+    assert status == 400
+    assert "Insufficient permissions" in data["message"]
+
+    # new Objs need a position
+    status, data = api(
+        "POST",
+        "candidates/bulk",
+        data={
+            "candidates": [
+                {
+                    "id": str(uuid.uuid4()),
+                    "filter_ids": [public_filter.id],
+                    "passed_at": passed_at,
+                }
+            ]
+        },
+        token=upload_data_token,
+    )
+    assert status == 400
+    assert "RA and Dec must not be null" in data["message"]
+
+
+def test_candidate_list_statement_count_independent_of_page_size(
+    user, public_group, public_filter
+):
+    objs = [ObjFactory(groups=[public_group]) for _ in range(5)]
+    obj_ids = [obj.id for obj in objs]
+    DBSession().add_all(
+        [
+            Candidate(
+                obj_id=obj_id,
+                filter_id=public_filter.id,
+                passed_at=datetime.datetime.utcnow(),
+                uploader_id=user.id,
+            )
+            for obj_id in obj_ids
+        ]
+    )
+    DBSession().add_all(
+        [Source(obj_id=obj_id, group_id=public_group.id) for obj_id in obj_ids]
+    )
+    DBSession().commit()
+
+    statement_counts = []
+    for page_size in [1, 5]:
+        DBSession().expire_all()
+        page = Obj.query.filter(Obj.id.in_(obj_ids[:page_size])).all()
+        user.accessible_groups  # load outside of the counted block
+        with count_sql_statements(DBSession()) as statements:
+            candidate_list = get_candidates_info(
+                page, user, [public_group.id], [public_filter.id]
+            )
+        statement_counts.append(len(statements))
+
+        assert len(candidate_list) == page_size
+        for candidate_info in candidate_list:
+            assert candidate_info["is_source"]
+            assert [g.id for g in candidate_info["saved_groups"]] == [public_group.id]
+            assert candidate_info["passing_group_ids"] == [public_group.id]
+
+    assert statement_counts[0] == statement_counts[1]
+
+    for obj in objs:
+        ObjFactory.teardown(obj)
@@ -1,6 +1,7 @@
 import uuid
 from skyportal.tests import api
 from skyportal.model_util import create_token
+from skyportal.models import DBSession, GroupUser
 from baselayer.app.env import load_env
 
 _, cfg = load_env()
@@ -393,3 +394,75 @@ def test_obj_groups(public_source, public_group, super_admin_token):
     )
     assert status == 200
     assert data["data"][0]["id"] == public_group.id
+
+
+def test_group_user_changes_invalidate_access_cache(
+    super_admin_token, user, view_only_token, public_group2, public_source_group2
+):
+    status, data = api(
+        "GET", f"sources/{public_source_group2.id}", token=view_only_token
+    )
+    assert status == 400
+
+    status, data = api(
+        "POST",
+        f"groups/{public_group2.id}/users",
+        data={"userID": user.id, "admin": False},
+        token=super_admin_token,
+    )
+    assert status == 200
+
+    # the cached accessible groups of the token owner were invalidated
+    status, data = api(
+        "GET", f"sources/{public_source_group2.id}", token=view_only_token
+    )
+    assert status == 200
+
+    status, data = api(
+        "DELETE",
+        f"groups/{public_group2.id}/users/{user.id}",
+        token=super_admin_token,
+    )
+    assert status == 200
+
+    status, data = api(
+        "GET", f"sources/{public_source_group2.id}", token=view_only_token
+    )
+    assert status == 400
+
+    status, data = api("GET", "sysinfo", token=view_only_token)
+    assert status == 200
+    stats = data["data"]["accessCache"]
+    assert stats["enabled"] == (cfg["misc.access_cache_ttl"] != 0)
+    if stats["enabled"]:
+        # the entry of the token, stored again by the last request
+        assert stats["entries"] >= 1
+
+
+def test_model_group_user_changes_invalidate_access_cache(
+    user, view_only_token, public_group2, public_source_group2
+):
+    # memberships changed through the models rather than the group handlers,
+    # e.g., by scripts, also invalidate the cached accessible groups
+    status, data = api(
+        "GET", f"sources/{public_source_group2.id}", token=view_only_token
+    )
+    assert status == 400
+
+    group_user = GroupUser(group_id=public_group2.id, user_id=user.id, admin=False)
+    DBSession().add(group_user)
+    DBSession().commit()
+
+    status, data = api(
+        "GET", f"sources/{public_source_group2.id}", token=view_only_token
+    )
+    assert status == 200
+
+    DBSession().delete(group_user)
+    DBSession().commit()
+
+    # the revoked group no longer grants access on the next request
+    status, data = api(
+        "GET", f"sources/{public_source_group2.id}", token=view_only_token
+    )
+    assert status == 400
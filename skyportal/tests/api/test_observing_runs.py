@@ -1,3 +1,6 @@
+import io
+import zipfile
+
 from skyportal.tests import api
 
 
@@ -138,3 +141,53 @@ def test_unauthorized_user_modify_unowned_observing_run(
 
     assert status == 400
     assert data['status'] == 'error'
+
+
+def test_observing_run_finding_charts(
+    red_transients_run, public_source, upload_data_token
+):
+    status, data = api(
+        "PATCH",
+        f"sources/{public_source.id}",
+        data={"ra": 234.22, "dec": -22.33},
+        token=upload_data_token,
+    )
+    assert status == 200
+
+    status, data = api(
+        'POST',
+        'assignment',
+        data={
+            'run_id': red_transients_run.id,
+            'obj_id': public_source.id,
+            'priority': '1',
+        },
+        token=upload_data_token,
+    )
+    assert status == 200
+
+    response = api(
+        'GET',
+        f'observing_run/{red_transients_run.id}/finding_charts',
+        params={'imsize': '2'},
+        token=upload_data_token,
+        raw_response=True,
+    )
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'application/zip'
+
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert f'finder_{public_source.id}.pdf' in archive.namelist()
+    starlist = archive.read(
+        f'observing_run_{red_transients_run.id}_starlist_Keck.txt'
+    ).decode()
+    assert f'source_name={public_source.id}' in starlist
+
+    # try an image source we dont know about
+    status, data = api(
+        'GET',
+        f'observing_run/{red_transients_run.id}/finding_charts',
+        params={'image_source': 'whoknows'},
+        token=upload_data_token,
+    )
+    assert status == 400
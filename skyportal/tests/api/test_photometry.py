@@ -1,10 +1,16 @@
+import io
+import json
 import math
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
+import pandas as pd
+import pyarrow as pa
 import sncosmo
 
 from baselayer.app.env import load_env
-from skyportal.models import DBSession, Token
+from skyportal.models import DBSession, Token, Photometry, PhotometrySummary
 from skyportal.tests import api
 
 _, cfg = load_env()
@@ -129,6 +135,133 @@ def test_token_user_post_put_photometry_data(
     assert len(set(new_ids).intersection(set(ids))) == 1
 
 
+def test_token_user_bulk_post_put_photometry_data(
+    upload_data_token_two_groups, public_source, public_group, public_group2, ztf_camera
+):
+    photometry = {
+        'obj_id': str(public_source.id),
+        'instrument_id': ztf_camera.id,
+        "mjd": [59500, 59501, 59502],
+        "mag": [19.2, 19.3, None],
+        "magerr": [0.05, 0.06, None],
+        "limiting_mag": [20.0, 20.1, 20.2],
+        "magsys": ["ab", "ab", "ab"],
+        "filter": ["ztfr", "ztfg", "ztfr"],
+        "ra": [42.01, None, 42.02],
+        "dec": [42.02, None, 42.03],
+        "origin": [None, "lol", "lol"],
+        "altdata": [{"key": "value, with a comma"}, None, {"quote": '"'}],
+        'group_ids': [public_group.id],
+    }
+    status, data = api(
+        'POST',
+        'photometry',
+        data=photometry,
+        params={'bulk': True},
+        token=upload_data_token_two_groups,
+    )
+    assert status == 200
+    assert data['status'] == 'success'
+    ids = data["data"]["ids"]
+    assert len(ids) == 3
+
+    status, data = api(
+        'GET', f'photometry/{ids[0]}?format=mag', token=upload_data_token_two_groups
+    )
+    assert status == 200
+    np.testing.assert_allclose(data['data']['mag'], 19.2)
+    assert data['data']['origin'] == ''
+
+    status, data = api(
+        'GET', f'photometry/{ids[2]}?format=flux', token=upload_data_token_two_groups
+    )
+    assert status == 200
+    assert data['data']['flux'] is None
+    assert data['data']['ra'] == 42.02
+
+    altdata = dict(
+        DBSession()
+        .query(Photometry.id, Photometry.altdata)
+        .filter(Photometry.id.in_(ids))
+    )
+    assert altdata == {
+        ids[0]: {"key": "value, with a comma"},
+        ids[1]: None,
+        ids[2]: {"quote": '"'},
+    }
+
+    # POSTing the same photometry again should fail
+    status, data = api(
+        'POST',
+        'photometry',
+        data=photometry,
+        params={'bulk': True},
+        token=upload_data_token_two_groups,
+    )
+    assert status == 400
+    assert data['status'] == 'error'
+
+    # PUTing it with a new point and a new group returns the existing IDs
+    # and shares the existing points with the new group
+    photometry['mjd'][2] = 59503
+    photometry['group_ids'] = [public_group2.id]
+    status, data = api(
+        'PUT',
+        'photometry',
+        data=photometry,
+        params={'bulk': True},
+        token=upload_data_token_two_groups,
+    )
+    assert status == 200
+    assert data['status'] == 'success'
+    new_ids = data["data"]["ids"]
+    assert new_ids[:2] == ids[:2]
+    assert new_ids[2] not in ids
+
+    status, data = api(
+        'GET', f'photometry/{ids[0]}', token=upload_data_token_two_groups
+    )
+    assert status == 200
+    group_ids = [g["id"] for g in data['data']['groups']]
+    assert sorted(group_ids) == sorted([public_group.id, public_group2.id])
+
+
+def test_concurrent_put_photometry_does_not_duplicate(
+    upload_data_token, public_source, public_group, ztf_camera
+):
+    photometry = {
+        'obj_id': str(public_source.id),
+        'instrument_id': ztf_camera.id,
+        'mjd': [59600.0 + i for i in range(20)],
+        'flux': [12.24] * 20,
+        'fluxerr': [0.031] * 20,
+        'zp': 25.0,
+        'magsys': 'ab',
+        'filter': 'ztfg',
+        'group_ids': [public_group.id],
+    }
+
+    def put(_):
+        return api('PUT', 'photometry', data=photometry, token=upload_data_token)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(put, range(8)))
+
+    for status, data in results:
+        assert status == 200
+        assert data['status'] == 'success'
+    assert all(
+        data['data']['ids'] == results[0][1]['data']['ids'] for _, data in results
+    )
+
+    status, data = api(
+        'GET', f'sources/{public_source.id}/photometry', token=upload_data_token
+    )
+    assert status == 200
+    mjds = [p['mjd'] for p in data['data'] if p['mjd'] >= 59600.0]
+    assert sorted(mjds) == photometry['mjd']
+
+
 def test_token_user_post_put_get_photometry_data(
     upload_data_token_two_groups, public_source, public_group, public_group2, ztf_camera
 ):
@@ -1152,6 +1285,135 @@ def test_user_can_delete_owned_photometry_data(
     )
     assert status == 400
 
+    status, data = api('DELETE', f'photometry/{photometry_id}', token=upload_data_token)
+    assert status == 400
+    assert 'Invalid photometry ID' in data['message']
+
+    status, data = api(
+        'PATCH',
+        f'photometry/{photometry_id}',
+        data={
+            'obj_id': str(public_source.id),
+            'flux': 11.0,
+            'mjd': 58000.0,
+            'instrument_id': ztf_camera.id,
+            'fluxerr': 0.031,
+            'zp': 25.0,
+            'magsys': 'ab',
+            'filter': 'ztfi',
+        },
+        token=upload_data_token,
+    )
+    assert status == 400
+    assert 'Invalid photometry ID' in data['message']
+
+
+def test_photometry_summary_maintained_on_post_and_delete(
+    upload_data_token, public_group, ztf_camera
+):
+    obj_id = str(uuid.uuid4())
+    status, data = api(
+        "POST",
+        "sources",
+        data={
+            "id": obj_id,
+            "ra": 234.22,
+            "dec": -22.33,
+            "group_ids": [public_group.id],
+        },
+        token=upload_data_token,
+    )
+    assert status == 200
+
+    status, data = api(
+        'POST',
+        'photometry',
+        data={
+            'obj_id': obj_id,
+            'mjd': [58000.0, 58001.0, 58002.0, 58003.0],
+            'instrument_id': ztf_camera.id,
+            'flux': [12.24, 24.48, 6.12, 100.0],
+            'fluxerr': [0.031, 0.031, 0.031, 50.0],
+            'zp': 25.0,
+            'magsys': 'ab',
+            'filter': ['ztfg', 'ztfg', 'ztfg', 'ztfr'],
+            'group_ids': [public_group.id],
+        },
+        token=upload_data_token,
+    )
+    assert status == 200
+    assert data['status'] == 'success'
+    ids = data['data']['ids']
+
+    def get_summaries():
+        return {
+            row.filter: row
+            for row in DBSession()
+            .query(
+                PhotometrySummary.filter,
+                PhotometrySummary.detection_count,
+                PhotometrySummary.first_detected_mjd,
+                PhotometrySummary.last_detected_mjd,
+                PhotometrySummary.peak_detected_mjd,
+                PhotometrySummary.peak_detected_mag,
+            )
+            .filter(PhotometrySummary.obj_id == obj_id)
+        }
+
+    # the ztfr point is below the detection threshold
+    summaries = get_summaries()
+    assert list(summaries) == ['ztfg']
+    assert summaries['ztfg'].detection_count == 3
+    assert summaries['ztfg'].first_detected_mjd == 58000.0
+    assert summaries['ztfg'].last_detected_mjd == 58002.0
+    assert summaries['ztfg'].peak_detected_mjd == 58002.0
+    np.testing.assert_allclose(
+        summaries['ztfg'].peak_detected_mag, -2.5 * np.log10(6.12) + 25.0
+    )
+
+    status, data = api('DELETE', f'photometry/{ids[2]}', token=upload_data_token)
+    assert status == 200
+
+    summaries = get_summaries()
+    assert summaries['ztfg'].detection_count == 2
+    assert summaries['ztfg'].last_detected_mjd == 58001.0
+    assert summaries['ztfg'].peak_detected_mjd == 58000.0
+
+
+def test_photometry_summary_maintained_for_orm_photometry(
+    public_source, ztf_camera, public_group
+):
+    # e.g., photometry written by fixtures or scripts rather than the API
+    def last_detected_mjd():
+        return max(
+            summary.last_detected_mjd
+            for summary in DBSession()
+            .query(PhotometrySummary)
+            .filter(PhotometrySummary.obj_id == public_source.id)
+        )
+
+    # the photometry of the fixture is summarized
+    last_mjd = last_detected_mjd()
+
+    phot = Photometry(
+        obj_id=public_source.id,
+        instrument_id=ztf_camera.id,
+        mjd=70000.0,
+        flux=100.0,
+        fluxerr=1.0,
+        filter='ztfg',
+        owner_id=1,
+        origin=str(uuid.uuid4()),
+        groups=[public_group],
+    )
+    DBSession().add(phot)
+    DBSession().commit()
+    assert last_detected_mjd() == 70000.0
+
+    DBSession().delete(phot)
+    DBSession().commit()
+    assert last_detected_mjd() == last_mjd
+
 
 def test_user_cannot_delete_unowned_photometry_data(
     upload_data_token, manage_sources_token, public_source, ztf_camera, public_group
@@ -1303,6 +1565,124 @@ def test_token_user_retrieving_source_photometry_and_convert(
     assert np.allclose(magerrlast_ab, magerrlast_vega)
 
 
+def test_photometry_plot_cached_until_photometry_changes(
+    upload_data_token, public_source, ztf_camera, public_group
+):
+    endpoint = f'internal/plot/photometry/{public_source.id}?width=500&height=250'
+    status, data = api('GET', endpoint, token=upload_data_token)
+    assert status == 200
+    assert data['status'] == 'success'
+    first_plot = data['data']['bokehJSON']
+
+    # Bokeh generates new model IDs for every render, so an identical
+    # payload means that the plot came from the cache
+    status, data = api('GET', endpoint, token=upload_data_token)
+    assert status == 200
+    assert data['data']['bokehJSON'] == first_plot
+
+    status, data = api(
+        'POST',
+        'photometry',
+        data={
+            'obj_id': str(public_source.id),
+            'mjd': 58000.0,
+            'instrument_id': ztf_camera.id,
+            'flux': 12.24,
+            'fluxerr': 0.031,
+            'zp': 25.0,
+            'magsys': 'ab',
+            'filter': 'ztfg',
+            'group_ids': [public_group.id],
+        },
+        token=upload_data_token,
+    )
+    assert status == 200
+    assert data['status'] == 'success'
+
+    status, data = api('GET', endpoint, token=upload_data_token)
+    assert status == 200
+    assert data['data']['bokehJSON'] != first_plot
+
+
+def test_token_user_retrieving_source_photometry_as_columns(
+    upload_data_token, public_source, ztf_camera, public_group
+):
+    status, data = api(
+        'POST',
+        'photometry',
+        data={
+            'obj_id': str(public_source.id),
+            'mjd': [58000.0, 58001.0, 58002.0],
+            'instrument_id': ztf_camera.id,
+            'mag': [21.0, None, 20.5],
+            'magerr': [0.1, None, 0.2],
+            'limiting_mag': 22.3,
+            'magsys': 'ab',
+            'filter': 'ztfg',
+            'group_ids': [public_group.id],
+        },
+        token=upload_data_token,
+    )
+    assert status == 200
+    assert data['status'] == 'success'
+
+    expected = {}
+    for format in ['mag', 'flux']:
+        status, data = api(
+            'GET',
+            f'sources/{public_source.id}/photometry?format={format}&magsys=vega',
+            token=upload_data_token,
+        )
+        assert status == 200
+        assert data['status'] == 'success'
+        expected[format] = pd.DataFrame(data['data']).set_index('id').sort_index()
+
+    response = api(
+        'GET',
+        f'sources/{public_source.id}/photometry?format=arrow&magsys=vega',
+        token=upload_data_token,
+        raw_response=True,
+    )
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'application/vnd.apache.arrow.stream'
+    arrow = pa.ipc.open_stream(response.content).read_pandas()
+
+    response = api(
+        'GET',
+        f'sources/{public_source.id}/photometry?format=parquet&magsys=vega',
+        token=upload_data_token,
+        raw_response=True,
+    )
+    assert response.status_code == 200
+    parquet = pd.read_parquet(io.BytesIO(response.content))
+
+    for table in [arrow, parquet]:
+        table = table.set_index('id').sort_index()
+        assert list(table.index) == list(expected['mag'].index)
+        assert (table['magsys'] == 'vega').all()
+        assert (table['filter'] == expected['mag']['filter']).all()
+        for format, columns in [
+            ('mag', ['mjd', 'mag', 'magerr', 'limiting_mag']),
+            ('flux', ['flux', 'fluxerr', 'zp']),
+        ]:
+            for column in columns:
+                np.testing.assert_allclose(
+                    table[column].to_numpy(dtype=float),
+                    expected[format][column].to_numpy(dtype=float),
+                )
+        for group_ids, groups in zip(table['group_ids'], expected['mag']['groups']):
+            assert sorted(group_ids) == sorted(g['id'] for g in groups)
+
+    for format in ['mag', 'arrow', 'parquet']:
+        status, data = api(
+            'GET',
+            f'sources/{public_source.id}/photometry?format={format}&magsys=nope',
+            token=upload_data_token,
+        )
+        assert status == 400
+        assert 'Invalid mag system' in data['message']
+
+
 def test_token_user_retrieve_null_photometry(
     upload_data_token, public_source, ztf_camera, public_group
 ):
@@ -1413,6 +1793,83 @@ def test_token_user_get_range_photometry(
     assert len(data['data']) == 2
 
 
+def test_token_user_get_range_photometry_pages_and_stream(
+    upload_data_token, public_source, public_group, ztf_camera
+):
+    status, data = api(
+        'POST',
+        'photometry',
+        data={
+            'obj_id': str(public_source.id),
+            'mjd': [58000.0, 58000.0, 58500.0, 59000.0, 59500.0],
+            'instrument_id': ztf_camera.id,
+            'flux': 12.24,
+            'fluxerr': 0.031,
+            'zp': 25.0,
+            'magsys': 'ab',
+            'filter': 'ztfg',
+            'group_ids': [public_group.id],
+        },
+        token=upload_data_token,
+    )
+    assert status == 200
+    assert data['status'] == 'success'
+
+    query = {'instrument_ids': [ztf_camera.id]}
+    status, data = api('GET', 'photometry/range', token=upload_data_token, data=query)
+    assert status == 200
+    assert data['status'] == 'success'
+    expected_ids = [p['id'] for p in data['data']]
+    assert len(expected_ids) >= 5
+
+    # walk the pages, including the two points that share an MJD
+    ids = []
+    cursor = None
+    while True:
+        params = {'numPerPage': 2}
+        if cursor is not None:
+            params['cursor'] = cursor
+        status, data = api(
+            'GET',
+            'photometry/range',
+            token=upload_data_token,
+            data=query,
+            params=params,
+        )
+        assert status == 200
+        assert data['status'] == 'success'
+        assert len(data['data']['photometry']) <= 2
+        ids.extend(p['id'] for p in data['data']['photometry'])
+        cursor = data['data']['nextCursor']
+        if cursor is None:
+            break
+    assert ids == expected_ids
+
+    response = api(
+        'GET',
+        'photometry/range',
+        token=upload_data_token,
+        data=query,
+        params={'stream': 'true', 'numPerPage': 3, 'format': 'flux'},
+        raw_response=True,
+    )
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [p['id'] for p in rows] == expected_ids
+    assert all('flux' in p for p in rows)
+
+    status, data = api(
+        'GET',
+        'photometry/range',
+        token=upload_data_token,
+        data=query,
+        params={'cursor': 'not-a-cursor'},
+    )
+    assert status == 400
+    assert 'Invalid cursor' in data['message']
+
+
 def test_reject_photometry_inf(
     upload_data_token, public_source, public_group, ztf_camera
 ):
@@ -5,8 +5,10 @@ import numpy as np
 import arrow
 from tdtax import taxonomy, __version__
 
-from skyportal.tests import api
-from skyportal.models import cosmo
+from skyportal.tests import api, count_sql_statements
+from skyportal.tests.fixtures import ObjFactory
+from skyportal.models import cosmo, AccessContext, DBSession, Filter, Obj, Source
+from skyportal.handlers.api.source import get_sources_info
 
 from datetime import datetime, timezone, timedelta
 from dateutil import parser
@@ -1244,3 +1246,65 @@ def test_sources_filter_by_has_spectrum(
     assert status == 200
     assert len(data["data"]["sources"]) == 1
     assert data["data"]["sources"][0]["id"] == public_source.id
+
+
+def test_source_list_statement_count_independent_of_page_size(user, public_group):
+    objs = [ObjFactory(groups=[public_group]) for _ in range(5)]
+    obj_ids = [obj.id for obj in objs]
+    DBSession().add_all(
+        [Source(obj_id=obj_id, group_id=public_group.id) for obj_id in obj_ids]
+    )
+    DBSession().commit()
+
+    statement_counts = []
+    for page_size in [1, 5]:
+        DBSession().expire_all()
+        page = Obj.query.filter(Obj.id.in_(obj_ids[:page_size])).all()
+        user.accessible_groups  # load outside of the counted block
+        with count_sql_statements(DBSession()) as statements:
+            source_list = get_sources_info(
+                page,
+                user,
+                include_comments=True,
+                include_photometry=True,
+                include_photometry_exists=True,
+                include_spectrum_exists=True,
+            )
+        statement_counts.append(len(statements))
+
+        assert len(source_list) == page_size
+        for source_info in source_list:
+            assert [g["id"] for g in source_info["groups"]] == [public_group.id]
+            assert len(source_info["photometry"]) == 20
+            assert source_info["photometry_exists"]
+            assert source_info["spectrum_exists"]
+
+    assert statement_counts[0] == statement_counts[1]
+
+    for obj in objs:
+        ObjFactory.teardown(obj)
+
+
+def test_access_context_looks_up_ids_once(user, super_admin_user, public_filter):
+    for user_or_token in [user, super_admin_user]:
+        DBSession().expire_all()
+        access = AccessContext(user_or_token)
+        expected_group_ids = sorted(g.id for g in user_or_token.accessible_groups)
+        expected_filter_ids = sorted(
+            f.id for f in Filter.query.filter(Filter.group_id.in_(expected_group_ids))
+        )
+
+        assert sorted(access.group_ids) == expected_group_ids
+        assert sorted(access.filter_ids) == expected_filter_ids
+        assert sorted(access.stream_ids) == sorted(
+            s.id for s in user_or_token.accessible_streams
+        )
+        assert public_filter.id in access.filter_ids
+
+        with count_sql_statements(DBSession()) as statements:
+            access.group_ids
+            access.filter_ids
+            access.stream_ids
+            Obj.get_if_readable_by(str(uuid.uuid4()), access)
+        # only the lookup of the nonexistent Obj hits the database
+        assert len(statements) == 1
@@ -3,6 +3,7 @@ import uuid
 import base64
 from skyportal.tests import api
 from skyportal.models import DBSession, Obj, Thumbnail
+from skyportal.utils.thumbnail_store import VARIANT_FORMATS
 
 
 def test_token_user_post_get_thumbnail(upload_data_token, public_group, ztf_camera):
@@ -264,3 +265,147 @@ def test_cannot_post_thumbnail_invalid_file_type(
     assert status == 400
     assert data['status'] == 'error'
     assert 'cannot identify image file' in data['message']
+
+
+def test_identical_thumbnails_share_file(upload_data_token, public_group):
+    data = base64.b64encode(
+        open(os.path.abspath('skyportal/tests/data/14gqr_new.png'), 'rb').read()
+    )
+    public_urls = []
+    for _ in range(2):
+        obj_id = str(uuid.uuid4())
+        status, _ = api(
+            'POST',
+            'sources',
+            data={
+                'id': obj_id,
+                'ra': 234.22,
+                'dec': -22.33,
+                'group_ids': [public_group.id],
+            },
+            token=upload_data_token,
+        )
+        assert status == 200
+
+        status, response = api(
+            'POST',
+            'thumbnail',
+            data={'obj_id': obj_id, 'data': data, 'ttype': 'new'},
+            token=upload_data_token,
+        )
+        assert status == 200
+        public_urls.append(
+            DBSession.query(Thumbnail).get(response['data']['id']).public_url
+        )
+
+    assert public_urls[0] == public_urls[1]
+    digest = os.path.splitext(os.path.basename(public_urls[0]))[0]
+
+    for extension in VARIANT_FORMATS:
+        response = api(
+            'GET',
+            f'thumbnail/image/{digest}.{extension}',
+            params={'size': 32},
+            token=upload_data_token,
+            raw_response=True,
+        )
+        assert response.status_code == 200
+        assert response.headers['Content-Type'] == f'image/{extension}'
+
+        status, _ = api(
+            'GET', f'thumbnail/image/{"0" * 64}.{extension}', token=upload_data_token
+        )
+        assert status == 404
+
+    # formats that the server cannot write, e.g., WebP if Pillow was built
+    # without it, are rejected; the frontend then falls back to the PNG file
+    for extension in {'gif', 'webp'} - set(VARIANT_FORMATS):
+        status, data = api(
+            'GET', f'thumbnail/image/{digest}.{extension}', token=upload_data_token
+        )
+        assert status == 400
+        assert 'Unsupported thumbnail format' in data['message']
+
+
+def test_post_thumbnails_in_bulk(upload_data_token, public_group):
+    obj_ids = []
+    for _ in range(2):
+        obj_id = str(uuid.uuid4())
+        status, _ = api(
+            'POST',
+            'sources',
+            data={
+                'id': obj_id,
+                'ra': 234.22,
+                'dec': -22.33,
+                'group_ids': [public_group.id],
+            },
+            token=upload_data_token,
+        )
+        assert status == 200
+        obj_ids.append(obj_id)
+
+    data = base64.b64encode(
+        open(os.path.abspath('skyportal/tests/data/14gqr_new.png'), 'rb').read()
+    )
+    thumbnails = [
+        {'obj_id': obj_id, 'data': data, 'ttype': ttype}
+        for obj_id in obj_ids
+        for ttype in ['new', 'ref', 'sub']
+    ]
+    status, response = api(
+        'POST',
+        'thumbnail/bulk',
+        data={'thumbnails': thumbnails},
+        token=upload_data_token,
+    )
+    assert status == 200
+    assert response['status'] == 'success'
+    ids = response['data']['ids']
+    assert len(ids) == 6
+
+    for thumbnail_id, thumbnail in zip(ids, thumbnails):
+        status, response = api(
+            'GET', f'thumbnail/{thumbnail_id}', token=upload_data_token
+        )
+        assert status == 200
+        assert response['data']['obj_id'] == thumbnail['obj_id']
+        assert response['data']['type'] == thumbnail['ttype']
+
+    # nothing is created if any thumbnail is invalid
+    invalid_obj_id = str(uuid.uuid4())
+    status, response = api(
+        'POST',
+        'thumbnail/bulk',
+        data={
+            'thumbnails': [
+                {'obj_id': obj_ids[0], 'data': data, 'ttype': 'new'},
+                {'obj_id': invalid_obj_id, 'data': data, 'ttype': 'new'},
+            ]
+        },
+        token=upload_data_token,
+    )
+    assert status == 400
+    assert invalid_obj_id in response['message']
+
+    status, response = api(
+        'POST',
+        'thumbnail/bulk',
+        data={
+            'thumbnails': [
+                {'obj_id': obj_ids[0], 'data': data, 'ttype': 'new'},
+                {
+                    'obj_id': obj_ids[0],
+                    'data': base64.b64encode(os.urandom(2048)),
+                    'ttype': 'new',
+                },
+            ]
+        },
+        token=upload_data_token,
+    )
+    assert status == 400
+    assert 'thumbnail 1' in response['message']
+
+    assert (
+        DBSession.query(Thumbnail).filter(Thumbnail.obj_id == obj_ids[0]).count() == 3
+    )
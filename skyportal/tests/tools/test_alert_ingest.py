@@ -0,0 +1,82 @@
+import os
+import uuid
+
+import pytest
+
+from baselayer.app.custom_exceptions import AccessError
+from skyportal.alert_ingest import AlertIngester, alert_photometry, read_alerts
+from skyportal.models import DBSession, Candidate, Photometry, Thumbnail
+
+
+def test_ingest_alerts(public_filter, public_group, ztf_camera, user):
+    data_dir = os.path.abspath('skyportal/tests/data')
+    alerts = list(
+        read_alerts(
+            [
+                os.path.join(data_dir, '541234765015015012.avro'),
+                os.path.join(data_dir, 'avro_files'),
+            ]
+        )
+    )
+    assert len(alerts) == 3
+    suffix = uuid.uuid4().hex
+    for alert in alerts:
+        alert['objectId'] = f"{alert['objectId']}_{suffix}"
+    obj_ids = [alert['objectId'] for alert in alerts]
+    n_photometry = {alert['objectId']: len(alert_photometry(alert)) for alert in alerts}
+
+    ingester = AlertIngester(public_filter, ztf_camera, user)
+    counts = ingester.ingest(alerts)
+    DBSession().commit()
+    assert counts == {
+        'alerts': 3,
+        'objs': 3,
+        'candidates': 3,
+        'photometry': sum(n_photometry.values()),
+        'thumbnails': 15,
+    }
+
+    for alert in alerts:
+        obj_id = alert['objectId']
+        candidate = (
+            DBSession()
+            .query(Candidate)
+            .filter(Candidate.obj_id == obj_id)
+            .filter(Candidate.filter_id == public_filter.id)
+            .one()
+        )
+        assert candidate.passing_alert_id == alert['candid']
+
+        photometry = Photometry.query.filter(Photometry.obj_id == obj_id).all()
+        assert len(photometry) == n_photometry[obj_id]
+        assert all(public_group in p.groups for p in photometry)
+
+        thumbnails = Thumbnail.query.filter(Thumbnail.obj_id == obj_id).all()
+        assert sorted(t.type for t in thumbnails) == [
+            'dr8',
+            'new',
+            'ref',
+            'sdss',
+            'sub',
+        ]
+
+    # ingesting the same alerts again only replaces the cutout thumbnails
+    counts = ingester.ingest(alerts)
+    DBSession().commit()
+    assert counts['objs'] == 0
+    assert counts['candidates'] == 0
+    assert counts['thumbnails'] == 9
+    assert Photometry.query.filter(Photometry.obj_id.in_(obj_ids)).count() == sum(
+        n_photometry.values()
+    )
+    assert Thumbnail.query.filter(Thumbnail.obj_id.in_(obj_ids)).count() == 15
+
+
+def test_ingest_alerts_to_inaccessible_groups(
+    public_filter, public_group2, ztf_camera, user
+):
+    with pytest.raises(AccessError, match=f'Groups {public_group2.id} '):
+        AlertIngester(public_filter, ztf_camera, user, group_ids=[public_group2.id])
+
+    with pytest.raises(AccessError, match='Groups -1 '):
+        AlertIngester(public_filter, ztf_camera, user, group_ids=[-1])
@@ -1,9 +1,11 @@
+import io
 import uuid
 
 import pytest
 import numpy as np
 import numpy.testing as npt
 import requests
+from astropy.io import fits
 from requests.exceptions import HTTPError, Timeout, ConnectionError
 
 from skyportal.tests import api
@@ -11,9 +13,13 @@ from skyportal.utils import (
     get_nearby_offset_stars,
     get_finding_chart,
     get_ztfref_url,
+    POSITION_COLUMNS,
     _calculate_best_position_for_offset_stars,
+    _calculate_best_position_from_columns,
 )
-from skyportal.utils.offset import irsa
+from skyportal.utils import offset
+from skyportal.utils.cache import Cache
+from skyportal.utils.offset import irsa, open_cached_fits
 from skyportal.models import Photometry
 
 
@@ -26,6 +32,58 @@ def test_calculate_best_position_no_photometry():
     npt.assert_almost_equal(dec, -20)
 
 
+def test_calculate_best_position_from_columns():
+    ra, dec = 10.5, -20.8
+    n_phot = 50
+    rng = np.random.default_rng(0)
+    flux = rng.uniform(10, 100, n_phot)
+    flux[:5] = np.nan
+    photometry = [
+        Photometry(
+            flux=f,
+            fluxerr=rng.uniform(0.1, 1),
+            ra=ra + np.cos(np.radians(dec)) * rng.normal() / (10 * 3600),
+            dec=dec + rng.normal() / (10 * 3600),
+            ra_unc=0.2,
+            dec_unc=rng.uniform(0.1, 0.3),
+        )
+        for f in flux
+    ]
+    columns = {
+        column: np.array([getattr(p, column) for p in photometry], dtype=float)
+        for column in POSITION_COLUMNS
+    }
+
+    for how in ['snr2', 'invvar']:
+        npt.assert_almost_equal(
+            _calculate_best_position_from_columns(columns, fallback=(ra, dec), how=how),
+            _calculate_best_position_for_offset_stars(
+                photometry, fallback=(ra, dec), how=how
+            ),
+            decimal=12,
+        )
+
+    # points without positions are ignored
+    columns['ra'][:10] = np.nan
+    columns['dec'][:10] = np.nan
+    ra_calc, dec_calc = _calculate_best_position_from_columns(
+        columns, fallback=(ra, dec)
+    )
+    assert np.isfinite([ra_calc, dec_calc]).all()
+
+    # no photometry, or no photometry with positions
+    empty = {column: np.array([]) for column in POSITION_COLUMNS}
+    assert _calculate_best_position_from_columns(empty, fallback=(ra, dec)) == (
+        ra,
+        dec,
+    )
+    columns['ra'][:] = np.nan
+    assert _calculate_best_position_from_columns(columns, fallback=(ra, dec)) == (
+        ra,
+        dec,
+    )
+
+
 @pytest.mark.flaky(reruns=2)
 def test_calculate_position_with_evil_inputs(
     upload_data_token, view_only_token, ztf_camera, public_group
@@ -198,6 +256,63 @@ except (HTTPError, TimeoutError, ConnectionError) as e:
 
 
 @pytest.mark.skipif(not run_ztfref_test, reason='IRSA server down')
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+    def iter_content(self, chunk_size):
+        buf = io.BytesIO(self.content)
+        return iter(lambda: buf.read(chunk_size), b'')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+@pytest.fixture()
+def fits_url(monkeypatch):
+    buf = io.BytesIO()
+    fits.PrimaryHDU(np.arange(100.0).reshape(10, 10)).writeto(buf)
+    content = buf.getvalue()
+    monkeypatch.setattr(
+        offset, 'get_url', lambda *args, **kwargs: FakeResponse(content)
+    )
+    return 'https://example.org/image.fits'
+
+
+def test_open_cached_fits(tmpdir, fits_url):
+    cache = Cache(tmpdir / 'cache', max_items=10)
+    with open_cached_fits(fits_url, cache, 'image') as hdul:
+        assert hdul[0].data[1, 0] == 10.0
+    assert cache['image'] is not None
+
+
+def test_open_cached_fits_too_large_for_cache(tmpdir, fits_url):
+    cache = Cache(tmpdir / 'cache', max_items=10, max_bytes=100)
+    with open_cached_fits(fits_url, cache, 'image') as hdul:
+        assert hdul[0].data[1, 0] == 10.0
+    assert cache['image'] is None
+
+
+def test_open_cached_fits_evicted(tmpdir, fits_url):
+    class EvictingCache(Cache):
+        def __getitem__(self, name):
+            # evicted by another process right after the lookup
+            cache_file = super().__getitem__(name)
+            if cache_file is not None:
+                cache_file.unlink()
+            return cache_file
+
+    cache = EvictingCache(tmpdir / 'cache', max_items=10)
+    cache['image'] = b'not a FITS file'
+    with open_cached_fits(fits_url, cache, 'image') as hdul:
+        assert hdul[0].data[1, 0] == 10.0
+
+
 def test_get_ztfref_url():
     url = get_ztfref_url(123.0, 33.3, 2)
 
@@ -0,0 +1,90 @@
+import uuid
+
+import numpy as np
+
+from skyportal.models import (
+    DBSession,
+    Candidate,
+    Comment,
+    Obj,
+    Photometry,
+    PhotometrySummary,
+    Source,
+    Spectrum,
+)
+from skyportal.synthetic_data import DatasetGenerator
+
+
+def test_generate_dataset(public_group, public_filter, ztf_camera, sedm, user):
+    id_prefix = f'synth_{uuid.uuid4().hex}_'
+    generator = DatasetGenerator(
+        user,
+        [public_group],
+        [public_filter],
+        [ztf_camera, sedm],
+        seed=42,
+        id_prefix=id_prefix,
+        photometry_per_obj=20,
+        candidate_fraction=1.0,
+        source_fraction=0.5,
+        spectrum_fraction=0.5,
+        comments_per_obj=1.0,
+        spectrum_points=50,
+    )
+    counts = generator.generate(0, 20)
+    DBSession().commit()
+
+    obj_ids = [f'{id_prefix}{i:09d}' for i in range(20)]
+    assert DBSession().query(Obj).filter(Obj.id.in_(obj_ids)).count() == 20
+    assert counts['objs'] == 20
+    assert counts['candidates'] == 20
+    for model, table in [
+        (Candidate, 'candidates'),
+        (Source, 'sources'),
+        (Photometry, 'photometry'),
+        (Spectrum, 'spectra'),
+        (Comment, 'comments'),
+    ]:
+        query = DBSession().query(model).filter(model.obj_id.in_(obj_ids))
+        assert query.count() == counts[table]
+
+    # all the data is shared with the only group
+    assert counts['group_photometry'] == counts['photometry']
+    assert counts['group_spectra'] == counts['spectra']
+    assert counts['group_comments'] == counts['comments']
+    photometry = Photometry.query.filter(Photometry.obj_id.in_(obj_ids)).all()
+    assert all(p.groups == [public_group] for p in photometry)
+    filters = {ztf_camera.id: ztf_camera.filters, sedm.id: sedm.filters}
+    assert all(p.filter in filters[p.instrument_id] for p in photometry)
+    spectrum = Spectrum.query.filter(Spectrum.obj_id.in_(obj_ids)).first()
+    assert spectrum.instrument_id == sedm.id
+    assert len(spectrum.wavelengths) == len(spectrum.fluxes) == 50
+
+    obj = DBSession().query(Obj).get(obj_ids[0])
+    detected = [p for p in obj.photometry if p.snr is not None and p.snr > 3]
+    assert obj.detect_photometry_count == len(detected)
+    if len(detected) > 0:
+        assert (
+            DBSession()
+            .query(PhotometrySummary)
+            .filter(PhotometrySummary.obj_id == obj.id)
+            .count()
+            > 0
+        )
+
+    # the data only depends on the seed and the range of Objs
+    generator.id_prefix = f'synth_{uuid.uuid4().hex}_'
+    assert generator.generate(0, 20) == counts
+    DBSession().commit()
+    mjds = [
+        np.array(
+            [
+                p.mjd
+                for p in Photometry.query.filter(Photometry.obj_id == obj_id).order_by(
+                    Photometry.mjd
+                )
+            ]
+        )
+        for obj_id in [obj_ids[0], f'{generator.id_prefix}{0:09d}']
+    ]
+    np.testing.assert_allclose(mjds[0], mjds[1])
@@ -0,0 +1,41 @@
+from skyportal.utils.access_cache import AccessCache
+
+
+def test_access_cache_set_and_invalidate(tmp_path):
+    cache = AccessCache(tmp_path / 'access.sqlite')
+    version = cache.version(1)
+    cache.set('user:1', 1, {'group_ids': [1]}, version)
+    assert cache.get('user:1') == {'group_ids': [1]}
+
+    cache.invalidate_users([1])
+    assert cache.get('user:1') is None
+
+
+def test_access_cache_discards_values_computed_before_invalidation(tmp_path):
+    cache = AccessCache(tmp_path / 'access.sqlite')
+    # e.g., another app process committing a membership change
+    other_cache = AccessCache(tmp_path / 'access.sqlite')
+
+    version = cache.version(1)
+    other_cache.invalidate_users([1])
+    cache.set('user:1', 1, {'group_ids': [1]}, version)
+    assert cache.get('user:1') is None
+
+    version = cache.version(2)
+    other_cache.clear()
+    cache.set('user:2', 2, {'group_ids': [1]}, version)
+    assert cache.get('user:2') is None
+
+    # the entries of other users are still stored
+    version = cache.version(2)
+    other_cache.invalidate_users([1])
+    cache.set('user:2', 2, {'group_ids': [1]}, version)
+    assert cache.get('user:2') == {'group_ids': [1]}
+
+
+def test_access_cache_created_lazily(tmp_path):
+    cache = AccessCache(tmp_path / 'access.sqlite')
+    cache.invalidate_users([1])
+    cache.clear()
+    assert cache.get('user:1') is None
+    assert not (tmp_path / 'access.sqlite').exists()
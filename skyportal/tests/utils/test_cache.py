@@ -71,3 +71,98 @@ def test_cache_reference_refresh(cache):
 
 def test_cache_nested_root(cache_parent_dir):
     Cache(cache_parent_dir / 'some/deeper/path', 1)
+
+
+def test_cache_max_bytes(cache_parent_dir):
+    cache = Cache(cache_parent_dir / 'max_bytes', max_items=10, max_bytes=10)
+    for i in range(5):
+        cache[str(i)] = b'abcd'
+
+    assert len(cache) == 2
+    assert cache['3'] is not None
+    assert cache['4'] is not None
+    assert cache['2'] is None
+
+
+def test_cache_stats(cache):
+    cache['0'] = b'abc'
+    cache['0']
+    cache['1']
+    for i in range(1, 4):
+        cache[str(i)] = b'x'
+
+    assert cache.stats() == {
+        'items': 3,
+        'bytes': 3,
+        'hits': 1,
+        'misses': 1,
+        'evictions': 1,
+    }
+
+
+def test_cache_shared_between_instances(cache):
+    cache['some_key'] = b'abc'
+
+    other_cache = Cache(cache._cache_dir, max_items=3)
+    assert other_cache['some_key'].read_bytes() == b'abc'
+    assert len(other_cache) == 1
+
+    # no temporary files are left behind
+    assert [f for f in os.listdir(cache._cache_dir) if f.startswith('.tmp')] == []
+
+
+def test_cache_file_removed_externally(cache):
+    cache['some_key'] = b'abc'
+    os.remove(cache['some_key'])
+
+    assert cache['some_key'] is None
+    assert len(cache) == 0
+
+
+def test_cache_write_chunks(cache):
+    fn = cache.write('some_key', (bytes([i]) * 10 for i in range(3)))
+    assert fn == cache['some_key']
+    assert fn.read_bytes() == b'\x00' * 10 + b'\x01' * 10 + b'\x02' * 10
+    assert cache.stats()['bytes'] == 30
+
+    del cache['some_key']
+    assert cache['some_key'] is None
+    assert not fn.exists()
+
+
+def test_cache_write_interrupted(cache):
+    def chunks():
+        yield b'abc'
+        raise IOError('connection lost')
+
+    with pytest.raises(IOError):
+        cache.write('some_key', chunks())
+
+    assert cache['some_key'] is None
+    assert len(cache) == 0
+    assert [f for f in os.listdir(cache._cache_dir) if f.startswith('.tmp')] == []
+
+
+def test_cache_write_larger_than_max_bytes(cache_parent_dir):
+    cache = Cache(cache_parent_dir / 'oversize', max_items=10, max_bytes=10)
+    cache['small'] = b'abcd'
+
+    assert cache.write('large', [b'x' * 11]) is None
+    assert cache['large'] is None
+    # the entries already in the cache are kept
+    assert cache['small'] is not None
+    assert cache.stats()['evictions'] == 0
+    assert [f for f in os.listdir(cache._cache_dir) if f.startswith('.tmp')] == []
+
+
+def test_cache_write_keeps_new_entry(cache_parent_dir):
+    cache = Cache(cache_parent_dir / 'keep_new', max_items=1)
+    cache['0'] = b'abc'
+    # make the existing entry the most recently used
+    cache['0']
+
+    fn = cache.write('1', [b'def'])
+    assert fn.exists()
+    assert cache['1'] == fn
+    assert cache['0'] is None
+    assert len(cache) == 1
@@ -0,0 +1,143 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+import time
+
+import pytest
+
+from skyportal.utils.catalog_client import CatalogClient
+
+
+class StubCatalogHandler(BaseHTTPRequestHandler):
+    """Answers every GET with the requested path, after a short delay, and
+    records the connections and the number of concurrent requests."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.ports.add(self.client_address[1])
+            server.running += 1
+            server.max_running = max(server.max_running, server.running)
+        time.sleep(0.1)
+        with server.lock:
+            server.running -= 1
+
+        status = 404 if self.path == '/missing' else 200
+        body = self.path.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubCatalogHandler)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.ports = set()
+    server.running = 0
+    server.max_running = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server, path):
+    return f'http://127.0.0.1:{server.server_address[1]}{path}'
+
+
+def test_catalog_client_reuses_connections(stub_server):
+    client = CatalogClient(max_workers=2, max_connections_per_host=2)
+    for i in range(5):
+        response = client.get(url(stub_server, f'/image/{i}'))
+        assert response.status_code == 200
+        assert response.content == f'/image/{i}'.encode('utf-8')
+
+    assert stub_server.requests == 5
+    assert len(stub_server.ports) == 1
+
+
+def test_catalog_client_error_and_unreachable(stub_server):
+    client = CatalogClient()
+    assert client.get(url(stub_server, '/missing')).status_code == 404
+    assert client.get('http://127.0.0.1:1/unreachable', timeout=1) is None
+
+
+def test_catalog_client_limits_connections_per_host(stub_server):
+    client = CatalogClient(max_workers=8, max_connections_per_host=2)
+
+    def get(i):
+        return client.get(url(stub_server, f'/image/{i}')).content
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        contents = list(executor.map(get, range(8)))
+
+    assert contents == [f'/image/{i}'.encode('utf-8') for i in range(8)]
+    assert stub_server.max_running == 2
+
+    running = []
+
+    def query(i):
+        with client.host_limit('https://tap.example.org/tap'):
+            running.append(1)
+            n_running = len(running)
+            time.sleep(0.05)
+            running.pop()
+        return n_running
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert max(executor.map(query, range(8))) <= 2
+
+
+def test_catalog_client_coalesces_identical_queries(stub_server):
+    client = CatalogClient(max_workers=8)
+
+    def query(path):
+        return client.coalesce(path, lambda: client.get(url(stub_server, path)).content)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        contents = list(executor.map(query, ['/catalog'] * 4 + ['/other'] * 4))
+
+    assert contents == [b'/catalog'] * 4 + [b'/other'] * 4
+    assert stub_server.requests == 2
+
+    # failures are raised in all waiting calls, and not remembered
+    def fail():
+        time.sleep(0.1)
+        raise ValueError('query failed')
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(client.coalesce, 'key', fail) for _ in range(2)]
+    for future in futures:
+        with pytest.raises(ValueError):
+            future.result()
+    assert client.coalesce('key', lambda: 'result') == 'result'
+
+
+def test_catalog_client_runs_in_pool(stub_server):
+    client = CatalogClient(max_workers=1)
+    threads = set()
+
+    def query(path):
+        threads.add(threading.current_thread().name)
+        return client.get(url(stub_server, path)).content
+
+    async def run_queries():
+        return [
+            await client.run(query, '/catalog'),
+            await client.run(query, path='/other'),
+        ]
+
+    assert asyncio.run(run_queries()) == [b'/catalog', b'/other']
+    assert len(threads) == 1
+    assert threads.pop().startswith('catalog-client')
@@ -0,0 +1,60 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+from astropy import units as u
+from astropy.coordinates import SkyCoord
+
+from skyportal.utils.catalog_tiles import (
+    CatalogTiles,
+    gaia_source_id_range,
+    tile_grid,
+    tiles_in_cone,
+    tiles_of,
+)
+
+
+@pytest.fixture()
+def tiles(tmpdir):
+    tiles = CatalogTiles('test_catalog', cache_dir=tmpdir, max_items=10)
+    yield tiles
+    shutil.rmtree(str(tmpdir))
+
+
+def test_tiles_in_cone_cover_cone():
+    rng = np.random.default_rng(0)
+    for ra, dec in [(123.0, 33.3), (0.0, 0.0), (359.99, -45.0), (10.0, 89.99)]:
+        radius = 3 / 60.0
+        center = SkyCoord(ra, dec, unit=(u.deg, u.deg))
+        points = center.directional_offset_by(
+            rng.uniform(0, 360, 1000) * u.deg, rng.uniform(0, radius, 1000) * u.deg
+        )
+        assert set(tiles_of(points.ra.deg, points.dec.deg)) <= set(
+            tiles_in_cone(ra, dec, radius)
+        )
+
+
+def test_gaia_source_id_range():
+    # Gaia source IDs start with the order-12 nested HEALPix index
+    level12 = 4 ** (12 - 8)
+    pixel = tiles_of([123.0], [33.3])[0]
+    first_id, last_id = gaia_source_id_range(pixel)
+    assert first_id == pixel * level12 * 2 ** 35
+    assert last_id + 1 == gaia_source_id_range(pixel + 1)[0]
+    last_id = gaia_source_id_range(tile_grid.npix - 1)[1]
+    assert last_id + 1 == tile_grid.npix * level12 * 2 ** 35
+
+
+def test_catalog_tiles_save_load(tiles):
+    rows = pd.DataFrame({'ra': [123.0, 123.01], 'dec': [33.3, 33.31]})
+    tiles.save(1, rows)
+    tiles.save(2, rows.iloc[:0])
+    tiles.save(3, None)
+
+    assert tiles.missing([1, 2, 3, 4]) == [4]
+    pd.testing.assert_frame_equal(tiles.load([1, 2]), rows)
+
+    # incomplete and missing tiles cannot be loaded
+    assert tiles.load([1, 3]) is None
+    assert tiles.load([1, 4]) is None
@@ -0,0 +1,75 @@
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from skyportal.utils.thumbnail_store import ThumbnailStore, VARIANTS_DIR
+
+
+@pytest.fixture()
+def store(tmp_path):
+    yield ThumbnailStore(tmp_path / 'thumbnails', '/static/thumbnails/')
+
+
+@pytest.fixture(scope="module")
+def png_data():
+    with open(os.path.abspath('skyportal/tests/data/14gqr_new.png'), 'rb') as f:
+        yield f.read()
+
+
+def test_thumbnails_are_stored_by_digest(store, png_data):
+    digest = store.put(png_data)
+    assert store.put(png_data) == digest
+    store.flush()
+
+    path = store.path(digest)
+    assert path == store.root / digest[:2] / digest[2:4] / f'{digest}.png'
+    assert path.read_bytes() == png_data
+    assert store.url(digest) == (
+        f'/static/thumbnails/{digest[:2]}/{digest[2:4]}/{digest}.png'
+    )
+    assert store.digest_of(str(path)) == digest
+    assert store.digest_of(store.root / 'ZTF20aaaaaaa_new.png') is None
+
+    # no temporary files are left behind
+    assert os.listdir(path.parent) == [path.name]
+
+
+def test_thumbnail_variants(store, png_data):
+    digest = store.put(png_data)
+    assert store.variant('0' * 64, 'webp', 64) is None
+
+    data = store.variant(digest, 'webp', 32)
+    image = Image.open(io.BytesIO(data))
+    assert image.format == 'WEBP'
+    assert max(image.size) == 32
+
+    # variants are stored, and images are not enlarged
+    assert store.variant(digest, 'webp', 32) == data
+    full_size = Image.open(io.BytesIO(store.variant(digest, 'png', 500)))
+    assert full_size.size == Image.open(io.BytesIO(png_data)).size
+
+    with pytest.raises(ValueError):
+        store.variant(digest, 'gif')
+
+
+def test_collect_thumbnail_garbage(store, png_data):
+    kept = store.put(png_data)
+    removed = store.put(png_data + b'\0')
+    store.flush()
+    store.variant(kept, 'webp', 32)
+    store.variant(removed, 'webp', 32)
+
+    # recent files may belong to uploads in progress
+    assert store.collect_garbage({kept}) == 0
+
+    past = time.time() - 7200
+    for path in store.root.rglob('*'):
+        os.utime(path, (past, past))
+    assert store.collect_garbage({kept}) == 2
+    assert store.path(kept).exists()
+    assert not store.path(removed).exists()
+    variants = os.listdir(store.root / VARIANTS_DIR / kept[:2] / kept[2:4])
+    assert variants == [f'{kept}_32.webp']
@@ -1,8 +1,13 @@
 from .offset import (
+    catalog_client,
     facility_parameters,
     get_nearby_offset_stars,
     source_image_parameters,
     get_finding_chart,
+    get_finding_chart_pool,
+    prefetch_finding_chart_data,
     get_ztfref_url,
+    POSITION_COLUMNS,
     _calculate_best_position_for_offset_stars,
+    _calculate_best_position_from_columns,
 )
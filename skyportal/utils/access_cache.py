@@ -0,0 +1,241 @@
+from contextlib import closing
+from pathlib import Path
+import json
+import os
+import sqlite3
+import time
+
+from baselayer.log import make_log
+
+log = make_log('access_cache')
+
+# Seconds between writes of the hit and miss counters of a process to the
+# shared database
+STATS_FLUSH_INTERVAL = 10
+
+# Version of the entries of a User: the sum of the number of invalidations of
+# the User and of the number of times the whole cache was cleared, counted
+# under the reserved user ID 0
+VERSION_QUERY = (
+    '(SELECT coalesce(sum(version), 0) FROM versions WHERE user_id IN (?, 0))'
+)
+
+
+class AccessCache:
+    def __init__(self, path, ttl=60):
+        """A TTL-bounded store, shared by all app processes through a SQLite
+        database, of the permissions and accessible Group and Stream IDs of
+        Users and Tokens.
+
+        Each entry is tagged with the ID of the User it belongs to (the
+        creator, for Tokens), so that all the entries of a User can be
+        invalidated at once when their roles, ACLs, Groups or Streams change.
+        Every invalidation also changes the version of the entries of the
+        User, so that a value computed before the invalidation, and stored
+        after it, is discarded (see `version`).
+
+        The database is only created when the first entry is computed, so
+        that processes that merely invalidate entries, e.g., scripts
+        changing Group memberships, do not leave one behind.
+
+        Parameters
+        ----------
+        path : Path or str
+            Path to the SQLite database. Its directory will be created if
+            necessary.
+        ttl : float, optional
+            Number of seconds during which an entry is served. Set to 0 to
+            disable the cache.
+        """
+        self._path = Path(path)
+        self._ttl = ttl
+        self._hits = 0
+        self._misses = 0
+        self._last_flush = time.time()
+        self._created = False
+
+    def _create(self):
+        if self._created:
+            return
+
+        if not self._path.parent.is_dir():
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, user_id INTEGER, value TEXT, expires REAL)'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS entries_user_id ON entries (user_id)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS versions ('
+                'user_id INTEGER PRIMARY KEY, version INTEGER)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS stats ('
+                'pid INTEGER PRIMARY KEY, hits INTEGER, misses INTEGER)'
+            )
+        self._created = True
+
+    @property
+    def _exists(self):
+        return self._created or self._path.exists()
+
+    def _connect(self):
+        # Connections are not reused, so that they are never shared by the
+        # processes forked after the cache is created
+        return closing(sqlite3.connect(self._path, timeout=5, isolation_level=None))
+
+    @property
+    def enabled(self):
+        return self._ttl != 0
+
+    def get(self, key):
+        """Return the unexpired value stored under `key`, or None.
+
+        Parameters
+        ----------
+        key : str
+        """
+        if not self.enabled:
+            return None
+
+        row = None
+        if self._exists:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT value FROM entries WHERE key = ? AND expires > ?',
+                    (key, time.time()),
+                ).fetchone()
+
+        if row is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        if time.time() - self._last_flush > STATS_FLUSH_INTERVAL:
+            self.flush_stats()
+
+        return None if row is None else json.loads(row[0])
+
+    def version(self, user_id):
+        """Return the version of the entries of a User, to be read before
+        computing a value to `set`.
+
+        Parameters
+        ----------
+        user_id : int
+        """
+        if not self.enabled:
+            return None
+
+        # an invalidation skipped because the database did not exist yet
+        # happened before this call, and thus before the value is computed
+        self._create()
+        with self._connect() as conn:
+            (version,) = conn.execute(f'SELECT {VERSION_QUERY}', (user_id,)).fetchone()
+        return version
+
+    def set(self, key, user_id, value, version):
+        """Store `value` under `key` for the next `ttl` seconds, unless the
+        entries of the User were invalidated since `version` was read.
+
+        Parameters
+        ----------
+        key : str
+        user_id : int
+            ID of the User the entry belongs to.
+        value : dict
+            JSON-serializable value.
+        version : int
+            Version of the entries of the User, as returned by `version`
+            before `value` was computed.
+        """
+        if not self.enabled:
+            return
+
+        self._create()
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('DELETE FROM entries WHERE expires <= ?', (now,))
+            conn.execute(
+                'INSERT OR REPLACE INTO entries '
+                f'SELECT ?, ?, ?, ? WHERE {VERSION_QUERY} = ?',
+                (key, user_id, json.dumps(value), now + self._ttl, user_id, version),
+            )
+
+    def invalidate_users(self, user_ids):
+        """Remove the entries of Users and of the Tokens they created.
+
+        Parameters
+        ----------
+        user_ids : iterable of int
+        """
+        user_ids = list(user_ids)
+        if not self.enabled or not self._exists or len(user_ids) == 0:
+            return
+
+        self._create()
+        with self._connect() as conn:
+            # change the versions first, so that entries being computed are
+            # not stored after the removal
+            conn.executemany(
+                'INSERT INTO versions VALUES (?, 1) ON CONFLICT (user_id) '
+                'DO UPDATE SET version = version + 1',
+                [(id,) for id in user_ids],
+            )
+            conn.executemany(
+                'DELETE FROM entries WHERE user_id = ?', [(id,) for id in user_ids]
+            )
+        log(f'invalidated entries of users {user_ids}')
+
+    def clear(self):
+        """Remove all entries, e.g., after changes that affect the Groups or
+        Streams accessible to System Admins."""
+        if not self.enabled or not self._exists:
+            return
+
+        self._create()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO versions VALUES (0, 1) ON CONFLICT (user_id) '
+                'DO UPDATE SET version = version + 1'
+            )
+            conn.execute('DELETE FROM entries')
+        log('cleared')
+
+    def flush_stats(self):
+        """Add the hits and misses of this process since the last flush to
+        the shared counters."""
+        if not self.enabled or not self._exists:
+            return
+
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO stats VALUES (?, ?, ?) ON CONFLICT (pid) DO UPDATE '
+                'SET hits = hits + excluded.hits, misses = misses + excluded.misses',
+                (os.getpid(), self._hits, self._misses),
+            )
+        self._hits = 0
+        self._misses = 0
+        self._last_flush = time.time()
+
+    def stats(self):
+        """Return the hits and misses of all processes, and the number of
+        unexpired entries."""
+        if not self.enabled:
+            return {'enabled': False, 'hits': 0, 'misses': 0, 'entries': 0}
+
+        self.flush_stats()
+        if not self._exists:
+            return {'enabled': True, 'hits': 0, 'misses': 0, 'entries': 0}
+        with self._connect() as conn:
+            hits, misses = conn.execute(
+                'SELECT coalesce(sum(hits), 0), coalesce(sum(misses), 0) FROM stats'
+            ).fetchone()
+            (entries,) = conn.execute(
+                'SELECT count(*) FROM entries WHERE expires > ?', (time.time(),)
+            ).fetchone()
+        return {'enabled': True, 'hits': hits, 'misses': misses, 'entries': entries}
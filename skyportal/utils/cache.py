@@ -1,21 +1,38 @@
+from contextlib import closing, contextmanager
 from pathlib import Path
 import hashlib
 import os
+import sqlite3
+import tempfile
 
 from baselayer.log import make_log
 
 log = make_log('cache')
 
+INDEX_NAME = 'index.sqlite'
+TEMP_PREFIX = '.tmp-'
+
 
 class Cache:
-    def __init__(self, cache_dir, max_items=10):
+    def __init__(self, cache_dir, max_items=10, max_bytes=None):
         """
+        A least-recently-used cache of files, shared by all processes using
+        the same directory.
+
+        Entries are listed in an SQLite index in the cache directory, so that
+        looking up, inserting and evicting an entry does not require listing
+        the directory. Files are written to a temporary file first and then
+        renamed, so that other processes never read a partially written file.
+
         Parameters
         ----------
         cache_dir : Path or str
             Path to cache.  Will be created if necessary.
         max_items : int, optional
             Maximum number of items ever held in the cache.
+        max_bytes : int, optional
+            Maximum total size of the items held in the cache. Unlimited by
+            default.
         """
         cache_dir = Path(cache_dir)
         if not cache_dir.is_dir():
@@ -23,6 +40,71 @@ class Cache:
 
         self._cache_dir = Path(cache_dir)
         self._max_items = max_items
+        self._max_bytes = max_bytes
+        self._index = self._cache_dir / INDEX_NAME
+
+        with self._connect() as conn:
+            # let readers and a writer access the index concurrently
+            conn.execute('PRAGMA journal_mode=WAL')
+
+        with self._transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'filename TEXT PRIMARY KEY, size INTEGER, accessed INTEGER)'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)'
+            )
+            created = (
+                conn.execute(
+                    "SELECT name FROM sqlite_master WHERE name = 'stats'"
+                ).fetchone()
+                is None
+            )
+            if created:
+                conn.execute(
+                    'CREATE TABLE stats ('
+                    'clock INTEGER, items INTEGER, bytes INTEGER, '
+                    'hits INTEGER, misses INTEGER, evictions INTEGER)'
+                )
+                conn.execute('INSERT INTO stats VALUES (0, 0, 0, 0, 0, 0)')
+                self._index_existing_files(conn)
+
+    def _connect(self):
+        # Connections are not reused, so that they are never shared by
+        # processes forked after the cache is created
+        conn = sqlite3.connect(self._index, timeout=30, isolation_level=None)
+        # in WAL mode, only a power loss may roll back the latest transactions
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return closing(conn)
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def _index_existing_files(self, conn):
+        """Add the files of a cache directory written before the index was
+        introduced, from the least to the most recently used."""
+        files = sorted(
+            (f.stat().st_mtime, f.name, f.stat().st_size)
+            for f in self._cache_dir.glob('*')
+            if f.is_file() and len(f.name) == 32
+        )
+        for clock, (_, filename, size) in enumerate(files, start=1):
+            conn.execute(
+                'INSERT INTO entries VALUES (?, ?, ?)', (filename, size, clock)
+            )
+        conn.execute(
+            'UPDATE stats SET clock = ?, items = ?, bytes = ?',
+            (len(files), len(files), sum(size for _, _, size in files)),
+        )
 
     def _hash_fn(self, fn):
         m = hashlib.md5()
@@ -37,18 +119,38 @@ class Cache:
         name : str
         """
         # Cache is disabled, return nothing
-        if self._max_items == 0:
+        if not self.enabled:
             return None
 
         cache_file = self._hash_fn(name)
-        if not cache_file.exists():
-            return None
+        with self._transaction() as conn:
+            entry = conn.execute(
+                'SELECT size FROM entries WHERE filename = ?', (cache_file.name,)
+            ).fetchone()
+            if entry is not None and not cache_file.exists():
+                # removed from outside of the cache
+                self._remove(conn, cache_file.name, entry[0])
+                entry = None
 
-        log(f"hit [{name}]")
-        cache_file.touch()  # Make newest in cache
+            if entry is None:
+                conn.execute('UPDATE stats SET misses = misses + 1')
+                return None
 
+            # Make newest in cache
+            conn.execute('UPDATE stats SET clock = clock + 1, hits = hits + 1')
+            conn.execute(
+                'UPDATE entries SET accessed = (SELECT clock FROM stats) '
+                'WHERE filename = ?',
+                (cache_file.name,),
+            )
+
+        log(f"hit [{name}]")
         return cache_file
 
+    @property
+    def enabled(self):
+        return self._max_items != 0
+
     def __setitem__(self, name, data):
         """Insert item into cache.
 
@@ -59,32 +161,156 @@ class Cache:
         data : bytes
             Bytes to be written to file associated with this entry.
         """
+        self.write(name, [data])
+
+    def write(self, name, chunks):
+        """Insert item into cache from an iterable of bytes, e.g., the chunks
+        of a streamed download, without holding it in memory.
+
+        Parameters
+        ----------
+        name : str
+            Name for this entry.
+        chunks : iterable of bytes
+            Chunks of the file associated with this entry. If iterating over
+            them fails, no entry is added.
+
+        Returns
+        -------
+        Path or None
+            Path to the file of the entry, or None if the cache is disabled
+            or the file is larger than the maximum size of the cache.
+        """
         # Cache is disabled, do not add entry
-        if self._max_items == 0:
-            return
+        if not self.enabled:
+            return None
 
         fn = self._hash_fn(name)
-        with open(fn, 'wb') as f:
-            f.write(data)
+        # Write to a temporary file and rename it, so that readers see either
+        # the previous or the complete new file
+        with tempfile.NamedTemporaryFile(
+            dir=self._cache_dir, prefix=TEMP_PREFIX, delete=False
+        ) as f:
+            try:
+                for chunk in chunks:
+                    f.write(chunk)
+            except BaseException:
+                os.remove(f.name)
+                raise
+            size = f.tell()
+        if self._max_bytes is not None and size > self._max_bytes:
+            # Would evict every other entry and then itself; also drop any
+            # previous version, which is now outdated
+            os.remove(f.name)
+            log(f"not saving [{name}]: {size} bytes exceed the cache size")
+            del self[name]
+            return None
+        os.replace(f.name, fn)
+
+        with self._transaction() as conn:
+            entry = conn.execute(
+                'SELECT size FROM entries WHERE filename = ?', (fn.name,)
+            ).fetchone()
+            if entry is not None:
+                conn.execute(
+                    'UPDATE stats SET items = items - 1, bytes = bytes - ?',
+                    (entry[0],),
+                )
+            conn.execute(
+                'UPDATE stats SET clock = clock + 1, items = items + 1, '
+                'bytes = bytes + ?',
+                (size,),
+            )
+            conn.execute(
+                'INSERT OR REPLACE INTO entries '
+                'VALUES (?, ?, (SELECT clock FROM stats))',
+                (fn.name, size),
+            )
 
         log(f"save [{name}] to [{os.path.basename(fn)}]")
 
-        self.clean_cache()
+        self.clean_cache(keep=fn.name)
+        return fn
+
+    def __delitem__(self, name):
+        """Remove item from the cache, if present.
+
+        Parameters
+        ----------
+        name : str
+        """
+        cache_file = self._hash_fn(name)
+        with self._transaction() as conn:
+            entry = conn.execute(
+                'SELECT size FROM entries WHERE filename = ?', (cache_file.name,)
+            ).fetchone()
+            if entry is not None:
+                self._remove(conn, cache_file.name, entry[0])
+        try:
+            os.remove(cache_file)
+            log(f"remove [{name}]")
+        except FileNotFoundError:
+            pass
+
+    def _remove(self, conn, filename, size):
+        conn.execute('DELETE FROM entries WHERE filename = ?', (filename,))
+        conn.execute('UPDATE stats SET items = items - 1, bytes = bytes - ?', (size,))
+
+    def clean_cache(self, keep=None):
+        """Remove the least recently used entries beyond the limits.
+
+        Parameters
+        ----------
+        keep : str, optional
+            Name of a file that is never evicted, e.g., the one just written.
+        """
+        removed = []
+        with self._transaction() as conn:
+            while True:
+                items, total_bytes = conn.execute(
+                    'SELECT items, bytes FROM stats'
+                ).fetchone()
+                if items <= self._max_items and (
+                    self._max_bytes is None or total_bytes <= self._max_bytes
+                ):
+                    break
 
-    def clean_cache(self):
-        # Remove stale cache files
-        cached_files = [
-            (f.stat().st_mtime, f.absolute()) for f in self._cache_dir.glob('*')
-        ]
-        cached_files = sorted(cached_files, key=lambda x: x[0], reverse=True)
-        # fmt: off
-        for t, f in cached_files[self._max_items:]:
+                entry = conn.execute(
+                    'SELECT filename, size FROM entries WHERE filename IS NOT ? '
+                    'ORDER BY accessed LIMIT 1',
+                    (keep,),
+                ).fetchone()
+                if entry is None:
+                    break
+                filename, size = entry
+                self._remove(conn, filename, size)
+                conn.execute('UPDATE stats SET evictions = evictions + 1')
+                removed.append(filename)
+
+        for filename in removed:
             try:
-                os.remove(f)
-                log(f'cleanup [{os.path.basename(f)}]')
+                os.remove(self._cache_dir / filename)
+                log(f'cleanup [{filename}]')
             except FileNotFoundError:
                 pass
-        # fmt: on
+
+    def stats(self):
+        """Return the number of hits, misses and evictions of the cache,
+        counted over all processes, and the number and total size of the
+        items it holds."""
+        with self._connect() as conn:
+            items, total_bytes, hits, misses, evictions = conn.execute(
+                'SELECT items, bytes, hits, misses, evictions FROM stats'
+            ).fetchone()
+        return {
+            'items': items,
+            'bytes': total_bytes,
+            'hits': hits,
+            'misses': misses,
+            'evictions': evictions,
+        }
 
     def __len__(self):
-        return len(list(self._cache_dir.glob('*')))
+        with self._connect() as conn:
+            (items,) = conn.execute('SELECT items FROM stats').fetchone()
+        return items
@@ -0,0 +1,157 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlparse
+import functools
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from tornado.ioloop import IOLoop
+
+from baselayer.log import make_log
+
+log = make_log('catalog-client')
+
+
+class CatalogClient:
+    def __init__(self, max_workers=8, max_connections_per_host=4, timeout=(6.05, 20)):
+        """A client for the external catalogs and image servers queried for
+        offset stars and finding charts, shared by the requests of a process.
+
+        It keeps HTTP connections open between requests, runs the queries in
+        a bounded pool of threads, limits the number of concurrent requests
+        to each server, and coalesces identical queries that are in flight
+        at the same time.
+
+        Parameters
+        ----------
+        max_workers : int, optional
+            Number of threads running queries.
+        max_connections_per_host : int, optional
+            Maximum number of concurrent requests to a server.
+        timeout : float or tuple of float, optional
+            Connect and read timeouts of HTTP requests, in seconds.
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_connections_per_host = max_connections_per_host
+        self.reset()
+
+    def reset(self):
+        """Create new threads, connections and locks for the client, e.g., in
+        a process forked while other threads were using them."""
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix='catalog-client'
+        )
+
+        # With `pool_block`, requests wait for one of the connections to the
+        # server to be released, so that at most `max_connections_per_host`
+        # are open, including those of streamed downloads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.max_workers,
+            pool_maxsize=self.max_connections_per_host,
+            pool_block=True,
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._host_limits = {}
+        self._in_flight = {}
+
+    def get(self, url, **kwargs):
+        """GET `url` with the shared session.
+
+        Responses with an error status are closed, so that their connection
+        is released without reading their body.
+
+        Parameters
+        ----------
+        url : str
+        **kwargs : optional
+            Arguments of `requests.Session.get`.
+
+        Returns
+        -------
+        requests.Response or None
+            The response, or None if the request failed.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        try:
+            response = self.session.get(url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            log(f'GET {url} failed: {e}')
+            return None
+        if not response.ok:
+            response.close()
+        return response
+
+    @contextmanager
+    def host_limit(self, url):
+        """Wait until fewer than `max_connections_per_host` queries made in
+        this context are running against the server of `url`, e.g., for TAP
+        queries that do not use the shared session.
+
+        Parameters
+        ----------
+        url : str
+        """
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(
+                    self.max_connections_per_host
+                )
+            semaphore = self._host_limits[host]
+        with semaphore:
+            yield
+
+    def coalesce(self, key, function, *args, **kwargs):
+        """Call `function(*args, **kwargs)`, unless a call with the same `key`
+        is already running, in which case wait for it and return its result
+        or raise its exception.
+
+        Parameters
+        ----------
+        key : hashable
+            Identifies calls with the same result.
+        function : callable
+        *args, **kwargs : optional
+            Arguments of `function`.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._in_flight[key] = Future()
+
+        if not is_owner:
+            log(f'waiting for in-flight query [{key}]')
+            return future.result()
+
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return result
+
+    async def run(self, function, *args, **kwargs):
+        """Run `function(*args, **kwargs)` in the thread pool of the client,
+        without blocking the event loop.
+
+        Parameters
+        ----------
+        function : callable
+        *args, **kwargs : optional
+            Arguments of `function`.
+        """
+        return await IOLoop.current().run_in_executor(
+            self.executor, functools.partial(function, *args, **kwargs)
+        )
@@ -0,0 +1,168 @@
+from pathlib import Path
+import io
+
+import numpy as np
+import pandas as pd
+from astropy import units as u
+from astropy.coordinates import ICRS, SkyCoord
+from astropy_healpix import HEALPix
+
+from .cache import Cache
+
+# Tiles are the pixels of the nested HEALPix grid of this order, which are
+# about 14 arcmin wide
+TILE_ORDER = 8
+tile_grid = HEALPix(nside=2 ** TILE_ORDER, order='nested', frame=ICRS())
+
+# Number of points on the edge of a cone whose tiles overlap the cone
+CONE_EDGE_POINTS = 360
+
+
+def tiles_in_cone(ra, dec, radius_degrees):
+    """Return the tiles that overlap a cone.
+
+    Parameters
+    ----------
+    ra : float
+        Right ascension (J2000) of the center of the cone [deg]
+    dec : float
+        Declination (J2000) of the center of the cone [deg]
+    radius_degrees : float
+        Radius of the cone [deg]
+
+    Returns
+    -------
+    list of int
+        HEALPix indices of the tiles
+    """
+    # The cone search only returns the tiles with their center in the cone;
+    # add those of points on its edge, for the tiles that overlap its edge
+    center = SkyCoord(ra, dec, unit=(u.deg, u.deg))
+    edge = center.directional_offset_by(
+        np.linspace(0, 360, CONE_EDGE_POINTS, endpoint=False) * u.deg,
+        radius_degrees * u.deg,
+    )
+    pixels = set(
+        tile_grid.cone_search_lonlat(
+            ra * u.deg, dec * u.deg, radius=radius_degrees * u.deg
+        ).tolist()
+    )
+    pixels.update(tiles_of(edge.ra.deg, edge.dec.deg).tolist())
+    pixels.update(tiles_of([ra], [dec]).tolist())
+    return sorted(pixels)
+
+
+def tiles_of(ra, dec):
+    """Return the tile of each position, given as arrays in degrees."""
+    return tile_grid.lonlat_to_healpix(
+        np.asarray(ra) * u.deg, np.asarray(dec) * u.deg
+    ).astype(np.int64)
+
+
+def tile_corners(pixels):
+    """Return the right ascensions and declinations of the corners of tiles.
+
+    Parameters
+    ----------
+    pixels : list of int
+        HEALPix indices of the tiles
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray)
+        Right ascensions and declinations [deg], of shape (len(pixels), 4)
+    """
+    ra, dec = tile_grid.boundaries_lonlat(np.asarray(pixels), step=1)
+    return ra.to_value(u.deg), dec.to_value(u.deg)
+
+
+def gaia_source_id_range(pixel):
+    """Return the smallest and largest Gaia source_id in a tile.
+
+    Gaia source_ids are the nested HEALPix index of the source at order 12,
+    multiplied by 2**35, plus a running number.
+    """
+    ids_per_tile = 2 ** 35 * 4 ** (12 - TILE_ORDER)
+    return pixel * ids_per_tile, (pixel + 1) * ids_per_tile - 1
+
+
+class CatalogTiles:
+    def __init__(self, name, cache_dir="./cache/catalog_tiles/", max_items=50000):
+        """
+        Rows of an external catalog stored locally by tile, so that cone
+        searches covered by stored tiles do not need a remote query.
+
+        Each tile holds all the rows of the catalog in the tile, or is
+        marked as incomplete, e.g., if the query for the tile was truncated.
+
+        Parameters
+        ----------
+        name : str
+            Name of the catalog, which must identify the columns and the
+            selection of the rows of the tiles.
+        cache_dir : Path or str, optional
+            Directory of the tiles of all catalogs.
+        max_items : int, optional
+            How many tiles of this catalog to keep. Set to zero to disable.
+        """
+        self.name = name
+        self._cache = Cache(cache_dir=Path(cache_dir) / name, max_items=max_items)
+
+    @property
+    def enabled(self):
+        return self._cache.enabled
+
+    def missing(self, pixels):
+        """Return the tiles that are neither stored nor marked as incomplete.
+
+        Parameters
+        ----------
+        pixels : list of int
+        """
+        return [pixel for pixel in pixels if self._cache[str(pixel)] is None]
+
+    def load(self, pixels):
+        """Return the rows of tiles.
+
+        Parameters
+        ----------
+        pixels : list of int
+
+        Returns
+        -------
+        pandas.DataFrame or None
+            The rows of all the tiles, or None if any of them is missing or
+            incomplete.
+        """
+        frames = []
+        for pixel in pixels:
+            tile_fn = self._cache[str(pixel)]
+            if tile_fn is None:
+                return None
+            try:
+                data = tile_fn.read_bytes()
+            except FileNotFoundError:
+                # evicted by another process
+                return None
+            if len(data) == 0:
+                # incomplete tile
+                return None
+            frames.append(pd.read_parquet(io.BytesIO(data)))
+        return pd.concat(frames, ignore_index=True)
+
+    def save(self, pixel, rows):
+        """Store the rows of a tile.
+
+        Parameters
+        ----------
+        pixel : int
+        rows : pandas.DataFrame or None
+            All the rows of the catalog in the tile, or None to mark the tile
+            as incomplete.
+        """
+        if rows is None:
+            self._cache[str(pixel)] = b''
+        else:
+            buf = io.BytesIO()
+            rows.to_parquet(buf, index=False)
+            self._cache[str(pixel)] = buf.getvalue()
@@ -1,11 +1,13 @@
 import io
+import multiprocessing
 import os
+import threading
 import datetime
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 from functools import wraps
 
 import pandas as pd
-import requests
 from requests.exceptions import HTTPError
 import matplotlib
 import matplotlib.pyplot as plt
@@ -16,7 +18,7 @@ from scipy.ndimage.filters import gaussian_filter
 from joblib import Memory
 
 from astropy import units as u
-from astropy.coordinates import SkyCoord
+from astropy.coordinates import SkyCoord, angular_separation
 from astroquery.gaia import Gaia
 from astropy.time import Time
 from astropy.table import Table
@@ -28,9 +30,17 @@ from astropy.io import fits
 from astropy.visualization import ImageNormalize, ZScaleInterval
 from reproject import reproject_adaptive
 import pyvo as vo
-from pyvo.dal.exceptions import DALQueryError
+from pyvo.dal.exceptions import DALQueryError, DALServiceError
 
 from .cache import Cache
+from .catalog_client import CatalogClient
+from .catalog_tiles import (
+    CatalogTiles,
+    gaia_source_id_range,
+    tile_corners,
+    tiles_in_cone,
+    tiles_of,
+)
 
 from baselayer.log import make_log
 from baselayer.app.env import load_env
@@ -42,6 +52,7 @@ _, cfg = load_env()
 
 class GaiaQuery:
 
+    main_tap = 'https://gea.esac.esa.int/tap-server/tap'
     alt_tap = 'https://gaia.aip.de/tap'
     alt_main_db = 'gaiaedr3'
 
@@ -82,7 +93,7 @@ class GaiaQuery:
         if self.is_backup:
             try:
                 self.main_db = GaiaQuery.alt_main_db
-                g = vo.dal.TAPService(GaiaQuery.alt_tap)
+                g = vo.dal.TAPService(GaiaQuery.alt_tap, session=catalog_client.session)
                 q = f"SELECT TOP 1 * from {self.alt_main_db}.gaia_source"
                 _ = g.search(q)
                 self.connection = g
@@ -92,19 +103,30 @@ class GaiaQuery:
                 self.connection = None
                 return False
 
-    def query(self, q):
+    def query(self, q, run_async=False):
+        """Run an ADQL query, synchronously unless `run_async` is set, e.g.,
+        for queries that may return more rows than allowed for synchronous
+        queries (2000 on the main server)."""
         if not self.db_connected or self.connection is None:
             raise HTTPError("GaiaQuery not connected properly.")
 
         # replace the main db name
         q = q.format(main_db=self.main_db)
         if not self.is_backup:
-            job = self.connection.launch_job(q)
-            rez = job.get_results()
+            with catalog_client.host_limit(GaiaQuery.main_tap):
+                if run_async:
+                    job = self.connection.launch_job_async(q)
+                else:
+                    job = self.connection.launch_job(q)
+                rez = job.get_results()
             return rez
         else:
             # native return type is pyvo.dal.tap.TAPResults
-            job = self.connection.search(q)
+            with catalog_client.host_limit(GaiaQuery.alt_tap):
+                if run_async:
+                    job = self.connection.run_async(q)
+                else:
+                    job = self.connection.search(q)
             return self._standardize_table(job.to_table())
 
     def _standardize_table(self, tab):
@@ -198,15 +220,318 @@ starlist_formats = {
 JOBLIB_CACHE_SIZE = 100e6  # 100 MB
 offsets_memory = Memory("./cache/offsets/", verbose=0, bytes_limit=JOBLIB_CACHE_SIZE)
 
+# Size of the chunks in which images and catalogs are written to the cache
+# while they are downloaded
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Shared by the offset star and finding chart requests of this process
+catalog_client = CatalogClient(
+    max_workers=cfg["misc.catalog_client_max_workers"],
+    max_connections_per_host=cfg["misc.catalog_client_max_connections_per_host"],
+)
+gaia_query = None
+gaia_query_lock = threading.Lock()
+
+# Renders the finding charts of observing runs; created on first use
+finding_chart_pool = None
+finding_chart_pool_lock = threading.Lock()
+
+# Gaia sources are stored by tile down to this magnitude, which covers the
+# offset star queries of all facilities, including their relaxed retries
+GAIA_TILE_MAG_LIMIT = 21.5
+GAIA_TILE_COLUMNS = [
+    'source_id',
+    'ra',
+    'dec',
+    'ref_epoch',
+    'phot_rp_mean_mag',
+    'pmra',
+    'pmdec',
+    'parallax',
+]
+GAIA_COLUMN_UNITS = {
+    'dist': u.deg,
+    'ra': u.deg,
+    'dec': u.deg,
+    'ref_epoch': u.yr,
+    'phot_rp_mean_mag': u.mag,
+    'pmra': u.mas / u.yr,
+    'pmdec': u.mas / u.yr,
+    'parallax': u.mas,
+}
+# Tiles with more sources are marked as incomplete, and the cone searches
+# that overlap them are made against the remote catalog
+GAIA_TILE_MAX_ROWS = 50_000
+
+# A tile of the ZTF reference catalog of a quadrant is only stored if each of
+# its corners is this close to a source of the quadrant, i.e., if the tile
+# does not extend beyond the quadrant
+ZTF_TILE_CORNER_TOLERANCE = 30 * u.arcsec
+
 
 def get_url(*args, **kwargs):
-    # Connect and read timeouts
-    kwargs['timeout'] = (6.05, 20)
+    return catalog_client.get(*args, **kwargs)
+
+
+def get_gaia_query():
+    """Return the GaiaQuery shared by the requests of this process, which is
+    connected once instead of for every query."""
+    global gaia_query
+    with gaia_query_lock:
+        if gaia_query is None or not gaia_query.db_connected:
+            gaia_query = GaiaQuery()
+        return gaia_query
+
+
+def get_finding_chart_pool():
+    """Return the pool of processes rendering the finding charts of observing
+    runs for this process, replacing it if one of its processes died.
+
+    The processes are forked from a server process rather than from the app
+    process, so that they do not inherit the database connections, the
+    catalog client and the locks that the threads of the app process may be
+    using.
+    """
+    global finding_chart_pool
+    with finding_chart_pool_lock:
+        if finding_chart_pool is None or finding_chart_pool._broken:
+            finding_chart_pool = ProcessPoolExecutor(
+                max_workers=cfg["misc.finding_chart_processes"],
+                mp_context=multiprocessing.get_context('forkserver'),
+            )
+        return finding_chart_pool
+
+
+def download_to_cache(url, cache, name):
+    """Download a file to the cache, chunk by chunk. Concurrent downloads of
+    the same entry are coalesced.
+
+    Parameters
+    ----------
+    url : str
+        URL of the file
+    cache : skyportal.utils.cache.Cache
+        Cache to write to; must be enabled
+    name : str
+        Name of the cache entry
+
+    Returns
+    -------
+    Path or None
+        Path to the cached file, or None if the download failed or the file
+        cannot be cached.
+    """
+
+    def download():
+        response = get_url(url, stream=True, allow_redirects=True)
+        if response is None or response.status_code != 200:
+            return None
+        with response:
+            return cache.write(
+                name, response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
+            )
+
+    return catalog_client.coalesce(('download', url, name), download)
+
+
+def open_cached_fits(url, cache, name):
+    """Open a FITS file from the cache, downloading it to the cache first if
+    needed. The file is read into memory instead if the cache is disabled,
+    the file cannot be cached (e.g., it is larger than the cache), or it is
+    evicted, e.g., by another process, before it is opened.
+
+    Parameters
+    ----------
+    url : str
+        URL of the file
+    cache : skyportal.utils.cache.Cache
+        Cache to read from and write to
+    name : str
+        Name of the cache entry
+
+    Returns
+    -------
+    astropy.io.fits.HDUList or None
+        The opened file, or None if the download failed.
+    """
+    if cache.enabled:
+        hdu_fn = cache[name]
+        if hdu_fn is None:
+            hdu_fn = download_to_cache(url, cache, name)
+        if hdu_fn is not None:
+            try:
+                return fits.open(hdu_fn, memmap=True)
+            except FileNotFoundError:
+                log(f'{name} was evicted from the cache before being opened')
+            except OSError:
+                # not a valid FITS file
+                del cache[name]
+                raise
+
+    response = get_url(url, allow_redirects=True)
+    if response is None or response.status_code != 200:
+        return None
+    return fits.open(io.BytesIO(response.content))
+
+
+def get_catalog_tiles(name):
+    return CatalogTiles(name, max_items=cfg["misc.catalog_tiles_max_items"])
+
+
+def fetch_gaia_tile(tiles, pixel):
+    """Query the Gaia sources of a tile and store them in `tiles`."""
+    first_id, last_id = gaia_source_id_range(pixel)
+    query_string = f"""
+                  SELECT TOP {GAIA_TILE_MAX_ROWS + 1} {', '.join(GAIA_TILE_COLUMNS)}
+                  FROM {{main_db}}.gaia_source
+                  WHERE source_id BETWEEN {first_id} AND {last_id}
+                  AND phot_rp_mean_mag < {GAIA_TILE_MAG_LIMIT}
+                """
+    r = get_gaia_query().query(query_string, run_async=True)
+    if len(r) > GAIA_TILE_MAX_ROWS:
+        tiles.save(pixel, None)
+    else:
+        tiles.save(pixel, r[GAIA_TILE_COLUMNS].to_pandas())
+
+
+def fetch_gaia_tiles(ra, dec, radius_degrees):
+    """Fetch the Gaia tiles overlapping a cone that are not stored yet.
+
+    Parameters
+    ----------
+    ra : float
+        Right ascension (J2000) of the center of the cone
+    dec : float
+        Declination (J2000) of the center of the cone
+    radius_degrees : float
+        Radius of the cone
+
+    Returns
+    -------
+    (skyportal.utils.catalog_tiles.CatalogTiles, list of int) or None
+        The Gaia tiles and the tiles overlapping the cone, or None if the
+        tiles are disabled or could not be fetched.
+    """
+    tiles = get_catalog_tiles(f'gaia_{get_gaia_query().main_db}')
+    if not tiles.enabled:
+        return None
+
+    pixels = tiles_in_cone(ra, dec, radius_degrees)
     try:
-        return requests.get(*args, **kwargs)
-    except requests.exceptions.RequestException:
+        for pixel in tiles.missing(pixels):
+            catalog_client.coalesce((tiles.name, pixel), fetch_gaia_tile, tiles, pixel)
+    except (HTTPError, DALQueryError, DALServiceError) as e:
+        log(f"Warning: could not fetch the Gaia tiles at {ra} {dec}: {e}")
+        return None
+    return tiles, pixels
+
+
+def query_gaia_tiles(ra, dec, radius_degrees, mag_min, mag_max, how_many):
+    """Run the cone search of `get_nearby_offset_stars` against the stored
+    Gaia tiles, fetching the missing ones.
+
+    Parameters
+    ----------
+    ra : float
+        Right ascension (J2000) of the center of the cone
+    dec : float
+        Declination (J2000) of the center of the cone
+    radius_degrees : float
+        Radius of the cone
+    mag_min : float
+        Exclusive lower limit on `phot_rp_mean_mag`
+    mag_max : float
+        Exclusive upper limit on `phot_rp_mean_mag`
+    how_many : int
+        Maximum number of sources to return, brightest first
+
+    Returns
+    -------
+    astropy.table.Table or None
+        The sources, with the columns of the remote query, or None if the
+        search cannot be answered from the tiles, e.g., because one of them
+        is incomplete.
+    """
+    if mag_max > GAIA_TILE_MAG_LIMIT:
+        return None
+    fetched = fetch_gaia_tiles(ra, dec, radius_degrees)
+    if fetched is None:
+        return None
+    tiles, pixels = fetched
+    rows = tiles.load(pixels)
+    if rows is None:
         return None
 
+    center = SkyCoord(ra, dec, unit=(u.deg, u.deg))
+    coords = SkyCoord(rows['ra'].values, rows['dec'].values, unit=(u.deg, u.deg))
+    rows.insert(0, 'dist', coords.separation(center).deg)
+    rows = rows[
+        (rows['dist'] <= radius_degrees)
+        & (rows['phot_rp_mean_mag'] < mag_max)
+        & (rows['phot_rp_mean_mag'] > mag_min)
+        & (rows['parallax'] < 250)
+    ]
+    rows = rows.sort_values('phot_rp_mean_mag', kind='stable').head(how_many)
+
+    table = Table.from_pandas(rows)
+    for column, unit in GAIA_COLUMN_UNITS.items():
+        table[column].unit = unit
+    return table
+
+
+def save_ztf_tiles(tiles, ztftable):
+    """Store the tiles of the reference catalog of a ZTF quadrant that lie
+    within the quadrant."""
+    ra = np.asarray(ztftable['ra'], dtype=float)
+    dec = np.asarray(ztftable['dec'], dtype=float)
+    if len(ra) == 0:
+        return
+
+    source_tiles = tiles_of(ra, dec)
+    pixels = np.unique(source_tiles)
+    corner_ra, corner_dec = tile_corners(pixels)
+    corners = SkyCoord(corner_ra.ravel(), corner_dec.ravel(), unit=(u.deg, u.deg))
+    _, sep, _ = corners.match_to_catalog_sky(SkyCoord(ra, dec, unit=(u.deg, u.deg)))
+    within = (sep < ZTF_TILE_CORNER_TOLERANCE).reshape(corner_ra.shape).all(axis=1)
+
+    for pixel in pixels[within]:
+        in_tile = source_tiles == pixel
+        tiles.save(int(pixel), pd.DataFrame({'ra': ra[in_tile], 'dec': dec[in_tile]}))
+
+
+def prefetch_catalog_tiles(ra, dec, radius_degrees=None):
+    """Fetch the Gaia and ZTF reference catalog tiles used to find the offset
+    stars of a position, e.g., for the targets of an observing run.
+
+    Parameters
+    ----------
+    ra : float
+        Right ascension (J2000) of the source
+    dec : float
+        Declination (J2000) of the source
+    radius_degrees : float, optional
+        Radius of the area to fetch. Defaults to the largest search radius
+        of the facilities, including relaxed retries.
+
+    Returns
+    -------
+    bool
+        Whether both catalogs can now be searched locally around the source.
+    """
+    if radius_degrees is None:
+        radius_degrees = 1.3 * max(
+            parameters["radius_degrees"] for parameters in facility_parameters.values()
+        )
+
+    fetched = fetch_gaia_tiles(ra, dec, radius_degrees)
+    gaia_is_local = fetched is not None and fetched[0].load(fetched[1]) is not None
+
+    get_ztfcatalog(ra, dec, radius_degrees=radius_degrees)
+    ztf_tiles = get_catalog_tiles('ztfref')
+    ztf_is_local = ztf_tiles.load(tiles_in_cone(ra, dec, radius_degrees)) is not None
+
+    return gaia_is_local and ztf_is_local
+
 
 @offsets_memory.cache
 def get_ztfref_url(ra, dec, imsize, *args, **kwargs):
@@ -301,7 +626,14 @@ source_image_parameters = {
 
 
 @offsets_memory.cache
-def get_ztfcatalog(ra, dec, cache_dir="./cache/finder_cat/", cache_max_items=1000):
+def get_ztfcatalog(
+    ra,
+    dec,
+    cache_dir="./cache/finder_cat/",
+    cache_max_items=1000,
+    cache_max_bytes=None,
+    radius_degrees=None,
+):
     """Finds the ZTF public catalog data around this position
 
     Parameters
@@ -314,33 +646,37 @@ def get_ztfcatalog(ra, dec, cache_dir="./cache/finder_cat/", cache_max_items=100
         Directory to cache the astrometry data
     cache_max_items : int, optional
         How many files to keep in the cache
+    cache_max_bytes : int, optional
+        Maximum total size of the files in the cache, unlimited by default
+    radius_degrees : float, optional
+        Radius of the area around the position that is needed. If the
+        locally stored tiles of the catalog cover it, they are returned
+        instead of the catalog of the whole quadrant.
     """
-    cache = Cache(cache_dir=cache_dir, max_items=cache_max_items)
+    ztf_tiles = get_catalog_tiles('ztfref')
+    if radius_degrees is not None and ztf_tiles.enabled:
+        rows = ztf_tiles.load(tiles_in_cone(ra, dec, radius_degrees))
+        if rows is not None:
+            return SkyCoord(rows['ra'].values, rows['dec'].values, unit=(u.deg, u.deg))
+
+    cache = Cache(
+        cache_dir=cache_dir, max_items=cache_max_items, max_bytes=cache_max_bytes
+    )
 
     refurl = get_ztfref_url(ra, dec, imsize=5)
     # the catalog data is in the same directory as the reference images
     caturl = refurl.replace("_refimg.fits", "_refpsfcat.fits")
     catname = os.path.basename(caturl)
-    hdu_fn = cache[catname]
+    hdul = open_cached_fits(caturl, cache, catname)
+    if hdul is None:
+        return None
+    with hdul:
+        ztftable = Table(hdul[1].data)
 
-    if hdu_fn is not None:
-        with fits.open(hdu_fn) as hdu:
-            data = hdu[1].data
-    else:
-        response = get_url(caturl, stream=True, allow_redirects=True)
-        if response is None or response.status_code != 200:
-            return None
-        else:
-            with fits.open(io.BytesIO(response.content)) as hdu:
-                buf = io.BytesIO()
-                hdu.writeto(buf)
-                buf.seek(0)
-                cache[catname] = buf.read()
-                data = hdu[1].data
-
-    ztftable = Table(data)
     ztftable["ra"].unit = u.deg
     ztftable["dec"].unit = u.deg
+    if ztf_tiles.enabled:
+        save_ztf_tiles(ztf_tiles, ztftable)
     try:
         catalog = SkyCoord.guess_from_table(ztftable)
         return catalog
@@ -348,7 +684,10 @@ def get_ztfcatalog(ra, dec, cache_dir="./cache/finder_cat/", cache_max_items=100
         return None
 
 
-@warningfilter(action="ignore", category=RuntimeWarning)
+# Columns of the photometry of a source used to estimate its position
+POSITION_COLUMNS = ['ra', 'dec', 'flux', 'fluxerr', 'ra_unc', 'dec_unc']
+
+
 def _calculate_best_position_for_offset_stars(
     photometry, fallback=(None, None), how="snr2", max_offset=0.5, sigma_clip=4.0
 ):
@@ -377,41 +716,76 @@ def _calculate_best_position_for_offset_stars(
         )
         return fallback
 
-    # convert the photometry into a dataframe
-    phot = [x.to_dict() for x in photometry]
-    df = pd.DataFrame(phot)
+    columns = {
+        column: np.array([getattr(p, column) for p in photometry], dtype=float)
+        for column in POSITION_COLUMNS
+    }
+    return _calculate_best_position_from_columns(
+        columns,
+        fallback=fallback,
+        how=how,
+        max_offset=max_offset,
+        sigma_clip=sigma_clip,
+    )
 
-    # remove limit data (non-detections)
-    try:
-        df = df[(df["flux"].notnull()) & (df["fluxerr"].notnull())]
-    except KeyError:
+
+@warningfilter(action="ignore", category=RuntimeWarning)
+def _calculate_best_position_from_columns(
+    columns, fallback=(None, None), how="snr2", max_offset=0.5, sigma_clip=4.0
+):
+    """Calculates the best position for a source from the columns of its
+       photometric points, e.g., as selected from the database without
+       loading Photometry objects.
+
+    Parameters
+    ----------
+    columns : dict
+        Arrays of the `POSITION_COLUMNS` of the photometry of the source,
+        with NaN for missing values
+    fallback : tuple, optional
+        The position to use if something goes wrong here
+    how : str
+        how to weight positional data:
+          snr2 = use the signal to noise squared
+          invvar = use the inverse photometric variance
+    max_offset : float, optional
+        How many arcseconds away should we ignore discrepant points?
+    sigma_clip : float, optional
+        Remove positions that are this number of std away from the median
+    """
+    ra, dec, flux, fluxerr, ra_unc, dec_unc = (
+        np.asarray(columns[column], dtype=float) for column in POSITION_COLUMNS
+    )
+
+    if len(flux) == 0:
         log(
             "Photometry does not include fluxes. Falling back to "
             " original source position."
         )
         return fallback
 
+    # remove limit data (non-detections)
+    detected = ~np.isnan(flux) & ~np.isnan(fluxerr)
+    ra, dec, flux, fluxerr, ra_unc, dec_unc = (
+        x[detected] for x in (ra, dec, flux, fluxerr, ra_unc, dec_unc)
+    )
+
     # remove observations with distances more than max_offset away
-    # from the median
-    try:
-        # use nanmedian so that med_ra, med_dec are not returned as
-        # nan when df['ra'] or df['dec'] contains `None`s (can happen
-        # when there is no position information for a photometry
-        # point)
-        med_ra, med_dec = np.nanmedian(df["ra"]), np.nanmedian(df["dec"])
-    except TypeError:
+    # from the median. Points without a position are ignored.
+    if np.isnan(ra).all() or np.isnan(dec).all():
         log(
             "Warning: could not find the median of the positions"
             " from the photometry data associated with this source "
         )
         return fallback
+    med_ra, med_dec = np.nanmedian(ra), np.nanmedian(dec)
 
     # check to make sure that the median isn't too far away from the
     # discovery position
     if fallback != (None, None):
-        c1 = SkyCoord(med_ra * u.deg, med_dec * u.deg, frame='icrs')
-        c2 = SkyCoord(fallback[0] * u.deg, fallback[1] * u.deg, frame='icrs')
-        sep = c1.separation(c2)
+        sep = angular_separation(
+            med_ra * u.deg, med_dec * u.deg, fallback[0] * u.deg, fallback[1] * u.deg
+        )
         if np.abs(sep) > max_offset * u.arcsec:
             log(
                 "Warning: calculated source position is too far from the"
@@ -419,24 +793,26 @@ def _calculate_best_position_for_offset_stars(
             )
             return fallback
 
-    df["ra_offset"] = np.cos(np.radians(df["dec"])) * (df["ra"] - med_ra) * 3600.0
-    df["dec_offset"] = (df["dec"] - med_dec) * 3600.0
-    df["offset_arcsec"] = np.sqrt(df["ra_offset"] ** 2 + df["dec_offset"] ** 2)
-    df = df[df["offset_arcsec"] <= max_offset]
+    ra_offset = np.cos(np.radians(dec)) * (ra - med_ra) * 3600.0
+    dec_offset = (dec - med_dec) * 3600.0
+    offset_arcsec = np.sqrt(ra_offset ** 2 + dec_offset ** 2)
+    keep = offset_arcsec <= max_offset
 
     # remove outliers
-    if len(df) > 4 and sigma_clip is not None:
-        df = df[df["offset_arcsec"] < sigma_clip * np.std(df["offset_arcsec"])]
+    if np.count_nonzero(keep) > 4 and sigma_clip is not None:
+        keep[keep] = offset_arcsec[keep] < sigma_clip * np.std(offset_arcsec[keep])
+
+    ra_offset, dec_offset = ra_offset[keep], dec_offset[keep]
 
     # TODO: add the ability to use only use observations from some filters
     try:
         if how == "snr2":
-            df["snr"] = df["flux"] / df["fluxerr"]
-            diff_ra = np.average(df["ra_offset"], weights=df["snr"] ** 2)
-            diff_dec = np.average(df["dec_offset"], weights=df["snr"] ** 2)
+            snr = flux[keep] / fluxerr[keep]
+            diff_ra = np.average(ra_offset, weights=snr ** 2)
+            diff_dec = np.average(dec_offset, weights=snr ** 2)
         elif how == "invvar":
-            diff_ra = np.average(df["ra_offset"], weights=1 / df["ra_unc"] ** 2)
-            diff_dec = np.average(df["dec_offset"], weights=1 / df["dec_unc"] ** 2)
+            diff_ra = np.average(ra_offset, weights=1 / ra_unc[keep] ** 2)
+            diff_dec = np.average(dec_offset, weights=1 / dec_unc[keep] ** 2)
         else:
             log(f"Warning: do not recognize {how} as a valid way to weight astrometry")
             return (med_ra, med_dec)
@@ -670,14 +1046,33 @@ def get_nearby_offset_stars(
                   ORDER BY phot_rp_mean_mag ASC
                 """
 
-    g = GaiaQuery()
-    r = g.query(query_string)
+    r = query_gaia_tiles(
+        source_ra,
+        source_dec,
+        radius_degrees,
+        mag_min,
+        mag_limit + fainter_diff,
+        how_many * search_multipler,
+    )
+    if r is None:
+        g = get_gaia_query()
+        # the rows of the results are modified below, so that callers waiting
+        # for the same query each need their own copy
+        r = catalog_client.coalesce(
+            ('gaia', g.main_db, query_string), g.query, query_string
+        ).copy()
     queries_issued += 1
 
     catalog = SkyCoord.guess_from_table(r)
 
     if use_ztfref:
-        ztfcatalog = get_ztfcatalog(source_ra, source_dec)
+        ztfcatalog = get_ztfcatalog(
+            source_ra,
+            source_dec,
+            radius_degrees=max(
+                radius_degrees, required_ztfref_source_distance / 3600.0
+            ),
+        )
         if ztfcatalog is None:
             log(
                 'Warning: Could not find the ZTF reference catalog'
@@ -867,6 +1262,7 @@ def fits_image(
     image_source="ztfref",
     cache_dir="./cache/finder/",
     cache_max_items=1000,
+    cache_max_bytes=None,
 ):
 
     """Returns an opened FITS image centered on the source
@@ -887,6 +1283,8 @@ def fits_image(
     cache_max_items : int, optional
         How many older files in the cache should we keep?  Set to zero
         to disable cache.
+    cache_max_bytes : int, optional
+        Maximum total size of the files in the cache, unlimited by default.
 
     Returns
     -------
@@ -911,38 +1309,52 @@ def fits_image(
             ra=center_ra, dec=center_dec, imsize=imsize
         )
 
-    cache = Cache(cache_dir=cache_dir, max_items=cache_max_items)
+    cache = Cache(
+        cache_dir=cache_dir, max_items=cache_max_items, max_bytes=cache_max_bytes
+    )
 
     def get_hdu(url):
         """Try to get HDU from cache, otherwise fetch."""
-        hash_name = f'{center_ra}{center_dec}{imsize}{image_source}'
-        hdu_fn = cache[hash_name]
-
-        # Found entry in cache, return that
-        if hdu_fn is not None:
-            return fits.open(hdu_fn)[0]
-
-        response = get_url(url, stream=True, allow_redirects=True)
-        if response is None or response.status_code != 200:
+        # ZTF reference images cover a whole quadrant, so that nearby sources
+        # share the same URL and cached image
+        hash_name = url
+        hdul = open_cached_fits(url, cache, hash_name)
+        if hdul is None:
             return None
-
-        # Check if HDU is a valid FITS file
-        hdu = fits.open(io.BytesIO(response.content))[0]
+        hdu = hdul[0]
 
         # Ensure it is not empty
         if np.count_nonzero(hdu.data) == 0:
+            if cache.enabled:
+                del cache[hash_name]
             return None
 
-        # Save a copy in cache and return
-        buf = io.BytesIO()
-        hdu.writeto(buf)
-        buf.seek(0)
-        cache[hash_name] = buf.read()
         return hdu
 
     return get_hdu(url)
 
 
+def prefetch_finding_chart_data(ra, dec, imsize=4.0, image_source='ztfref'):
+    """Fetch the reference catalogs and the image used by the finding chart
+    of a position, e.g., before rendering the charts of an observing run in
+    other processes, so that nearby targets share the same queries and
+    downloads.
+
+    Parameters
+    ----------
+    ra : float
+        Right ascension (J2000) of the source
+    dec : float
+        Declination (J2000) of the source
+    imsize : float, optional
+        Requested image size (on a size) in arcmin
+    image_source : str, optional
+        Survey where the image comes from
+    """
+    prefetch_catalog_tiles(ra, dec)
+    fits_image(ra, dec, imsize=imsize, image_source=image_source)
+
+
 def get_finding_chart(
     source_ra,
     source_dec,
@@ -1000,6 +1412,9 @@ def get_finding_chart(
             suggested filename based on `source_name` and `output_format`
         data : str
             binary encoded data for the image (to be streamed)
+        starlist_info : list of dict
+            If successful, the starlist of the source and its offset stars,
+            as returned by `get_nearby_offset_stars`
         reason : str
             If not successful, a reason is returned.
     """
@@ -1152,6 +1567,7 @@ def get_finding_chart(
             'name': '',
         }
 
+    starlist_info = star_list
     ncolors = len(star_list)
     if star_list[0]['str'].startswith("!Data"):
         ncolors -= 1
@@ -1321,5 +1737,6 @@ def get_finding_chart(
         "success": True,
         "name": f"finder_{source_name}.{output_format}",
         "data": buf.read(),
+        "starlist_info": starlist_info,
         "reason": "",
     }
@@ -0,0 +1,240 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+
+from PIL import Image, features
+
+from baselayer.log import make_log
+
+log = make_log('thumbnail_store')
+
+VARIANTS_DIR = 'variants'
+TEMP_PREFIX = '.tmp-'
+DIGEST_PATTERN = re.compile('[0-9a-f]{64}')
+
+# Formats in which stored thumbnails can be served, by file extension
+VARIANT_FORMATS = {'png': 'PNG'}
+if features.check('webp'):
+    VARIANT_FORMATS['webp'] = 'WEBP'
+
+
+class ThumbnailStore:
+    def __init__(self, root, url_prefix, max_workers=2):
+        """
+        Thumbnail image files stored by the SHA-256 digest of their contents,
+        so that identical images uploaded for several objects, or several
+        times, are stored once.
+
+        Files are stored in two levels of directories named after the first
+        characters of their digest, so that no directory holds more than a
+        few thousand files. They are written by a pool of threads after
+        `put` returns, to a temporary file that is then renamed, so that a
+        file is either absent or complete.
+
+        Parameters
+        ----------
+        root : Path or str
+            Directory of the files. Will be created if necessary.
+        url_prefix : str
+            URL at which `root` is served.
+        max_workers : int, optional
+            Number of threads writing files.
+        """
+        self.root = Path(root)
+        self.url_prefix = url_prefix.rstrip('/')
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='thumbnail-store'
+        )
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def _relative_path(self, digest, suffix='.png'):
+        return Path(digest[:2]) / digest[2:4] / f'{digest}{suffix}'
+
+    def path(self, digest):
+        """Path to the file of a thumbnail."""
+        return self.root / self._relative_path(digest)
+
+    def url(self, digest):
+        """Public URL of the file of a thumbnail."""
+        return f'{self.url_prefix}/{self._relative_path(digest).as_posix()}'
+
+    def digest_of(self, path):
+        """Return the digest of a stored file, or None if `path` is not the
+        path of a file of this store."""
+        path = Path(path)
+        if path == self.path(path.stem) and DIGEST_PATTERN.fullmatch(path.stem):
+            return path.stem
+        return None
+
+    @staticmethod
+    def digest_of_data(data):
+        """Return the digest identifying the file of a thumbnail."""
+        return hashlib.sha256(data).hexdigest()
+
+    def put(self, data):
+        """Store the contents of a thumbnail, unless an identical thumbnail
+        is already stored.
+
+        The file is written in the background; use `flush` to wait for it.
+
+        Parameters
+        ----------
+        data : bytes
+            Contents of the file.
+
+        Returns
+        -------
+        str
+            Hexadecimal SHA-256 digest of `data`, which identifies the file.
+        """
+        digest = self.digest_of_data(data)
+        path = self.path(digest)
+        with self._lock:
+            if digest in self._pending:
+                return digest
+            try:
+                # Mark the file as recently used, so that `collect_garbage`
+                # leaves it to the transaction that is about to refer to it
+                os.utime(path)
+                return digest
+            except FileNotFoundError:
+                pass
+            future = self._executor.submit(self._write, path, data)
+            self._pending[digest] = future
+
+        def done(future):
+            with self._lock:
+                del self._pending[digest]
+            if future.exception() is not None:
+                log(f'failed to write {path}: {future.exception()}')
+
+        future.add_done_callback(done)
+        return digest
+
+    def _write(self, path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, prefix=TEMP_PREFIX, delete=False
+        ) as f:
+            try:
+                f.write(data)
+            except BaseException:
+                os.remove(f.name)
+                raise
+        os.replace(f.name, path)
+
+    def flush(self, timeout=None):
+        """Wait until the files passed to `put` so far are written."""
+        with self._lock:
+            pending = list(self._pending.values())
+        wait(pending, timeout=timeout)
+
+    def _wait_for(self, digest):
+        with self._lock:
+            future = self._pending.get(digest)
+        if future is not None:
+            wait([future])
+
+    def variant(self, digest, extension='webp', size=None):
+        """Return the contents of a thumbnail converted to another format,
+        and downscaled to fit in `size` by `size` pixels. Variants are
+        created on first request and stored next to the thumbnails.
+
+        Parameters
+        ----------
+        digest : str
+            Digest of the thumbnail.
+        extension : str, optional
+            File extension of the format; one of `VARIANT_FORMATS`.
+        size : int, optional
+            Maximum width and height of the variant. Images are not
+            enlarged.
+
+        Returns
+        -------
+        bytes or None
+            The variant, or None if the thumbnail is not stored.
+        """
+        if extension not in VARIANT_FORMATS:
+            raise ValueError(f'Unsupported thumbnail format: {extension}')
+
+        path = (
+            self.root
+            / VARIANTS_DIR
+            / self._relative_path(digest, suffix=f'_{size or "full"}.{extension}')
+        )
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            pass
+
+        self._wait_for(digest)
+        buf = io.BytesIO()
+        try:
+            with Image.open(self.path(digest)) as image:
+                if size is not None:
+                    image.thumbnail((size, size))
+                image.save(buf, format=VARIANT_FORMATS[extension])
+        except FileNotFoundError:
+            return None
+        data = buf.getvalue()
+        self._write(path, data)
+        return data
+
+    def collect_garbage(self, referenced_digests, min_age=3600):
+        """Remove the stored files, and their variants, that no Thumbnail
+        refers to.
+
+        Parameters
+        ----------
+        referenced_digests : set of str
+            Digests of the thumbnails to keep.
+        min_age : float, optional
+            Files modified less than this number of seconds ago are kept, as
+            they may belong to transactions in progress.
+
+        Returns
+        -------
+        int
+            Number of removed files.
+        """
+        removed = 0
+        now = time.time()
+        for path in self.root.glob('*/*/*'):
+            if path.parts[-3] == VARIANTS_DIR:
+                continue
+            if path.name.startswith(TEMP_PREFIX):
+                digest = None
+            else:
+                digest = self.digest_of(path)
+                if digest is None or digest in referenced_digests:
+                    continue
+            try:
+                if now - path.stat().st_mtime < min_age:
+                    continue
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+
+        for path in (self.root / VARIANTS_DIR).glob('*/*/*'):
+            digest = path.name.split('_')[0]
+            if digest in referenced_digests:
+                continue
+            try:
+                if now - path.stat().st_mtime < min_age:
+                    continue
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+
+        log(f'removed {removed} unreferenced files')
+        return removed
@@ -1,4 +1,4 @@
-import React from "react";
+import React, { useState } from "react";
 import PropTypes from "prop-types";
 
 import dayjs from "dayjs";
@@ -13,6 +13,20 @@ import Typography from "@material-ui/core/Typography";
 
 dayjs.extend(calendar);
 
+// Uploaded thumbnails are stored by the SHA-256 digest of their contents, and
+// are displayed as smaller WebP images, or as the original PNG files if the
+// server cannot write WebP
+const uploadedThumbnailPattern = /^\/static\/thumbnails\/[0-9a-f]{2}\/[0-9a-f]{2}\/([0-9a-f]{64})\.png$/;
+const displayedThumbnailSize = 256;
+
+const thumbnailSrc = (url) => {
+  const match = url.match(uploadedThumbnailPattern);
+  if (match === null) {
+    return url;
+  }
+  return `/api/thumbnail/image/${match[1]}.webp?size=${displayedThumbnailSize}`;
+};
+
 const useStyles = makeStyles((theme) => ({
   root: (props) => ({
     width: props.size,
@@ -53,6 +67,7 @@ const Thumbnail = ({ ra, dec, name, url, size }) => {
   // unix timestamp epoch (1970-01-01).
 
   const classes = useStyles({ size });
+  const [variantFailed, setVariantFailed] = useState(false);
 
   let alt = null;
   let link = null;
@@ -93,7 +108,8 @@ const Thumbnail = ({ ra, dec, name, url, size }) => {
       <div className={classes.mediaDiv}>
         <a href={link}>
           <img
-            src={url}
+            src={variantFailed ? url : thumbnailSrc(url)}
+            onError={() => setVariantFailed(true)}
             alt={alt}
             className={classes.media}
             title={alt}
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+from baselayer.app.env import load_env, parser
+from skyportal.models import (
+    init_db,
+    DBSession,
+    Photometry,
+    PhotometrySummary,
+    refresh_photometry_summaries,
+)
+
+
+if __name__ == "__main__":
+    parser.description = (
+        'Rebuild the per-Obj photometry summaries from the Photometry table'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=1000,
+        help='Number of Objs to summarize per transaction',
+    )
+
+    env, cfg = load_env()
+    init_db(**cfg['database'])
+
+    # Include Objs with stale summaries but no remaining photometry
+    obj_ids = sorted(
+        {row[0] for row in DBSession().query(Photometry.obj_id).distinct()}
+        | {row[0] for row in DBSession().query(PhotometrySummary.obj_id).distinct()}
+    )
+
+    for start in range(0, len(obj_ids), env.batch_size):
+        end = start + env.batch_size
+        batch = obj_ids[start:end]
+        refresh_photometry_summaries(batch)
+        DBSession().commit()
+        print(f'Summarized photometry of {start + len(batch)}/{len(obj_ids)} objs')
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+import time
+
+import numpy as np
+import pandas as pd
+from astropy import units as u
+from astropy.coordinates import SkyCoord
+from sqlalchemy.orm import joinedload
+
+from baselayer.app.env import load_env, parser
+from skyportal.models import init_db, DBSession, Obj, Photometry
+from skyportal.handlers.api.photometry import get_photometry_positions
+from skyportal.utils import (
+    POSITION_COLUMNS,
+    _calculate_best_position_for_offset_stars,
+    _calculate_best_position_from_columns,
+)
+
+
+def reference_best_position(
+    photometry, fallback=(None, None), how="snr2", max_offset=0.5, sigma_clip=4.0
+):
+    """The previous implementation, which builds a DataFrame from the
+    dictionaries of the Photometry objects."""
+    df = pd.DataFrame([x.to_dict() for x in photometry])
+    try:
+        df = df[(df["flux"].notnull()) & (df["fluxerr"].notnull())]
+    except KeyError:
+        return fallback
+    try:
+        med_ra, med_dec = np.nanmedian(df["ra"]), np.nanmedian(df["dec"])
+    except TypeError:
+        return fallback
+    if fallback != (None, None):
+        c1 = SkyCoord(med_ra * u.deg, med_dec * u.deg, frame='icrs')
+        c2 = SkyCoord(fallback[0] * u.deg, fallback[1] * u.deg, frame='icrs')
+        if np.abs(c1.separation(c2)) > max_offset * u.arcsec:
+            return fallback
+    df["ra_offset"] = np.cos(np.radians(df["dec"])) * (df["ra"] - med_ra) * 3600.0
+    df["dec_offset"] = (df["dec"] - med_dec) * 3600.0
+    df["offset_arcsec"] = np.sqrt(df["ra_offset"] ** 2 + df["dec_offset"] ** 2)
+    df = df[df["offset_arcsec"] <= max_offset]
+    if len(df) > 4 and sigma_clip is not None:
+        df = df[df["offset_arcsec"] < sigma_clip * np.std(df["offset_arcsec"])]
+    try:
+        if how == "snr2":
+            df["snr"] = df["flux"] / df["fluxerr"]
+            diff_ra = np.average(df["ra_offset"], weights=df["snr"] ** 2)
+            diff_dec = np.average(df["dec_offset"], weights=df["snr"] ** 2)
+        else:
+            diff_ra = np.average(df["ra_offset"], weights=1 / df["ra_unc"] ** 2)
+            diff_dec = np.average(df["dec_offset"], weights=1 / df["dec_unc"] ** 2)
+    except ZeroDivisionError:
+        return (med_ra, med_dec)
+    if not np.isfinite([diff_ra, diff_dec]).all():
+        return (med_ra, med_dec)
+    return (
+        med_ra + diff_ra / (np.cos(np.radians(med_dec)) * 3600.0),
+        med_dec + diff_dec / 3600.0,
+    )
+
+
+def make_photometry(n_points, rng, ra=10.5, dec=-20.8):
+    """Unsaved Photometry rows scattered around a position, 10% of them
+    non-detections."""
+    flux = rng.uniform(1, 100, n_points)
+    flux[rng.uniform(size=n_points) < 0.1] = np.nan
+    ras = ra + rng.normal(size=n_points) / (10 * 3600) / np.cos(np.radians(dec))
+    decs = dec + rng.normal(size=n_points) / (10 * 3600)
+    return [
+        Photometry(
+            id=i,
+            obj_id='benchmark',
+            mjd=59000.0 + i,
+            flux=f,
+            fluxerr=rng.uniform(0.1, 1),
+            filter='ztfg',
+            ra=r,
+            dec=d,
+            ra_unc=0.2,
+            dec_unc=0.2,
+            origin='',
+        )
+        for i, (f, r, d) in enumerate(zip(flux, ras, decs))
+    ]
+
+
+def timed(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return result, np.median(durations)
+
+
+if __name__ == "__main__":
+    parser.description = (
+        'Measure the cost of estimating the position of a source from its '
+        'photometry with the previous DataFrame-based implementation and '
+        'with the vectorized one, and optionally, of loading the photometry '
+        'of sources in the database as ORM objects or as columns'
+    )
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[100, 1_000, 10_000],
+        help='Number of photometry points of the synthetic sources',
+    )
+    parser.add_argument(
+        '--obj-ids',
+        nargs='*',
+        default=[],
+        help='IDs of sources in the database to time end to end',
+    )
+    parser.add_argument('--repeat', type=int, default=5)
+
+    env, cfg = load_env()
+    rng = np.random.default_rng(0)
+    fallback = (10.5, -20.8)
+
+    print(
+        f'{"points":>8} {"how":>6} {"previous [ms]":>14} '
+        f'{"objects [ms]":>13} {"columns [ms]":>13}'
+    )
+    for n_points in env.sizes:
+        photometry = make_photometry(n_points, rng)
+        columns = {
+            column: np.array([getattr(p, column) for p in photometry], dtype=float)
+            for column in POSITION_COLUMNS
+        }
+        for how in ['snr2', 'invvar']:
+            previous, t_previous = timed(
+                lambda: reference_best_position(photometry, fallback, how),
+                env.repeat,
+            )
+            from_objects, t_objects = timed(
+                lambda: _calculate_best_position_for_offset_stars(
+                    photometry, fallback, how
+                ),
+                env.repeat,
+            )
+            from_columns, t_columns = timed(
+                lambda: _calculate_best_position_from_columns(columns, fallback, how),
+                env.repeat,
+            )
+
+            # check that the output is unchanged
+            np.testing.assert_allclose(from_objects, previous, rtol=0, atol=1e-12)
+            np.testing.assert_allclose(from_columns, previous, rtol=0, atol=1e-12)
+
+            print(
+                f'{n_points:>8} {how:>6} {1e3 * t_previous:>14.2f} '
+                f'{1e3 * t_objects:>13.2f} {1e3 * t_columns:>13.2f}'
+            )
+
+    if env.obj_ids:
+        init_db(**cfg['database'])
+        print(f'\n{"source":>20} {"points":>8} {"ORM [ms]":>9} {"columns [ms]":>13}')
+        for obj_id in env.obj_ids:
+
+            def from_orm():
+                DBSession().expire_all()
+                obj = Obj.query.options(joinedload(Obj.photometry)).get(obj_id)
+                return reference_best_position(
+                    obj.photometry, fallback=(obj.ra, obj.dec)
+                )
+
+            def from_columns():
+                obj = Obj.query.get(obj_id)
+                return _calculate_best_position_from_columns(
+                    get_photometry_positions([obj_id])[obj_id],
+                    fallback=(obj.ra, obj.dec),
+                )
+
+            previous, t_orm = timed(from_orm, env.repeat)
+            current, t_columns = timed(from_columns, env.repeat)
+            np.testing.assert_allclose(current, previous, rtol=0, atol=1e-12)
+            n_points = len(get_photometry_positions([obj_id])[obj_id]['ra'])
+            print(
+                f'{obj_id:>20} {n_points:>8} {1e3 * t_orm:>9.2f} '
+                f'{1e3 * t_columns:>13.2f}'
+            )
+            DBSession().rollback()
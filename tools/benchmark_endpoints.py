@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
+import yaml
+
+from baselayer.app.app_server import handlers as baselayer_handlers
+from baselayer.app.app_server import settings as baselayer_settings
+from baselayer.app.env import load_env, parser
+from skyportal.app_server import make_app
+from skyportal.models import (
+    DBSession,
+    Instrument,
+    ObservingRun,
+    PhotometrySummary,
+    Source,
+    Spectrum,
+)
+from skyportal.tests import api, count_sql_statements
+
+# Tables whose size is recorded with the results, as results are only
+# comparable between datasets of similar size
+DATASET_TABLES = ['objs', 'candidates', 'sources', 'photometry', 'spectra', 'comments']
+
+PERCENTILES = [50, 90, 95, 99]
+
+PAGE_SIZE = 100
+
+
+class RSSMonitor:
+    """Sample the resident set size of this process in a thread, and keep
+    the peak. Falls back to the peak of the process so far where
+    /proc/self/statm is not available."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def rss():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            # kilobytes on Linux, bytes on macOS
+            scale = 1 if sys.platform == 'darwin' else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.rss())
+
+
+def start_app(cfg, env):
+    """Start the app on a free local port, with its IOLoop in a thread.
+
+    Returns
+    -------
+    str
+        The URL of the app.
+    """
+    app = make_app(cfg, baselayer_handlers, baselayer_settings, env=env)
+    sockets = tornado.netutil.bind_sockets(0, 'localhost')
+    port = sockets[0].getsockname()[1]
+    started = threading.Event()
+
+    def serve():
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        server = tornado.httpserver.HTTPServer(app)
+        server.add_sockets(sockets)
+        started.set()
+        tornado.ioloop.IOLoop.current().start()
+
+    threading.Thread(target=serve, daemon=True).start()
+    started.wait()
+    return f'http://localhost:{port}'
+
+
+def make_photometry(obj_id, instrument, i, n_points=100):
+    """New photometry for iteration `i` of an upload benchmark."""
+    rng = np.random.default_rng(i)
+    return {
+        'obj_id': obj_id,
+        'instrument_id': instrument.id,
+        'mjd': (59000 + rng.uniform(0, 365, n_points)).tolist(),
+        'flux': rng.uniform(1, 100, n_points).tolist(),
+        'fluxerr': rng.uniform(0.1, 1, n_points).tolist(),
+        'zp': 23.9,
+        'magsys': 'ab',
+        'filter': instrument.filters[0],
+        'origin': f'benchmark_{uuid.uuid4().hex}',
+        'group_ids': 'all',
+    }
+
+
+def make_benchmarks(obj_ids, spectrum_obj_ids, run_ids, instrument):
+    """Return the benchmarked requests, as a mapping of benchmark names to
+    functions returning the method, endpoint, parameters and data of the
+    request of each iteration."""
+    uploads = []
+
+    def post_photometry(i):
+        uploads.append(make_photometry(obj_ids[i % len(obj_ids)], instrument, i))
+        return 'POST', 'photometry', None, uploads[-1]
+
+    def put_photometry(i):
+        # the photometry posted by the previous benchmark already exists, so
+        # that this measures the deduplication path
+        if len(uploads) == 0:
+            uploads.append(make_photometry(obj_ids[0], instrument, i))
+        return 'PUT', 'photometry', None, uploads[i % len(uploads)]
+
+    def obj(i):
+        return obj_ids[i % len(obj_ids)]
+
+    benchmarks = {
+        'sources.get_single': lambda i: ('GET', f'sources/{obj(i)}', None, None),
+        'sources.get_page': lambda i: (
+            'GET',
+            'sources',
+            {'numPerPage': PAGE_SIZE, 'pageNumber': i % 5 + 1},
+            None,
+        ),
+        'candidates.get_page': lambda i: (
+            'GET',
+            'candidates',
+            {'numPerPage': PAGE_SIZE, 'pageNumber': i % 5 + 1},
+            None,
+        ),
+        'photometry.post': post_photometry,
+        'photometry.put': put_photometry,
+        'sources.photometry.get': lambda i: (
+            'GET',
+            f'sources/{obj(i)}/photometry',
+            None,
+            None,
+        ),
+        'plot.photometry': lambda i: (
+            'GET',
+            f'internal/plot/photometry/{obj(i)}',
+            None,
+            None,
+        ),
+        'newsfeed.get': lambda i: ('GET', 'newsfeed', None, None),
+        'observing_run.get_list': lambda i: ('GET', 'observing_run', None, None),
+    }
+    if len(spectrum_obj_ids) > 0:
+        benchmarks['plot.spectroscopy'] = lambda i: (
+            'GET',
+            f'internal/plot/spectroscopy/{spectrum_obj_ids[i % len(spectrum_obj_ids)]}',
+            None,
+            None,
+        )
+    if len(run_ids) > 0:
+        benchmarks['observing_run.get_single'] = lambda i: (
+            'GET',
+            f'observing_run/{run_ids[i % len(run_ids)]}',
+            None,
+            None,
+        )
+    return benchmarks
+
+
+def run_benchmark(request, host, token, repeat, warmup):
+    """Time the requests of a benchmark, and count their SQL statements.
+
+    Returns
+    -------
+    dict
+        Latency percentiles [ms], SQL statements per request, peak RSS of
+        the process [MB] and number of failed requests.
+    """
+    for i in range(warmup):
+        method, endpoint, params, data = request(i)
+        api(method, endpoint, data=data, params=params, host=host, token=token)
+
+    latencies = []
+    statement_counts = []
+    failures = 0
+    with RSSMonitor() as monitor:
+        for i in range(warmup, warmup + repeat):
+            method, endpoint, params, data = request(i)
+            with count_sql_statements(DBSession()) as statements:
+                start = time.perf_counter()
+                status, response = api(
+                    method, endpoint, data=data, params=params, host=host, token=token
+                )
+                latencies.append(1000 * (time.perf_counter() - start))
+            statement_counts.append(len(statements))
+            if status != 200:
+                failures += 1
+
+    return {
+        'requests': repeat,
+        'failures': failures,
+        'latency_ms': {
+            **{
+                f'p{q}': float(value)
+                for q, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES))
+            },
+            'mean': float(np.mean(latencies)),
+            'max': float(np.max(latencies)),
+        },
+        'sql_statements': {
+            'median': float(np.median(statement_counts)),
+            'max': int(np.max(statement_counts)),
+        },
+        'peak_rss_mb': monitor.peak / 2 ** 20,
+    }
+
+
+def compare(results, baseline, tolerance, min_latency_delta):
+    """Return the regressions of `results` with respect to `baseline`: a
+    latency percentile or the peak RSS above the baseline by more than
+    `tolerance` (relative), or more SQL statements per request."""
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        reference = baseline['benchmarks'].get(name)
+        if reference is None:
+            continue
+        for key in ['p50', 'p95']:
+            value = result['latency_ms'][key]
+            previous = reference['latency_ms'][key]
+            if (
+                value > previous * (1 + tolerance)
+                and value - previous > min_latency_delta
+            ):
+                regressions.append(
+                    f'{name}: {key} latency {value:.1f} ms (baseline {previous:.1f} ms)'
+                )
+        value = result['sql_statements']['median']
+        previous = reference['sql_statements']['median']
+        if value > previous:
+            regressions.append(
+                f'{name}: {value:.0f} SQL statements per request '
+                f'(baseline {previous:.0f})'
+            )
+        value = result['peak_rss_mb']
+        previous = reference['peak_rss_mb']
+        if value > previous * (1 + tolerance):
+            regressions.append(
+                f'{name}: peak RSS {value:.0f} MB (baseline {previous:.0f} MB)'
+            )
+        if result['failures'] > reference['failures']:
+            regressions.append(
+                f'{name}: {result["failures"]} failed requests '
+                f'(baseline {reference["failures"]})'
+            )
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser.description = (
+        'Start the app in this process and measure the latency percentiles, '
+        'SQL statements per request and peak RSS of the main API endpoints, '
+        'on the sources of the database, e.g., generated with '
+        'tools/generate_dataset.py. Photometry is posted to these sources, '
+        'so run it against a scratch database. Results are written as JSON, '
+        'and compared with those of a previous run to flag regressions.'
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=20, help='Number of timed requests per endpoint'
+    )
+    parser.add_argument(
+        '--warmup',
+        type=int,
+        default=2,
+        help='Number of untimed requests per endpoint, e.g., to fill caches',
+    )
+    parser.add_argument(
+        '--objs', type=int, default=10, help='Number of sources the requests rotate on'
+    )
+    parser.add_argument(
+        '--only', nargs='+', help='Names of the benchmarks to run; defaults to all'
+    )
+    parser.add_argument(
+        '--output',
+        default='benchmark_results.json',
+        help='File to write the results to',
+    )
+    parser.add_argument('--baseline', help='Results of a previous run to compare to')
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.2,
+        help='Relative increase of the latency or peak RSS over the baseline '
+        'flagged as a regression',
+    )
+    parser.add_argument(
+        '--min-latency-delta',
+        type=float,
+        default=5.0,
+        help='Smallest latency increase flagged as a regression, in ms',
+    )
+
+    env, cfg = load_env()
+    host = start_app(cfg, env)
+    token = yaml.load(open('.tokens.yaml'), Loader=yaml.Loader)['INITIAL_ADMIN']
+
+    session = DBSession()
+    obj_ids = [
+        obj_id
+        for obj_id, in session.query(Source.obj_id)
+        .filter(Source.obj_id.in_(session.query(PhotometrySummary.obj_id).distinct()))
+        .distinct()
+        .limit(env.objs)
+    ]
+    if len(obj_ids) == 0:
+        print(
+            'Error: no sources with photometry found; generate a dataset with '
+            'tools/generate_dataset.py first'
+        )
+        sys.exit(-1)
+    spectrum_obj_ids = [
+        obj_id for obj_id, in session.query(Spectrum.obj_id).distinct().limit(env.objs)
+    ]
+    run_ids = [id for id, in session.query(ObservingRun.id).limit(env.objs)]
+    instrument = next(
+        (i for i in session.query(Instrument) if len(i.filters) > 0), None
+    )
+    if instrument is None:
+        print('Error: no instrument with filters found')
+        sys.exit(-1)
+    dataset = {
+        table: int(rows)
+        for table, rows in session.execute(
+            'SELECT relname, reltuples FROM pg_class WHERE relname = ANY(:tables)',
+            {'tables': DATASET_TABLES},
+        )
+    }
+    session.commit()
+
+    benchmarks = make_benchmarks(obj_ids, spectrum_obj_ids, run_ids, instrument)
+    if env.only is not None:
+        benchmarks = {
+            name: request for name, request in benchmarks.items() if name in env.only
+        }
+
+    results = {
+        'created_at': datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'dataset': dataset,
+        'settings': {'repeat': env.repeat, 'warmup': env.warmup, 'objs': env.objs},
+        'benchmarks': {},
+    }
+    print(
+        f'{"benchmark":<26} {"p50 [ms]":>9} {"p95 [ms]":>9} {"p99 [ms]":>9} '
+        f'{"SQL":>5} {"RSS [MB]":>9} {"failed":>6}'
+    )
+    for name, request in benchmarks.items():
+        result = run_benchmark(request, host, token, env.repeat, env.warmup)
+        results['benchmarks'][name] = result
+        latency = result['latency_ms']
+        print(
+            f'{name:<26} {latency["p50"]:>9.1f} {latency["p95"]:>9.1f} '
+            f'{latency["p99"]:>9.1f} {result["sql_statements"]["median"]:>5.0f} '
+            f'{result["peak_rss_mb"]:>9.0f} {result["failures"]:>6}'
+        )
+
+    with open(env.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {env.output}')
+
+    if env.baseline is not None:
+        with open(env.baseline) as f:
+            baseline = json.load(f)
+        for table, rows in dataset.items():
+            previous = baseline['dataset'].get(table)
+            if previous is not None and abs(rows - previous) > 0.1 * max(previous, 1):
+                print(
+                    f'Warning: the baseline has {previous} {table} rows instead '
+                    f'of {rows}; results may not be comparable'
+                )
+        regressions = compare(results, baseline, env.tolerance, env.min_latency_delta)
+        if len(regressions) > 0:
+            print('\nRegressions:')
+            print('------------')
+            print('\n'.join(regressions))
+            sys.exit(-1)
+        print(f'No regressions with respect to {env.baseline}')
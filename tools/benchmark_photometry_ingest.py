@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+import sys
+import textwrap
+import time
+import uuid
+
+import numpy as np
+import yaml
+
+from baselayer.app.env import load_env, parser
+from skyportal.tests import api
+
+
+def make_photometry(obj_id, instrument_id, filter, n_points, rng):
+    """Random flux-space photometry for a single object."""
+    return {
+        'obj_id': obj_id,
+        'instrument_id': instrument_id,
+        'mjd': (59000 + rng.uniform(0, 365, n_points)).tolist(),
+        'flux': rng.uniform(1, 100, n_points).tolist(),
+        'fluxerr': rng.uniform(0.1, 1, n_points).tolist(),
+        'zp': 23.9,
+        'magsys': 'ab',
+        'filter': filter,
+        'origin': [str(uuid.uuid4()) for _ in range(n_points)],
+        'group_ids': 'all',
+    }
+
+
+if __name__ == "__main__":
+    parser.description = (
+        'Compare the throughput of the row-by-row and COPY-based photometry '
+        'ingest paths of a running SkyPortal instance. Each upload goes to a '
+        'new source named benchmark_<uuid>, so run it against a scratch database.'
+    )
+    parser.add_argument(
+        '--host',
+        help=textwrap.dedent(
+            '''Fully specified URI of the running SkyPortal instance.
+               Defaults to http://localhost on the port specified in the
+               SkyPortal configuration file.'''
+        ),
+    )
+    parser.add_argument(
+        '--token',
+        help='Token used to access the API; defaults to the admin token in '
+        '.tokens.yaml',
+    )
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[1_000, 10_000, 100_000],
+        help='Number of photometry points per upload',
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3, help='Number of uploads per size and path'
+    )
+
+    env, cfg = load_env()
+
+    token = env.token
+    if token is None:
+        token = yaml.load(open('.tokens.yaml'), Loader=yaml.Loader)['INITIAL_ADMIN']
+
+    status, data = api('GET', 'instrument', token=token, host=env.host)
+    if status != 200:
+        print(f'Error: could not list instruments (HTTP status {status})')
+        sys.exit(-1)
+    instruments = [i for i in data['data'] if len(i['filters']) > 0]
+    if len(instruments) == 0:
+        print('Error: no instrument with filters found; load the seed data first')
+        sys.exit(-1)
+    instrument = instruments[0]
+
+    rng = np.random.default_rng()
+    print(f'{"points":>8} {"path":>6} {"rows/s":>10} {"median [s]":>11}')
+    for n_points in env.sizes:
+        for bulk in [False, True]:
+            durations = []
+            for _ in range(env.repeat):
+                obj_id = f'benchmark_{uuid.uuid4().hex}'
+                status, data = api(
+                    'POST',
+                    'sources',
+                    data={'id': obj_id, 'ra': rng.uniform(0, 360), 'dec': 0.0},
+                    token=token,
+                    host=env.host,
+                )
+                assert status == 200, data
+
+                photometry = make_photometry(
+                    obj_id, instrument['id'], instrument['filters'][0], n_points, rng
+                )
+                start = time.perf_counter()
+                status, data = api(
+                    'POST',
+                    'photometry',
+                    data=photometry,
+                    params={'bulk': bulk},
+                    token=token,
+                    host=env.host,
+                )
+                durations.append(time.perf_counter() - start)
+                assert status == 200, data
+
+            median = np.median(durations)
+            path = 'copy' if bulk else 'rows'
+            print(f'{n_points:>8} {path:>6} {n_points / median:>10.0f} {median:>11.3f}')
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+import time
+
+import numpy as np
+import sncosmo
+
+from baselayer.app.env import load_env, parser
+from skyportal.models import Instrument, Photometry, PHOT_ZP
+from skyportal.handlers.api.photometry import (
+    nan_to_none,
+    serialize,
+    serialize_photometry,
+)
+
+
+def reference_serialize(phot, outsys, format):
+    """The previous row-by-row serializer, which looks up the magnitude
+    systems and bandpass zeropoints for every row."""
+    return_value = {'id': phot.id, 'filter': phot.filter}
+    magsys_db = sncosmo.get_magsystem('ab')
+    outsys = sncosmo.get_magsystem(outsys)
+    relzp_out = 2.5 * np.log10(outsys.zpbandflux(phot.filter))
+    relzp_db = 2.5 * np.log10(magsys_db.zpbandflux(phot.filter))
+    db_correction = relzp_out - relzp_db
+    corrected_db_zp = PHOT_ZP + db_correction
+    if format == 'mag':
+        maglimit_out = -2.5 * np.log10(5 * phot.fluxerr) + corrected_db_zp
+        return_value.update(
+            {
+                'mag': phot.mag + db_correction
+                if nan_to_none(phot.mag) is not None
+                else None,
+                'magerr': phot.e_mag if nan_to_none(phot.e_mag) is not None else None,
+                'magsys': outsys.name,
+                'limiting_mag': maglimit_out,
+            }
+        )
+    else:
+        return_value.update(
+            {
+                'flux': nan_to_none(phot.flux),
+                'magsys': outsys.name,
+                'zp': corrected_db_zp,
+                'fluxerr': phot.fluxerr,
+            }
+        )
+    return return_value
+
+
+def make_photometry(n_points, rng):
+    """Unsaved Photometry rows in three filters, 10% of them non-detections."""
+    instrument = Instrument(name='benchmark', filters=['ztfg', 'ztfr', 'ztfi'])
+    flux = rng.uniform(1, 100, n_points)
+    flux[rng.uniform(size=n_points) < 0.1] = np.nan
+    return [
+        Photometry(
+            id=i,
+            obj_id='benchmark',
+            instrument=instrument,
+            mjd=59000.0 + i,
+            flux=f,
+            fluxerr=rng.uniform(0.1, 1),
+            filter=rng.choice(instrument.filters),
+            origin='',
+        )
+        for i, f in enumerate(flux)
+    ]
+
+
+def timed(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return result, np.median(durations)
+
+
+if __name__ == "__main__":
+    parser.description = (
+        'Measure the per-point cost of serializing photometry with the '
+        'vectorized serializer, one row at a time, and with the previous '
+        'implementation'
+    )
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[100, 1_000, 10_000],
+        help='Number of photometry points to serialize',
+    )
+    parser.add_argument('--repeat', type=int, default=5)
+
+    env, cfg = load_env()
+    rng = np.random.default_rng(0)
+
+    print(
+        f'{"points":>8} {"format":>6} {"magsys":>6} '
+        f'{"previous [µs/pt]":>17} {"per row [µs/pt]":>16} {"vectorized [µs/pt]":>19}'
+    )
+    for n_points in env.sizes:
+        photometry = make_photometry(n_points, rng)
+        for format in ['mag', 'flux']:
+            for magsys in ['ab', 'vega']:
+                previous, t_previous = timed(
+                    lambda: [
+                        reference_serialize(p, magsys, format) for p in photometry
+                    ],
+                    env.repeat,
+                )
+                _, t_per_row = timed(
+                    lambda: [serialize(p, magsys, format) for p in photometry],
+                    env.repeat,
+                )
+                vectorized, t_vectorized = timed(
+                    lambda: serialize_photometry(photometry, magsys, format),
+                    env.repeat,
+                )
+
+                # check that the output is unchanged
+                for old, new in zip(previous, vectorized):
+                    for key, value in old.items():
+                        if value is None:
+                            assert new[key] is None, (key, old, new)
+                        elif isinstance(value, float):
+                            np.testing.assert_allclose(new[key], value)
+                        else:
+                            assert new[key] == value, (key, old, new)
+
+                print(
+                    f'{n_points:>8} {format:>6} {magsys:>6} '
+                    f'{1e6 * t_previous / n_points:>17.2f} '
+                    f'{1e6 * t_per_row / n_points:>16.2f} '
+                    f'{1e6 * t_vectorized / n_points:>19.2f}'
+                )
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from baselayer.app.env import load_env, parser
+from skyportal.models import Instrument, Spectrum, Telescope
+from skyportal.plot import (
+    get_errorbar_segments,
+    get_photometry_labels,
+    get_spectra_data,
+)
+
+
+def reference_photometry_preparation(data):
+    """The previous row-by-row construction of the labels and flux error
+    bars of the photometry plot."""
+    labels = []
+    for i, datarow in data.iterrows():
+        label = f'{datarow["instrument"]}/{datarow["filter"]}'
+        if datarow['origin'] is not None:
+            label += f'/{datarow["origin"]}'
+        labels.append(label)
+
+    y_err_x = []
+    y_err_y = []
+    for d, ro in data.iterrows():
+        px = ro['mjd']
+        py = ro['flux']
+        err = ro['fluxerr']
+
+        y_err_x.append((px, px))
+        y_err_y.append((py - err, py + err))
+    return labels, y_err_x, y_err_y
+
+
+def photometry_preparation(data):
+    labels = get_photometry_labels(data)
+    y_err_x, y_err_y = get_errorbar_segments(data['mjd'], data['flux'], data['fluxerr'])
+    return labels, y_err_x, y_err_y
+
+
+def reference_spectra_preparation(spectra):
+    """The previous spectrum-by-spectrum construction of the spectroscopy
+    plot data, with a second pass for smoothing."""
+    data = []
+    for i, s in enumerate(spectra):
+        normfac = np.nanmedian(np.abs(s.fluxes))
+        normfac = normfac if normfac != 0.0 else 1e-20
+
+        df = pd.DataFrame(
+            {
+                'wavelength': s.wavelengths,
+                'flux': s.fluxes / normfac,
+                'id': s.id,
+                'telescope': s.instrument.telescope.name,
+                'instrument': s.instrument.name,
+                'date_observed': s.observed_at.isoformat(sep=' ', timespec='seconds'),
+                'pi': "",
+            }
+        )
+        data.append(df)
+    data = pd.concat(data)
+
+    data.sort_values(by=['date_observed', 'wavelength'], inplace=True)
+
+    dfs = []
+    for i, s in enumerate(spectra):
+        df = (
+            pd.DataFrame({'wavelength': s.wavelengths, 'flux': s.fluxes})
+            .rolling(2)
+            .mean(numeric_only=True)
+            .dropna()
+        )
+        dfs.append(df)
+
+    smoothed_data = pd.concat(dfs)
+    return data, smoothed_data['flux']
+
+
+def make_photometry(n_points, rng):
+    """A light curve shaped like the query result of `photometry_plot`."""
+    return pd.DataFrame(
+        {
+            'instrument': rng.choice(['ZTF', 'SEDM'], n_points),
+            'filter': rng.choice(['ztfg', 'ztfr', 'ztfi'], n_points),
+            'origin': rng.choice([None, 'forced_photometry'], n_points),
+            'mjd': 59000.0 + np.sort(rng.uniform(0, 365, n_points)),
+            'flux': rng.uniform(1, 100, n_points),
+            'fluxerr': rng.uniform(0.1, 1, n_points),
+        }
+    )
+
+
+def make_spectra(n_spectra, n_wavelengths, rng):
+    """Unsaved Spectra of a single object, with a few missing fluxes."""
+    instrument = Instrument(
+        name='benchmark', telescope=Telescope(name='benchmark', nickname='bench')
+    )
+    spectra = []
+    for i in range(n_spectra):
+        fluxes = rng.normal(1, 0.1, n_wavelengths)
+        fluxes[rng.uniform(size=n_wavelengths) < 0.01] = np.nan
+        spectra.append(
+            Spectrum(
+                id=i,
+                wavelengths=np.linspace(3500, 9000, n_wavelengths),
+                fluxes=fluxes,
+                obj_id='benchmark',
+                instrument=instrument,
+                observed_at=datetime(2021, 1, 1) + timedelta(days=i),
+            )
+        )
+    return spectra
+
+
+def timed(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return result, np.median(durations)
+
+
+if __name__ == "__main__":
+    parser.description = (
+        'Measure the cost of preparing the data of the photometry and '
+        'spectroscopy plots with the vectorized helpers and with the '
+        'previous implementation'
+    )
+    parser.add_argument(
+        '--points',
+        type=int,
+        default=10_000,
+        help='Number of points in the light curve',
+    )
+    parser.add_argument(
+        '--spectra', type=int, default=20, help='Number of spectra of the object'
+    )
+    parser.add_argument(
+        '--wavelengths',
+        type=int,
+        default=2_000,
+        help='Number of wavelengths per spectrum',
+    )
+    parser.add_argument('--repeat', type=int, default=5)
+
+    env, cfg = load_env()
+    rng = np.random.default_rng(0)
+
+    photometry = make_photometry(env.points, rng)
+    (labels, xs, ys), t_previous = timed(
+        lambda: reference_photometry_preparation(photometry), env.repeat
+    )
+    (new_labels, new_xs, new_ys), t_vectorized = timed(
+        lambda: photometry_preparation(photometry), env.repeat
+    )
+
+    # check that the output is unchanged
+    assert list(new_labels) == labels
+    np.testing.assert_allclose(new_xs, xs)
+    np.testing.assert_allclose(new_ys, ys)
+
+    print(f'Photometry plot, {env.points} points')
+    print(f'    previous:   {1e3 * t_previous:9.2f} ms')
+    print(f'    vectorized: {1e3 * t_vectorized:9.2f} ms')
+
+    spectra = make_spectra(env.spectra, env.wavelengths, rng)
+    (data, smoothed), t_previous = timed(
+        lambda: reference_spectra_preparation(spectra), env.repeat
+    )
+    (new_data, new_smoothed), t_vectorized = timed(
+        lambda: get_spectra_data(spectra), env.repeat
+    )
+
+    pd.testing.assert_frame_equal(
+        new_data.reset_index(drop=True),
+        data.reset_index(drop=True),
+        check_dtype=False,
+    )
+    np.testing.assert_allclose(new_smoothed.to_numpy(), smoothed.to_numpy())
+
+    print(f'Spectroscopy plot, {env.spectra} spectra of {env.wavelengths} points')
+    print(f'    previous:   {1e3 * t_previous:9.2f} ms')
+    print(f'    vectorized: {1e3 * t_vectorized:9.2f} ms')
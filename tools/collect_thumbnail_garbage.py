@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+import os
+import time
+
+from baselayer.app.env import load_env, parser
+from skyportal.models import init_db, DBSession, Thumbnail
+from skyportal.handlers.api.thumbnail import thumbnail_store
+
+
+if __name__ == "__main__":
+    parser.description = (
+        'Remove the uploaded thumbnail files, and their WebP and downscaled '
+        'variants, that no Thumbnail refers to anymore'
+    )
+    parser.add_argument(
+        '--min-age',
+        type=float,
+        default=1.0,
+        help='Keep files modified less than this number of hours ago, which '
+        'may belong to uploads in progress',
+    )
+
+    env, cfg = load_env()
+    init_db(**cfg['database'])
+
+    file_uris = {
+        os.path.abspath(file_uri)
+        for file_uri, in DBSession()
+        .query(Thumbnail.file_uri)
+        .filter(Thumbnail.file_uri.isnot(None))
+        .distinct()
+    }
+    referenced_digests = {
+        thumbnail_store.digest_of(file_uri) for file_uri in file_uris
+    } - {None}
+
+    min_age = env.min_age * 3600
+    removed = thumbnail_store.collect_garbage(referenced_digests, min_age=min_age)
+
+    # files named after their Obj and type, as uploaded before thumbnails
+    # were stored by digest
+    now = time.time()
+    for path in thumbnail_store.root.glob('*.png'):
+        if os.path.abspath(path) in file_uris:
+            continue
+        if now - path.stat().st_mtime >= min_age:
+            os.remove(path)
+            removed += 1
+
+    print(f'Removed {removed} unreferenced thumbnail files')
@@ -3,8 +3,10 @@
 import os
 import sys
 import base64
+import json
 import textwrap
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from os.path import join as pjoin
 
 import requests
@@ -15,6 +17,78 @@ from yaml import Loader
 from baselayer.app.env import load_env, parser
 from skyportal.tests import api
 
+# Endpoints with a variant that accepts many objects per request, and the key
+# of the list of objects in the posted data
+BATCH_ENDPOINTS = {
+    'candidates': ('candidates/bulk', 'candidates'),
+    'thumbnail': ('thumbnail/bulk', 'thumbnails'),
+}
+
+
+def chunks(items, size):
+    """Split a list into lists of up to `size` items."""
+    starts = range(0, len(items), max(size, 1))
+    return [items[start:end] for start, end in zip(starts, [*starts[1:], None])]
+
+
+def find_references(obj):
+    """Return the names of the references (strings starting with `=`) used by
+    an object to post."""
+    if isinstance(obj, dict):
+        return set().union(*[find_references(v) for v in obj.values()])
+    elif isinstance(obj, list):
+        return set().union(*[find_references(item) for item in obj])
+    elif isinstance(obj, str) and obj.startswith('='):
+        return {obj[1:]}
+    return set()
+
+
+def merge_photometry(uploads):
+    """Merge photometry uploads with the same fields, groups and assignment
+    into single uploads, with one value per point for each field.
+
+    Returns
+    -------
+    list of (list of int, dict)
+        The indices of the merged uploads, and the merged upload.
+    """
+    groups = {}
+    for i, upload in enumerate(uploads):
+        if isinstance(upload.get('altdata'), dict):
+            key = i
+        else:
+            key = (
+                tuple(sorted(upload)),
+                json.dumps(upload.get('group_ids'), sort_keys=True),
+                upload.get('assignment_id'),
+            )
+        groups.setdefault(key, []).append(i)
+
+    merged = []
+    for indices in groups.values():
+        if len(indices) == 1:
+            merged.append((indices, uploads[indices[0]]))
+            continue
+        shared = {
+            k: v
+            for k, v in uploads[indices[0]].items()
+            if k in ('group_ids', 'assignment_id')
+        }
+        frames = []
+        for i in indices:
+            columns = {k: v for k, v in uploads[i].items() if k not in shared}
+            n_points = max(
+                [len(v) for v in columns.values() if isinstance(v, list)], default=1
+            )
+            frames.append(pd.DataFrame(columns, index=range(n_points)))
+        merged.append(
+            (
+                indices,
+                {**pd.concat(frames, ignore_index=True).to_dict('list'), **shared},
+            )
+        )
+    return merged
+
 
 if __name__ == "__main__":
     parser.description = 'Load data into SkyPortal'
@@ -42,15 +116,22 @@ if __name__ == "__main__":
         ),
     )
 
-    env, cfg = load_env()
-
-    # TODO: load multiple files
-    if len(env.data_files) > 1:
-        raise NotImplementedError("Cannot yet handle multiple data files")
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Number of concurrent requests. Objects of an endpoint are '
+        'posted concurrently, after the objects whose references they use',
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=100,
+        help='Number of candidates, thumbnails or photometry uploads posted '
+        'per request to the bulk endpoints',
+    )
 
-    fname = env.data_files[0]
-    src = yaml.load(open(fname, "r"), Loader=Loader)
-    src_path = os.path.dirname(fname)
+    env, cfg = load_env()
 
     def get_token():
         if env.token:
@@ -164,28 +245,32 @@ if __name__ == "__main__":
         else:
             return obj
 
-    for endpoint, to_post in src.items():
-        # Substitute references in path
-        endpoint_parts = endpoint.split('/')
-        try:
-            for i, part in enumerate(endpoint_parts):
-                if part.startswith('='):
-                    endpoint_parts[i] = str(references[part[1:]])
-        except KeyError:
-            print(
-                f'\nReference {part[1:]} not found while interpolating endpoint {endpoint}; skipping'
-            )
-            continue
-
-        endpoint = '/'.join(endpoint_parts)
-
-        print(f'Posting to {endpoint}: ', end='')
-        if 'file' in to_post:
-            filename = pjoin(src_path, to_post['file'])
-            post_objs = yaml.load(open(filename, 'r'), Loader=yaml.Loader)
+    def make_requests(endpoint, items, indices):
+        """Return the requests posting some of the objects of an endpoint,
+        as (indices of the objects, endpoint, data) tuples. Objects whose
+        response holds references are posted one by one."""
+        singles = [i for i in indices if items[i][1]]
+        batchable = [i for i in indices if not items[i][1]]
+        requests = []
+        if endpoint in BATCH_ENDPOINTS:
+            batch_endpoint, key = BATCH_ENDPOINTS[endpoint]
+            for chunk in chunks(batchable, env.batch_size):
+                data = {key: [items[i][0] for i in chunk]}
+                requests.append((chunk, batch_endpoint, data))
+        elif endpoint == 'photometry':
+            for chunk in chunks(batchable, env.batch_size):
+                for group, data in merge_photometry([items[i][0] for i in chunk]):
+                    requests.append(([chunk[j] for j in group], endpoint, data))
         else:
-            post_objs = to_post
-
+            singles = indices
+        requests.extend(([i], endpoint, items[i][0]) for i in singles)
+        return requests
+
+    def post_objects(endpoint, post_objs, executor):
+        """Post the objects of an endpoint concurrently, each as soon as the
+        references it uses are saved. Returns the number of objects and of
+        requests."""
+        items = []
         for obj in post_objs:
             # Fields that start with =, such as =id, get saved for using as
             # references later on
@@ -193,26 +278,111 @@ if __name__ == "__main__":
 
             # Remove all such fields from the object to be posted
             obj = {k: v for k, v in obj.items() if not k.startswith('=')}
+            items.append((obj, saved_fields, find_references(obj)))
+
+        # references saved by objects of this endpoint, which the objects
+        # using them wait for
+        defined_here = {name for _, saved_fields, _ in items for name in saved_fields}
+
+        n_requests = 0
+        pending = list(range(len(items)))
+        running = {}
+        while pending or running:
+            ready = [
+                i
+                for i in pending
+                if not (items[i][2] - references.keys()) & defined_here
+            ]
+            if not ready and not running:
+                # the objects defining the missing references failed
+                ready = pending
+            pending = [i for i in pending if i not in ready]
+
+            injected = []
+            for i in ready:
+                # Replace all references of the format field: =key or
+                # [=key, ..] with the appropriate reference value
+                try:
+                    inject_references(items[i][0])
+                except KeyError:
+                    continue
+                injected.append(i)
+
+            for indices, request_endpoint, data in make_requests(
+                endpoint, items, injected
+            ):
+                running[executor.submit(post, request_endpoint, data)] = indices
+                n_requests += 1
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                indices = running.pop(future)
+                status, response = future.result()
 
-            # Replace all references of the format field: =key or [=key, ..]
-            # with the appropriate reference value
+                print(
+                    ('.' if status == 200 else 'X') * len(indices), end='', flush=True
+                )
+                if status != 200:
+                    message = response['message'] if response else f'HTTP {status}'
+                    error_log.append(f"/{endpoint}: {message}")
+                    continue
+
+                # Save all references from the response
+                for i in indices:
+                    for target, field in items[i][1].items():
+                        references[target] = response['data'][field]
+
+        return len(items), n_requests
+
+    executor = ThreadPoolExecutor(max_workers=env.workers)
+    total_objects = total_requests = 0
+    start = time.perf_counter()
+    for fname in env.data_files:
+        src = yaml.load(open(fname, "r"), Loader=Loader)
+        src_path = os.path.dirname(fname)
+
+        # Endpoints are posted to in order, as objects may depend on objects
+        # posted before them without references, e.g., comments on sources
+        for endpoint, to_post in src.items():
+            # Substitute references in path
+            endpoint_parts = endpoint.split('/')
             try:
-                inject_references(obj)
+                for i, part in enumerate(endpoint_parts):
+                    if part.startswith('='):
+                        endpoint_parts[i] = str(references[part[1:]])
             except KeyError:
+                print(
+                    f'\nReference {part[1:]} not found while interpolating endpoint {endpoint}; skipping'
+                )
                 continue
 
-            status, response = post(endpoint, data=obj)
-
-            print('.' if status == 200 else 'X', end='')
-            if status != 200:
-                error_log.append(f"/{endpoint}: {response['message']}")
-                continue
+            endpoint = '/'.join(endpoint_parts)
 
-            # Save all references from the response
-            for target, field in saved_fields.items():
-                references[target] = response['data'][field]
+            print(f'Posting to {endpoint}: ', end='', flush=True)
+            if 'file' in to_post:
+                filename = pjoin(src_path, to_post['file'])
+                post_objs = yaml.load(open(filename, 'r'), Loader=yaml.Loader)
+            else:
+                post_objs = to_post
 
-        print()
+            endpoint_start = time.perf_counter()
+            n_objects, n_requests = post_objects(endpoint, post_objs, executor)
+            duration = time.perf_counter() - endpoint_start
+            print(
+                f' {n_objects} objects in {n_requests} requests, {duration:.2f} s '
+                f'({n_objects / max(duration, 1e-9):.0f} objects/s)'
+            )
+            total_objects += n_objects
+            total_requests += n_requests
+
+    executor.shutdown()
+    duration = time.perf_counter() - start
+    print(
+        f'\nPosted {total_objects} objects in {total_requests} requests, '
+        f'{duration:.2f} s ({total_objects / max(duration, 1e-9):.0f} objects/s)'
+    )
 
     if error_log:
         print("\nError log:")
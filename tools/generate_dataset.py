@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+
+import multiprocessing
+import sys
+import time
+
+from baselayer.app.env import load_env, parser
+from skyportal.models import (
+    init_db,
+    DBSession,
+    Filter,
+    Group,
+    Instrument,
+    User,
+)
+from skyportal.synthetic_data import DatasetGenerator
+
+# Number of Objs per unit of --scale; at the default rates, a unit of scale
+# is about a million photometry points
+OBJS_PER_SCALE = 10_000
+
+TABLES = [
+    'objs',
+    'candidates',
+    'sources',
+    'photometry',
+    'group_photometry',
+    'spectra',
+    'group_spectra',
+    'comments',
+    'group_comments',
+    'photometry_summaries',
+]
+
+generator = None
+
+
+def init_worker(database_cfg, user_id, group_ids, filter_ids, instrument_ids, kwargs):
+    """Connect to the database and create the generator of a process."""
+    global generator
+
+    init_db(**database_cfg)
+    session = DBSession()
+    generator = DatasetGenerator(
+        session.query(User).get(user_id),
+        session.query(Group).filter(Group.id.in_(group_ids)).all(),
+        session.query(Filter).filter(Filter.id.in_(filter_ids)).all(),
+        session.query(Instrument).filter(Instrument.id.in_(instrument_ids)).all(),
+        **kwargs,
+    )
+
+
+def generate_chunk(chunk):
+    """Write a range of Objs in one transaction."""
+    start, n_objs = chunk
+    chunk_start = time.perf_counter()
+    try:
+        counts = generator.generate(start, n_objs)
+        DBSession().commit()
+    except Exception:
+        DBSession().rollback()
+        raise
+    return counts, time.perf_counter() - chunk_start
+
+
+if __name__ == "__main__":
+    parser.description = (
+        'Fill the database with synthetic Objs, Candidates, Sources, '
+        'Photometry, Spectra and Comments shared with groups, written with '
+        'COPY, to benchmark SkyPortal against tables of realistic size. Run '
+        'it against a scratch database, after loading the seed or demo data '
+        'that provides the users, groups, filters and instruments.'
+    )
+    parser.add_argument(
+        '--scale',
+        type=float,
+        default=1.0,
+        help=f'Size of the dataset, in units of {OBJS_PER_SCALE} Objs '
+        '(about a million photometry points with the default rates)',
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Seed of the random data, which also determines the Obj IDs '
+        '(synth<seed>_<index>)',
+    )
+    parser.add_argument(
+        '--first-index',
+        type=int,
+        default=0,
+        help='Index of the first Obj, to extend an existing dataset',
+    )
+    parser.add_argument(
+        '--user-id', type=int, required=True, help='ID of the owner of the data'
+    )
+    parser.add_argument(
+        '--group-ids',
+        type=int,
+        nargs='*',
+        help='Groups to save Sources to and share data with; defaults to '
+        'all groups but single user groups',
+    )
+    parser.add_argument(
+        '--filter-ids',
+        type=int,
+        nargs='*',
+        help='Filters of the Candidates; defaults to all filters',
+    )
+    parser.add_argument(
+        '--instrument-ids',
+        type=int,
+        nargs='*',
+        help='Instruments of the Photometry (those with filters) and of the '
+        'Spectra (spectrographs); defaults to all instruments',
+    )
+    parser.add_argument(
+        '--photometry-per-obj',
+        type=float,
+        default=100,
+        help='Mean number of photometry points per Obj',
+    )
+    parser.add_argument(
+        '--cadence',
+        type=float,
+        default=2.0,
+        help='Mean interval between photometry points, in days',
+    )
+    parser.add_argument(
+        '--candidate-fraction',
+        type=float,
+        default=0.5,
+        help='Fraction of Objs that passed filters',
+    )
+    parser.add_argument(
+        '--source-fraction',
+        type=float,
+        default=0.1,
+        help='Fraction of Objs saved as Sources',
+    )
+    parser.add_argument(
+        '--spectrum-fraction',
+        type=float,
+        default=0.02,
+        help='Fraction of Objs with one or two Spectra',
+    )
+    parser.add_argument(
+        '--comments-per-obj',
+        type=float,
+        default=0.2,
+        help='Mean number of Comments per Obj',
+    )
+    parser.add_argument(
+        '--spectrum-points',
+        type=int,
+        default=1000,
+        help='Number of wavelengths of each Spectrum',
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=10_000,
+        help='Number of Objs written per transaction',
+    )
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=1,
+        help='Number of processes writing chunks concurrently',
+    )
+
+    env, cfg = load_env()
+    init_db(**cfg['database'])
+
+    if DBSession().query(User).get(env.user_id) is None:
+        print(f'Error: User {env.user_id} does not exist')
+        sys.exit(-1)
+    group_ids = env.group_ids
+    if group_ids is None:
+        group_ids = [
+            id
+            for id, in DBSession()
+            .query(Group.id)
+            .filter(Group.single_user_group.isnot(True))
+        ]
+    filter_ids = env.filter_ids
+    if filter_ids is None:
+        filter_ids = [id for id, in DBSession().query(Filter.id)]
+    instrument_ids = env.instrument_ids
+    if instrument_ids is None:
+        instrument_ids = [id for id, in DBSession().query(Instrument.id)]
+    # the processes open their own connections
+    engine = DBSession().get_bind()
+    DBSession.remove()
+    engine.dispose()
+
+    kwargs = dict(
+        seed=env.seed,
+        photometry_per_obj=env.photometry_per_obj,
+        cadence=env.cadence,
+        candidate_fraction=env.candidate_fraction,
+        source_fraction=env.source_fraction,
+        spectrum_fraction=env.spectrum_fraction,
+        comments_per_obj=env.comments_per_obj,
+        spectrum_points=env.spectrum_points,
+    )
+    initargs = (
+        cfg['database'],
+        env.user_id,
+        group_ids,
+        filter_ids,
+        instrument_ids,
+        kwargs,
+    )
+    n_objs = int(env.scale * OBJS_PER_SCALE)
+    end = env.first_index + n_objs
+    chunks = [
+        (start, min(env.chunk_size, end - start))
+        for start in range(env.first_index, end, env.chunk_size)
+    ]
+
+    if env.processes > 1:
+        pool = multiprocessing.Pool(
+            env.processes, initializer=init_worker, initargs=initargs
+        )
+        results = pool.imap_unordered(generate_chunk, chunks)
+    else:
+        init_worker(*initargs)
+        results = map(generate_chunk, chunks)
+
+    totals = {}
+    start = time.perf_counter()
+    for i, (counts, duration) in enumerate(results):
+        for table, rows in counts.items():
+            totals[table] = totals.get(table, 0) + rows
+        rows = sum(counts.values())
+        print(
+            f'Chunk {i + 1}/{len(chunks)}: {counts["objs"]} objs, '
+            f'{counts["photometry"]} photometry points, {rows} rows in '
+            f'{duration:.1f} s ({rows / duration:.0f} rows/s)'
+        )
+    if env.processes > 1:
+        pool.close()
+        pool.join()
+
+    duration = time.perf_counter() - start
+    rows = sum(totals.values())
+    print(
+        f'Wrote {rows} rows in {duration:.1f} s ({rows / max(duration, 1e-9):.0f} '
+        'rows/s):'
+    )
+    for table, table_rows in totals.items():
+        print(f'  {table}: {table_rows}')
+
+    # update the planner statistics of the grown tables
+    for table in TABLES:
+        DBSession().execute(f'ANALYZE {table}')
+    DBSession().commit()
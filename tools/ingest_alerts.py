@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+import sys
+import time
+
+from baselayer.app.custom_exceptions import AccessError
+from baselayer.app.env import load_env, parser
+from skyportal.alert_ingest import AlertIngester, batched, read_alerts
+from skyportal.models import init_db, DBSession, Filter, Instrument, User
+
+
+if __name__ == "__main__":
+    parser.description = (
+        'Ingest ZTF alert packets from Avro files, or from a stream of Avro '
+        'records on standard input, in batches: create the Objs and the '
+        'Candidates of a filter, and add the photometry, including the '
+        'history of previous candidates, and the cutout thumbnails'
+    )
+    parser.add_argument(
+        'sources',
+        nargs='+',
+        help='Avro files, directories of .avro files, or - for standard input',
+    )
+    parser.add_argument(
+        '--filter-id', type=int, required=True, help='ID of the filter passed'
+    )
+    parser.add_argument(
+        '--instrument-id',
+        type=int,
+        required=True,
+        help='ID of the instrument of the photometry, with the ztfg, ztfr '
+        'and ztfi filters',
+    )
+    parser.add_argument(
+        '--user-id', type=int, required=True, help='ID of the uploading user'
+    )
+    parser.add_argument(
+        '--group-ids',
+        type=int,
+        nargs='*',
+        default=[],
+        help='Groups to share the photometry with, besides that of the filter',
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=500, help='Number of alerts per batch'
+    )
+
+    env, cfg = load_env()
+    init_db(**cfg['database'])
+
+    filter = DBSession().query(Filter).get(env.filter_id)
+    instrument = DBSession().query(Instrument).get(env.instrument_id)
+    user = DBSession().query(User).get(env.user_id)
+    for name, row in [('Filter', filter), ('Instrument', instrument), ('User', user)]:
+        if row is None:
+            print(f'Error: {name} does not exist')
+            sys.exit(-1)
+
+    try:
+        ingester = AlertIngester(filter, instrument, user, group_ids=env.group_ids)
+    except AccessError as e:
+        print(f'Error: {e}')
+        sys.exit(-1)
+
+    totals = {}
+    start = time.perf_counter()
+    for batch in batched(read_alerts(env.sources), env.batch_size):
+        batch_start = time.perf_counter()
+        try:
+            counts = ingester.ingest(batch)
+            DBSession().commit()
+        except Exception:
+            DBSession().rollback()
+            raise
+        duration = time.perf_counter() - batch_start
+
+        for key, value in counts.items():
+            totals[key] = totals.get(key, 0) + value
+        print(
+            f'{counts["alerts"]} alerts in {duration:.2f} s '
+            f'({counts["alerts"] / duration:.0f} alerts/s): '
+            f'{counts["objs"]} new objs, {counts["candidates"]} new candidates, '
+            f'{counts["photometry"]} photometry points, '
+            f'{counts["thumbnails"]} thumbnails'
+        )
+
+    duration = time.perf_counter() - start
+    alerts = totals.get('alerts', 0)
+    print(
+        f'Ingested {alerts} alerts in {duration:.2f} s '
+        f'({alerts / max(duration, 1e-9):.0f} alerts/s)'
+    )
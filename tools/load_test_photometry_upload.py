@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+import textwrap
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import yaml
+
+from baselayer.app.env import load_env, parser
+from skyportal.tests import api
+
+
+def make_batch(obj_id, instrument_id, filter, batch_index, n_points):
+    """Deterministic photometry for batch `batch_index` of an object, so that
+    uploaders sending the same batch produce exact duplicates."""
+    rng = np.random.default_rng(abs(hash((obj_id, batch_index))))
+    return {
+        'obj_id': obj_id,
+        'instrument_id': instrument_id,
+        'mjd': (59000 + batch_index + rng.uniform(0, 1, n_points)).tolist(),
+        'flux': rng.uniform(1, 100, n_points).tolist(),
+        'fluxerr': rng.uniform(0.1, 1, n_points).tolist(),
+        'zp': 23.9,
+        'magsys': 'ab',
+        'filter': filter,
+        'group_ids': 'all',
+    }
+
+
+if __name__ == "__main__":
+    parser.description = (
+        'Drive concurrent photometry uploads against a running SkyPortal '
+        'instance and report throughput, failed uploads (e.g., deadlocks) '
+        'and duplicated photometry. Uploaders PUT overlapping batches to a '
+        'shared pool of new sources, so run it against a scratch database.'
+    )
+    parser.add_argument(
+        '--host',
+        help=textwrap.dedent(
+            '''Fully specified URI of the running SkyPortal instance.
+               Defaults to http://localhost on the port specified in the
+               SkyPortal configuration file.'''
+        ),
+    )
+    parser.add_argument(
+        '--token',
+        help='Token used to access the API; defaults to the admin token in '
+        '.tokens.yaml',
+    )
+    parser.add_argument(
+        '--uploaders', type=int, default=8, help='Number of concurrent uploaders'
+    )
+    parser.add_argument(
+        '--uploads', type=int, default=20, help='Number of uploads per uploader'
+    )
+    parser.add_argument(
+        '--objs', type=int, default=4, help='Number of sources shared by uploaders'
+    )
+    parser.add_argument(
+        '--batches',
+        type=int,
+        default=10,
+        help='Number of distinct batches per source; uploads pick one at random',
+    )
+    parser.add_argument(
+        '--points', type=int, default=100, help='Photometry points per upload'
+    )
+
+    env, cfg = load_env()
+
+    token = env.token
+    if token is None:
+        token = yaml.load(open('.tokens.yaml'), Loader=yaml.Loader)['INITIAL_ADMIN']
+
+    status, data = api('GET', 'instrument', token=token, host=env.host)
+    assert status == 200, data
+    instrument = [i for i in data['data'] if len(i['filters']) > 0][0]
+
+    obj_ids = []
+    for _ in range(env.objs):
+        obj_id = f'loadtest_{uuid.uuid4().hex}'
+        status, data = api(
+            'POST',
+            'sources',
+            data={'id': obj_id, 'ra': 0.0, 'dec': 0.0},
+            token=token,
+            host=env.host,
+        )
+        assert status == 200, data
+        obj_ids.append(obj_id)
+
+    def uploader(seed):
+        rng = np.random.default_rng(seed)
+        outcomes = Counter()
+        for _ in range(env.uploads):
+            obj_id = obj_ids[rng.integers(len(obj_ids))]
+            batch = make_batch(
+                obj_id,
+                instrument['id'],
+                instrument['filters'][0],
+                int(rng.integers(env.batches)),
+                env.points,
+            )
+            response = api(
+                'PUT',
+                'photometry',
+                data=batch,
+                token=token,
+                host=env.host,
+                raw_response=True,
+            )
+            if response.status_code == 200:
+                outcomes['success'] += 1
+            elif 'deadlock' in response.text.lower():
+                outcomes['deadlock'] += 1
+            else:
+                outcomes['error'] += 1
+        return outcomes
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=env.uploaders) as executor:
+        outcomes = sum(executor.map(uploader, range(env.uploaders)), Counter())
+    duration = time.perf_counter() - start
+
+    n_duplicates = 0
+    for obj_id in obj_ids:
+        status, data = api(
+            'GET', f'sources/{obj_id}/photometry', token=token, host=env.host
+        )
+        assert status == 200, data
+        keys = Counter((p['mjd'], p['origin']) for p in data['data'])
+        n_duplicates += sum(count - 1 for count in keys.values())
+
+    n_uploads = env.uploaders * env.uploads
+    print(f'Uploads:            {n_uploads} ({env.uploaders} concurrent uploaders)')
+    print(f'Duration:           {duration:.1f} s')
+    print(f'Throughput:         {n_uploads / duration:.1f} uploads/s')
+    print(f'                    {n_uploads * env.points / duration:.0f} points/s')
+    print(f'Successful uploads: {outcomes["success"]}')
+    print(f'Deadlocks:          {outcomes["deadlock"]}')
+    print(f'Other failures:     {outcomes["error"]}')
+    print(f'Duplicated points:  {n_duplicates}')
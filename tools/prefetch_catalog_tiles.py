@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+from baselayer.app.env import load_env, parser
+from skyportal.models import init_db, DBSession, ObservingRun
+from skyportal.utils.offset import prefetch_catalog_tiles
+
+
+if __name__ == "__main__":
+    parser.description = (
+        'Fetch the tiles of the Gaia and ZTF reference catalogs around the '
+        'targets of observing runs, so that their offset stars and finding '
+        'charts are computed without remote catalog queries'
+    )
+    parser.add_argument(
+        'run_ids', type=int, nargs='+', help='IDs of the observing runs'
+    )
+    parser.add_argument(
+        '--radius',
+        type=float,
+        default=None,
+        help='Radius of the area to fetch around each target [arcmin]; '
+        'defaults to the largest search radius of the facilities',
+    )
+
+    env, cfg = load_env()
+    init_db(**cfg['database'])
+
+    radius_degrees = env.radius / 60.0 if env.radius is not None else None
+
+    for run_id in env.run_ids:
+        run = DBSession().query(ObservingRun).get(run_id)
+        if run is None:
+            print(f'Observing run {run_id} does not exist')
+            continue
+
+        objs = {assignment.obj.id: assignment.obj for assignment in run.assignments}
+        n_local = 0
+        for obj in objs.values():
+            n_local += prefetch_catalog_tiles(
+                obj.ra, obj.dec, radius_degrees=radius_degrees
+            )
+        print(
+            f'Observing run {run_id}: {n_local}/{len(objs)} targets covered '
+            'by local catalog tiles'
+        )